@@ -1,41 +1,96 @@
-from fastapi import FastAPI, UploadFile, File, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, UploadFile, File, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
 from datetime import datetime
+from contextlib import asynccontextmanager
 import os
-import shutil
-import uuid
+import json
+import asyncio
+import time
 
 # Import our custom modules
-from services.tts_service import tts_handler
-from services.stt_service import whisper_transcribe_handler
-from services.llm_service import generate_reply, init_llm, process_pdf_with_genai, search_with_gemini
-from services.live_service import handle_live_connection
+from services.tts_service import tts_handler, tts_stream_handler, tts_cache, tts_service
+from services.stt_service import whisper_transcribe_handler, init_stt, close_stt
+from services.llm_service import generate_reply, stream_reply, init_llm, process_pdf_with_genai, search_with_gemini
+from services.live_service import handle_live_connection, screenshot_metrics
+from services.message_store import create_message_store
+from services.prompt_builder import prompt_metrics
+from services.response_cache import response_cache
+from services.pdf_index import load_pdf_index, search_pdf_index
+from services.upload_service import UploadService, IngestQueueFull
 from utils.text_utils import strip_markdown
+from utils.metrics import registry, HTTP_REQUEST_SECONDS, REPLY_ERRORS, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Load environment variables and initialize services
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One STT client per worker, shared by /whisper and the live socket
+    init_stt()
+    upload_service.start(llm_model)
+    yield
+    await upload_service.stop()
+    # Release pooled upstream connections on shutdown
+    await tts_service.aclose()
+    await close_stt()
+    message_store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Time every HTTP request by route template, so IDs in paths don't split the series"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
+
 class Message(BaseModel):
     sender: str
     text: str
     language: str = "hi"
     mode: str = "standard"  # 'standard', 'file', or 'search'
     file_id: str = None  # Optional file ID for file mode
+    conversation_id: str = "default"
+
+GREETING_TEXT = "नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ?"
+
+# Chat history store (SQLite by default, see MESSAGE_STORE / MESSAGE_DB_PATH)
+message_store = create_message_store()
+
+def greeting_message():
+    return {
+        "sender": "bot",
+        "text": GREETING_TEXT,
+        "timestamp": datetime.now().isoformat()
+    }
 
-messages = [
-    {"sender": "bot", "text": "नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ?", "timestamp": datetime.now().isoformat()}
-]
+async def ensure_greeting(conversation_id):
+    """Start every new conversation with the bot greeting (stored on its first message)"""
+    # The store blocks on SQLite, so it runs off the event loop
+    if await asyncio.to_thread(message_store.is_empty, conversation_id):
+        await asyncio.to_thread(message_store.append, conversation_id, greeting_message())
 
 # Initialize LLM service
 llm_model = init_llm()
@@ -44,16 +99,38 @@ llm_model = init_llm()
 uploads_dir = "uploads"
 os.makedirs(uploads_dir, exist_ok=True)
 
+# Streams uploads to disk and runs PDF ingestion in the background
+upload_service = UploadService(uploads_dir)
+
+# Number of PDF passages sent to the LLM for each /pdf_query question
+PDF_QUERY_TOP_K = int(os.getenv("PDF_QUERY_TOP_K", "4"))
+
 @app.get("/")
 def root():
     return {"status": "ok"}
 
 @app.get("/messages")
-def get_messages():
-    return messages
+def get_messages(response: Response, conversation_id: str = "default", cursor: int = None, limit: int = 50):
+    """
+    Return a page of messages in chronological order.
+    
+    Without a cursor the latest `limit` messages are returned; with one,
+    only messages newer than it. The cursor for the next poll is sent in
+    the X-Next-Cursor header. A conversation with no messages yet shows
+    the greeting without storing it; it is stored with the first message.
+    
+    This is a sync route, so FastAPI runs the blocking store calls in its
+    threadpool.
+    """
+    page, next_cursor = message_store.list(conversation_id, after=cursor, limit=max(1, min(limit, 500)))
+    if not page and cursor is None:
+        return [greeting_message()]
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return page
 
 @app.post("/messages")
-def post_message(msg: Message):
+async def post_message(msg: Message):
     user_msg = {
         "sender": "user",
         "text": msg.text,
@@ -66,15 +143,16 @@ def post_message(msg: Message):
     if msg.file_id:
         user_msg["file_id"] = msg.file_id
         
-    messages.append(user_msg)
+    await ensure_greeting(msg.conversation_id)
+    await asyncio.to_thread(message_store.append, msg.conversation_id, user_msg)
     
     # Route to appropriate handler based on mode
     if msg.mode == "file" and msg.file_id:
-        return handle_file_mode_message(msg)
+        return await handle_file_mode_message(msg)
     elif msg.mode == "search":
-        return handle_search_mode_message(msg)
+        return await handle_search_mode_message(msg)
     else:
-        bot_text = generate_reply(llm_model, msg.text, msg.language)
+        bot_text = await generate_reply(llm_model, msg.text, msg.language)
         
         reply = {
             "sender": "bot",
@@ -83,10 +161,66 @@ def post_message(msg: Message):
             "language": msg.language,
             "mode": msg.mode
         }
-        messages.append(reply)
+        await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
         return reply
 
-def handle_file_mode_message(msg):
+@app.post("/messages/stream")
+async def post_message_stream(msg: Message):
+    """
+    Streaming variant of POST /messages using server-sent events.
+    
+    Emits {"type": "text_delta", "data": ...} events while the reply is being
+    generated and a final {"type": "done", "data": reply} event carrying the
+    full message plus time-to-first-token and total latency.
+    """
+    user_msg = {
+        "sender": "user",
+        "text": msg.text,
+        "timestamp": datetime.now().isoformat(),
+        "language": msg.language,
+        "mode": msg.mode
+    }
+    
+    if msg.file_id:
+        user_msg["file_id"] = msg.file_id
+        
+    await ensure_greeting(msg.conversation_id)
+    await asyncio.to_thread(message_store.append, msg.conversation_id, user_msg)
+    
+    async def event_stream():
+        # File and search modes have no streaming upstream; send the reply as one event
+        if msg.mode == "file" and msg.file_id:
+            reply = await handle_file_mode_message(msg)
+        elif msg.mode == "search":
+            reply = await handle_search_mode_message(msg)
+        else:
+            timings = {}
+            parts = []
+            async for delta in stream_reply(llm_model, msg.text, msg.language, timings=timings):
+                parts.append(delta)
+                yield f"data: {json.dumps({'type': 'text_delta', 'data': delta}, ensure_ascii=False)}\n\n"
+            
+            reply = {
+                "sender": "bot",
+                "text": "".join(parts),
+                "timestamp": datetime.now().isoformat(),
+                "language": msg.language,
+                "mode": msg.mode,
+                "ttft_ms": round(timings.get("ttft_ms", 0.0), 1),
+                "total_ms": round(timings.get("total_ms", 0.0), 1),
+                "cached": timings.get("cached", False)
+            }
+            await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
+            
+        yield f"data: {json.dumps({'type': 'done', 'data': reply}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def handle_file_mode_message(msg):
     """Handle messages in file mode with direct PDF processing"""
     try:
         file_path = os.path.join(uploads_dir, msg.file_id)
@@ -101,11 +235,11 @@ def handle_file_mode_message(msg):
                 "mode": "file",
                 "pdfQuery": True
             }
-            messages.append(reply)
+            await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
             return reply
         
         # Process the PDF with Google Generative AI
-        response_text = process_pdf_with_genai(llm_model, file_path, msg.text, msg.language)
+        response_text = await process_pdf_with_genai(llm_model, file_path, msg.text, msg.language)
         
         reply = {
             "sender": "bot",
@@ -117,11 +251,12 @@ def handle_file_mode_message(msg):
             "usingGoogleAI": True,
             "file_id": msg.file_id
         }
-        messages.append(reply)
+        await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
         return reply
         
     except Exception as e:
         print(f"Error in file_mode_message: {e}")
+        REPLY_ERRORS.inc(feature="file", kind="error")
         error_text = f"Error processing your file request: {str(e)}"
         reply = {
             "sender": "bot",
@@ -130,17 +265,19 @@ def handle_file_mode_message(msg):
             "language": msg.language,
             "mode": "file"
         }
-        messages.append(reply)
+        await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
         return reply
 
-def handle_search_mode_message(msg):
+async def handle_search_mode_message(msg):
     """Handle messages in search mode with Google Search Retrieval"""
     try:
         # Use search with Gemini function
-        response_text = search_with_gemini(llm_model, msg.text, msg.language)
+        response_text = await search_with_gemini(llm_model, msg.text, msg.language)
         
         # Check if this is a quota error response
         is_quota_error = "quota exceeded" in response_text.lower() or "resource_exhausted" in response_text.lower()
+        if is_quota_error:
+            REPLY_ERRORS.inc(feature="search", kind="quota")
         
         reply = {
             "sender": "bot",
@@ -151,16 +288,17 @@ def handle_search_mode_message(msg):
             "searchQuery": True,
             "quotaExceeded": is_quota_error
         }
-        messages.append(reply)
+        await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
         return reply
         
     except Exception as e:
         print(f"Error in search_mode_message: {e}")
+        REPLY_ERRORS.inc(feature="search", kind="error")
         error_text = f"Error processing your search request. Falling back to standard response mode."
         
         # Get a standard response instead
         try:
-            fallback_response = generate_reply(llm_model, msg.text, msg.language)
+            fallback_response = await generate_reply(llm_model, msg.text, msg.language)
             reply = {
                 "sender": "bot",
                 "text": f"[Search mode unavailable. Standard response:]\n\n{fallback_response}",
@@ -178,7 +316,7 @@ def handle_search_mode_message(msg):
                 "mode": "standard"
             }
         
-        messages.append(reply)
+        await asyncio.to_thread(message_store.append, msg.conversation_id, reply)
         return reply
 
 @app.post("/whisper")
@@ -189,6 +327,36 @@ async def whisper_endpoint(audio: UploadFile = File(...), language: str = "hi-IN
 async def tts_endpoint(request: Request):
     return await tts_handler(request)
 
+@app.post("/tts/stream")
+async def tts_stream_endpoint(request: Request):
+    """Chunked WAV stream that starts playing before the whole text is synthesized"""
+    return await tts_stream_handler(request)
+
+@app.get("/tts/cache_stats")
+def tts_cache_stats():
+    """Hit/miss metrics for the TTS audio cache"""
+    return tts_cache.stats()
+
+@app.get("/llm/prompt_stats")
+def llm_prompt_stats():
+    """Bytes sent to Gemini per prompt variant, split into system, turns and media"""
+    return prompt_metrics.snapshot()
+
+@app.get("/llm/response_cache_stats")
+def llm_response_cache_stats():
+    """Hit rates of the response cache for stand-alone questions"""
+    return response_cache.stats()
+
+@app.get("/live/screenshot_stats")
+def live_screenshot_stats():
+    """Screenshot frames skipped or reused, and average time per pipeline stage"""
+    return screenshot_metrics.snapshot()
+
+@app.get("/metrics")
+def metrics():
+    """Latency histograms, error counters and session gauges in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/pdf_query_genai")
 async def pdf_query_genai(request: Request):
     """Process PDF with Google Generative AI"""
@@ -206,7 +374,7 @@ async def pdf_query_genai(request: Request):
             return {"text": "PDF file not found.", "sender": "bot", "language": language}
         
         # Process the PDF with Google Generative AI
-        response_text = process_pdf_with_genai(llm_model, file_path, query, language)
+        response_text = await process_pdf_with_genai(llm_model, file_path, query, language)
         
         return {
             "text": response_text,
@@ -222,22 +390,32 @@ async def pdf_query_genai(request: Request):
 @app.post("/upload_pdf")
 async def upload_pdf(file: UploadFile = File(...), language: str = "en"):
     """
-    Upload a PDF file and return a unique file ID for future reference
+    Upload a PDF file and return a unique file ID for future reference.
+    Processing continues in the background; poll /upload_status/{file_id}.
     """
     try:
-        # Generate a unique file ID
-        file_id = str(uuid.uuid4())
-        file_path = os.path.join(uploads_dir, file_id)
+        # Stream to disk; identical content reuses the existing file ID
+        file_id, duplicate = await upload_service.save_upload(file)
         
-        # Save the uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Page count, text index, thumbnail and Gemini upload run in the background
+        try:
+            status = upload_service.enqueue(file_id)
+        except IngestQueueFull as e:
+            # The file is saved; uploading it again later reuses it and queues it
+            return JSONResponse(status_code=503, content={
+                "success": False,
+                "file_id": file_id,
+                "error": "queue_full",
+                "detail": str(e)
+            })
         
         return {
             "success": True,
             "file_id": file_id,
             "file_name": file.filename,
-            "language": language
+            "language": language,
+            "duplicate": duplicate,
+            "status": status["state"]
         }
     except Exception as e:
         print(f"Error uploading PDF: {e}")
@@ -246,6 +424,16 @@ async def upload_pdf(file: UploadFile = File(...), language: str = "en"):
             "error": str(e)
         }
 
+@app.get("/upload_status/{file_id}")
+def upload_status(file_id: str):
+    """Progress of the background ingestion for an uploaded PDF"""
+    status = upload_service.get_status(file_id)
+    if status is None:
+        if os.path.exists(os.path.join(uploads_dir, file_id)):
+            return {"success": True, "file_id": file_id, "state": "not_queued"}
+        return {"success": False, "error": "File not found"}
+    return {"success": True, "file_id": file_id, **status}
+
 # Also add a PDF query endpoint that uses the built-in LLM
 @app.post("/pdf_query")
 async def pdf_query(request: Request):
@@ -262,19 +450,39 @@ async def pdf_query(request: Request):
         if not os.path.exists(file_path):
             return {"text": "PDF file not found.", "sender": "bot", "language": language}
         
-        # Simple PDF query response - in real implementation, you would use a PDF parser
-        # and process the query against the PDF content
-        response_text = generate_reply(
-            llm_model, 
-            f"User is asking about a PDF document. Their question is: {query}", 
-            language
-        )
+        # Retrieve only the passages relevant to the question from the local index
+        index = await asyncio.to_thread(load_pdf_index, file_path)
+        passages = search_pdf_index(index, query, top_k=PDF_QUERY_TOP_K)
+        
+        if not passages:
+            return {
+                "text": "I couldn't find anything related to your question in this PDF.",
+                "sender": "bot",
+                "language": language,
+                "pdfQuery": True
+            }
+        
+        excerpts = "\n\n".join(f"[Page {p['page']}] {p['text']}" for p in passages)
+        if llm_model:
+            # The bare question picks the prompt variant and the cache key; the
+            # excerpts travel as context, and cached answers stay per file
+            response_text = await generate_reply(
+                llm_model, 
+                query, 
+                language,
+                context=f"Answer the question using only these excerpts from a PDF document.\n\n{excerpts}",
+                cache_scope=f"pdf:{file_id}"
+            )
+        else:
+            # No LLM available: return the best matching passages as-is
+            response_text = excerpts
         
         return {
             "text": response_text,
             "sender": "bot",
             "language": language,
-            "pdfQuery": True
+            "pdfQuery": True,
+            "pages": sorted({p["page"] for p in passages})
         }
     except Exception as e:
         print(f"Error in pdf_query: {e}")
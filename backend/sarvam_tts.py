@@ -1,23 +1,173 @@
-import requests
-import base64
+import asyncio
+import httpx
+import random
 import re
 import os
+import time
 from dotenv import load_dotenv
+from utils.text_utils import split_text_for_tts, strip_markdown
+from utils.metrics import track_upstream
 
 # Load environment variables
 load_dotenv()
 
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised when the TTS API has failed repeatedly and calls are being short-circuited"""
+
+class CircuitBreaker:
+    """
+    Stop calling an upstream that keeps failing.
+    
+    After failure_threshold consecutive failures the breaker opens and
+    rejects calls for reset_timeout seconds, then lets a single trial call
+    through (half-open). A success closes it again; a failure re-opens it.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+    
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+    
+    def release_trial(self):
+        """Free the half-open trial slot for a call that proved nothing either way"""
+        self.trial_in_flight = False
+
 class SarvamTTS:
     """
     Class to handle Text-to-Speech conversion using the Sarvam AI API.
+    
+    Requests share one keep-alive connection pool, are retried with
+    jittered exponential backoff on 429/5xx and network errors, and are
+    short-circuited by a circuit breaker while the API is down.
     """
-    def __init__(self):
+    def __init__(self, cache=None):
+        # Optional TTSCache consulted before every API call
+        self.cache = cache
         self.api_key = os.getenv("SARVAM_AI_API_KEY")
         self.url = "https://api.sarvam.ai/text-to-speech"
         self.headers = {
             "Content-Type": "application/json",
             "api-subscription-key": self.api_key
         }
+        self.timeout = httpx.Timeout(
+            float(os.getenv("SARVAM_TTS_TIMEOUT", "30")),
+            connect=float(os.getenv("SARVAM_TTS_CONNECT_TIMEOUT", "5"))
+        )
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("SARVAM_TTS_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("SARVAM_TTS_MAX_KEEPALIVE", "10"))
+        )
+        self.max_retries = int(os.getenv("SARVAM_TTS_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("SARVAM_TTS_BACKOFF_BASE", "0.5"))
+        self.backoff_max = float(os.getenv("SARVAM_TTS_BACKOFF_MAX", "8"))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("SARVAM_TTS_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("SARVAM_TTS_BREAKER_RESET", "30"))
+        )
+        self._client = None
+    
+    def _get_client(self):
+        """Create the pooled HTTP client on first use (inside the running event loop)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close pooled connections; call on application shutdown"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _backoff_delay(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring Retry-After when the API sends one"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def _post(self, payload):
+        """POST to the TTS API with retries, returning the successful response"""
+        is_trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            raise CircuitOpenError("TTS API circuit is open; skipping request")
+        
+        client = self._get_client()
+        last_error = None
+        # Every exit reports to the breaker, so the half-open trial slot is
+        # never left taken (a stuck slot would reject all calls until restart)
+        outcome = "failure"
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                try:
+                    response = await client.post(self.url, json=payload)
+                    if response.status_code == 200:
+                        outcome = "success"
+                        return response
+                    last_error = Exception(f"API error: {response.status_code} - {response.text}")
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        # Client errors won't improve on retry and don't mean the API is down
+                        outcome = "client_error"
+                        raise last_error
+                except httpx.TransportError as e:
+                    last_error = Exception(f"API connection error: {e}")
+                
+                if attempt < self.max_retries:
+                    delay = self._backoff_delay(attempt, response)
+                    print(f"TTS request failed ({last_error}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+            
+            raise last_error
+        except asyncio.CancelledError:
+            # Barge-in cancels TTS routinely, which says nothing about the API.
+            # A cancelled trial counts as failed so the breaker re-opens and
+            # tries again later instead of staying half-open with no trial.
+            outcome = "failure" if is_trial else "cancelled"
+            raise
+        finally:
+            if outcome == "success":
+                self.breaker.record_success()
+            elif outcome == "failure":
+                self.breaker.record_failure()
+            elif is_trial:
+                self.breaker.release_trial()
     
     def preprocess_text(self, text):
         """
@@ -29,13 +179,13 @@ class SarvamTTS:
     
     def split_text(self, text, chunk_size=500):
         """
-        Split text into chunks of specified size.
+        Split text into chunks of at most the specified size, at sentence boundaries.
         """
-        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        chunks = split_text_for_tts(text, chunk_size)
         print(f"Split text into {len(chunks)} chunks")
         return chunks
     
-    def text_to_speech(self, text, target_language_code="hi-IN", speaker="meera", model="bulbul:v1", 
+    async def text_to_speech(self, text, target_language_code="hi-IN", speaker="meera", model="bulbul:v1", 
                       enable_preprocessing=True, pitch=0, pace=1.0, loudness=1.0):
         """
         Convert text to speech using Sarvam AI API.
@@ -66,6 +216,16 @@ class SarvamTTS:
             text = text[:497] + "..."
             print(f"Warning: Truncating chunk to 500 characters for API limit")
         
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(
+                text, target_language_code, speaker, model,
+                pitch, pace, loudness, enable_preprocessing
+            )
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                return cached
+        
         # Process the text directly
         payload = {
             "inputs": [text],
@@ -78,57 +238,47 @@ class SarvamTTS:
             "enable_preprocessing": enable_preprocessing,
         }
         
-        # Make the API request
-        response = requests.post(self.url, json=payload, headers=self.headers)
+        # Make the API request (raises after retries are exhausted); cache
+        # hits above never reach the upstream metrics
+        with track_upstream("sarvam_tts", model):
+            response = await self._post(payload)
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            audio_response = response.json()
-            if "audios" in audio_response and audio_response["audios"]:
-                # Get the base64-encoded audio
-                audio_base64 = audio_response["audios"][0]
-                print(f"Generated audio for chunk: {len(audio_base64)} bytes in base64")
-                
-                return {
-                    "success": True,
-                    "audio_base64": audio_base64,
-                    "content_type": "audio/wav",
-                    "text_length": len(text)
-                }
-            else:
-                raise Exception(f"No audio data in response: {audio_response}")
+        audio_response = response.json()
+        if "audios" in audio_response and audio_response["audios"]:
+            # Get the base64-encoded audio
+            audio_base64 = audio_response["audios"][0]
+            print(f"Generated audio for chunk: {len(audio_base64)} bytes in base64")
+            
+            result = {
+                "success": True,
+                "audio_base64": audio_base64,
+                "content_type": "audio/wav",
+                "text_length": len(text)
+            }
+            if cache_key is not None:
+                await self.cache.aput(cache_key, result)
+            return result
         else:
-            raise Exception(f"API error: {response.status_code} - {response.text}")
+            raise Exception(f"No audio data in response: {audio_response}")
     
     def strip_markdown(self, text):
         """
         Remove markdown formatting from text for better TTS results.
         """
-        if not text:
-            return ""
-            
-        # Remove formatting markers
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Bold
-        text = re.sub(r'\*(.*?)\*', r'\1', text)      # Italic
-        text = re.sub(r'`(.*?)`', r'\1', text)        # Inline code
-        text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)  # Code blocks
-        text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)  # Links
-        text = re.sub(r'^#+\s+(.*)', r'\1', text, flags=re.MULTILINE)  # Headers
-        text = re.sub(r'^\s*[\*\-+]\s+', '', text, flags=re.MULTILINE)  # Bullet points
-        text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)  # Numbered lists
-        text = re.sub(r'^\>\s+', '', text, flags=re.MULTILINE)  # Blockquotes
-        
-        # Clean up whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        return text
+        return strip_markdown(text)
 
 # Example usage
 if __name__ == "__main__":
-    tts = SarvamTTS()
-    result = tts.text_to_speech(
-        "नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ?",
-        target_language_code="hi-IN",
-        speaker="anushka"
-    )
-    print(f"Generated audio of size: {len(result['audio_base64'])}")
+    async def main():
+        tts = SarvamTTS()
+        try:
+            result = await tts.text_to_speech(
+                "नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ?",
+                target_language_code="hi-IN",
+                speaker="anushka"
+            )
+            print(f"Generated audio of size: {len(result['audio_base64'])}")
+        finally:
+            await tts.aclose()
+    
+    asyncio.run(main())
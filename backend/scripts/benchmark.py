@@ -0,0 +1,352 @@
+"""
+Micro-benchmarks for the intent router, concurrent LLM sessions and the
+text, language, audio, screenshot, history and message store paths.
+Correctness lives in tests/; this only reports sizes and timings.
+
+Usage (from backend/):
+    python scripts/benchmark.py [name ...]
+    python scripts/benchmark.py screenshots path/to/frames
+
+With no names every benchmark runs. Names: intent, llm, text,
+language, audio, screenshots, history, messages.
+"""
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import wave
+
+# Modules import each other as top-level packages (services, utils), as they
+# do when the app is started from backend/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.text_utils import strip_markdown, split_text_for_tts, TTS_MAX_CHARS
+from utils.language_utils import detect_language
+
+
+def bench_intent(args):
+    """Intent router vs. the keyword scans it replaced, on the labeled corpus in tests/"""
+    from services.intent_router import classify_intent, SCREEN_GUIDANCE, PROCESS, REGULAR
+    from tests.test_intent_router import CORPUS
+
+    old_process = ["how to", "steps", "guide", "process", "procedure", "instructions",
+                   "help me", "कैसे", "चरण", "मार्गदर्शन", "मदद", "步骤", "怎么",
+                   "எப்படி", "படிகள்", "வழிகாட்டி"]
+    old_screen = ["what's on screen", "help me understand", "what do I see",
+                  "how to proceed", "next step", "guide me", "what should I do",
+                  "how do I", "screen shows", "on my screen", "looking at"]
+
+    def old_classify(text, has_image):
+        lowered = text.lower()
+        if has_image and (any(k in lowered for k in old_screen) or "screenshot" in lowered
+                          or len(text.strip()) < 5):
+            return SCREEN_GUIDANCE
+        return PROCESS if any(k in lowered for k in old_process) else REGULAR
+
+    for name, classify in (("keyword scans", old_classify), ("intent router", classify_intent)):
+        correct = sum(classify(text, image) == expected for text, image, expected in CORPUS)
+        rounds = 2000
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for text, image, _expected in CORPUS:
+                classify(text, image)
+        per_message_us = (time.perf_counter() - started) * 1e6 / (rounds * len(CORPUS))
+        print(f"{name}: {correct}/{len(CORPUS)} correct, {per_message_us:.2f}us per message")
+
+
+def bench_llm(args):
+    """Wall time for N sessions replying at once against a fake Gemini with fixed latency (load test in tests/)"""
+    import asyncio
+    from services import llm_service
+    from tests.test_llm_service import FakeGemini, UPSTREAM_SECONDS, run_sessions
+
+    async def run(sessions):
+        llm_service._llm_semaphore = asyncio.Semaphore(llm_service.MAX_CONCURRENT_LLM_REQUESTS)
+        client = FakeGemini()
+        elapsed, stall = await run_sessions(client, sessions)
+        return elapsed, stall, client.max_in_flight
+
+    for sessions in (1, 8, 16, 64):
+        elapsed, stall, in_flight = asyncio.run(run(sessions))
+        print(f"{sessions:3d} sessions: {elapsed:.2f}s (serialized {sessions * UPSTREAM_SECONDS:.1f}s), "
+              f"{in_flight} in flight, max loop stall {stall * 1000:.1f}ms")
+
+
+def bench_text(args):
+    """
+    TTS chunk boundaries (fixed-offset vs. sentence-aware split) and strip_markdown on ~10 KB replies
+
+    Both splits pack chunks up to TTS_MAX_CHARS, so on these corpora the
+    chunk count is the same; fewer requests than the fixed split isn't
+    achievable without exceeding the API limit. What the sentence-aware
+    split changes is where the cuts fall: the fixed split cuts most chunks
+    mid-sentence and some inside a grapheme (a vowel sign cut off from its
+    consonant), the sentence-aware split neither.
+    """
+    import unicodedata
+
+    def cuts(chunks):
+        """(mid-sentence cuts, cuts inside a grapheme) between consecutive chunks"""
+        mid_sentence = sum(1 for c in chunks[:-1] if not c.rstrip().endswith(("।", ".", "?", "!")))
+        mid_grapheme = sum(
+            1 for c in chunks[1:]
+            if c and (unicodedata.category(c[0]).startswith("M") or c[0] in "\u200c\u200d")
+        )
+        return mid_sentence, mid_grapheme
+
+    corpus = {
+        "hi": "भारत एक विशाल देश है। यहाँ अनेक भाषाएँ बोली जाती हैं और हर क्षेत्र की अपनी संस्कृति है। " * 30,
+        "ta": "தமிழ் ஒரு பழமையான மொழி. இது இலக்கிய வளம் மிக்கது, பல நூற்றாண்டுகளாக வளர்ந்து வருகிறது. " * 30,
+        "bn": "বাংলা একটি সমৃদ্ধ ভাষা। রবীন্দ্রনাথ ঠাকুর এই ভাষায় অনেক কবিতা লিখেছেন। " * 30,
+        "en": "Open the settings menu. Then choose the network tab, and check the connection status? " * 30,
+    }
+    for language, sample in corpus.items():
+        fixed = [sample[i:i + TTS_MAX_CHARS] for i in range(0, len(sample), TTS_MAX_CHARS)]
+        smart = split_text_for_tts(sample)
+        fixed_sentence, fixed_grapheme = cuts(fixed)
+        smart_sentence, smart_grapheme = cuts(smart)
+        print(f"{language}: fixed {len(fixed)} chunks, {fixed_sentence} cut mid-sentence, "
+              f"{fixed_grapheme} inside a grapheme; sentence-aware {len(smart)} chunks, "
+              f"{smart_sentence} cut mid-sentence, {smart_grapheme} inside a grapheme")
+
+    def strip_markdown_multipass(text):
+        """The previous implementation: one re.sub per construct"""
+        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+        text = re.sub(r'\*(.*?)\*', r'\1', text)
+        text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
+        text = re.sub(r'`(.*?)`', r'\1', text)
+        text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)
+        text = re.sub(r'^#+\s+(.*)', r'\1', text, flags=re.MULTILINE)
+        text = re.sub(r'^\s*[\*\-+]\s+', '', text, flags=re.MULTILINE)
+        text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+        text = re.sub(r'^\s*>\s+(.*)', r'\1', text, flags=re.MULTILINE)
+        text = re.sub(r'^\s*---+\s*$', '', text, flags=re.MULTILINE)
+        return re.sub(r'\s+', ' ', text).strip()
+
+    replies = {
+        "hi": "## चरण\n\n1. **सेटिंग्स** खोलें और *सुरक्षा* पर टैप करें।\n- [सहायता](https://example.com) देखें।\n",
+        "ta": "## படிகள்\n\n1. **அமைப்புகள்** திறந்து *பாதுகாப்பு* தட்டவும்.\n- [உதவி](https://example.com) பார்க்கவும்.\n",
+        "bn": "## ধাপ\n\n1. **সেটিংস** খুলুন এবং *নিরাপত্তা* চাপুন।\n- [সাহায্য](https://example.com) দেখুন।\n",
+        "en": "## Steps\n\n1. Open **Settings** and tap *Security*.\n- See [help](https://example.com) or run `reset`.\n",
+    }
+    for language, block in replies.items():
+        reply = block * -(-10240 // len(block.encode("utf-8")))
+        rounds = 200
+        started = time.perf_counter()
+        for _ in range(rounds):
+            strip_markdown_multipass(reply)
+        multipass_ms = (time.perf_counter() - started) * 1000 / rounds
+        started = time.perf_counter()
+        for _ in range(rounds):
+            strip_markdown(reply)
+        single_ms = (time.perf_counter() - started) * 1000 / rounds
+        print(f"{language}: {len(reply.encode('utf-8'))} bytes, multi-pass {multipass_ms:.3f}ms, "
+              f"single-pass {single_ms:.3f}ms per reply")
+
+
+def bench_language(args):
+    """detect_language throughput on a long mixed-script chat log"""
+    samples = [
+        "मुझे अपना पासवर्ड बदलना है, क्या आप मदद कर सकते हैं?",
+        "আমি আমার পাসওয়ার্ড পরিবর্তন করতে চাই, আপনি কি সাহায্য করতে পারেন?",
+        "நான் என் கடவுச்சொல்லை மாற்ற வேண்டும், நீங்கள் உதவ முடியுமா?",
+        "నేను నా పాస్‌వర్డ్ మార్చాలి, మీరు సహాయం చేయగలరా?",
+        "എനിക്ക് എന്റെ പാസ്‌വേഡ് മാറ്റണം, നിങ്ങൾക്ക് സഹായിക്കാമോ?",
+        "I need to change my password, can you help me?",
+    ]
+    for size in (64, 1024, 10240):
+        message = (" ".join(samples) * (size // 200 + 1))[:size]
+        rounds = max(100, 200000 // size)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            detect_language(message)
+        elapsed = time.perf_counter() - started
+        print(f"{size} chars: {elapsed * 1e6 / rounds:.1f}us per message, "
+              f"{size * rounds / elapsed / 1e6:.1f}M chars/s")
+
+
+def bench_audio(args):
+    """Stream the recorded WAVs through the segmenter in 20 ms packets, the way the live client sends them"""
+    from utils.audio_utils import UtteranceSegmenter, LIVE_SAMPLE_WIDTH
+
+    audio_dir = args[0] if args else os.path.join(BACKEND_DIR, "test_audio")
+    for path in sorted(glob.glob(os.path.join(audio_dir, "*.wav"))):
+        with wave.open(path, 'rb') as wf:
+            rate = wf.getframerate()
+            pcm = wf.readframes(wf.getnframes())
+
+        segmenter = UtteranceSegmenter(sample_rate=rate)
+        packet_bytes = int(rate * 0.02) * LIVE_SAMPLE_WIDTH
+        packets = 0
+        utterances = []
+        started = time.perf_counter()
+        for i in range(0, len(pcm), packet_bytes):
+            packets += 1
+            utterances.extend(segmenter.feed(pcm[i:i + packet_bytes]))
+        tail = segmenter.flush()
+        if tail:
+            utterances.append(tail)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        duration = len(pcm) / (rate * LIVE_SAMPLE_WIDTH)
+        print(f"{os.path.basename(path)}: {duration:.1f}s audio, {packets} packets -> "
+              f"{len(utterances)} STT calls, segmented in {elapsed:.0f}ms")
+
+
+def synthetic_frames():
+    """A settings page, six frames of a dialog whose text changes, then a blank screen"""
+    from PIL import Image, ImageDraw
+
+    base = Image.new("RGB", (1920, 1080), "white")
+    draw = ImageDraw.Draw(base)
+    for y in range(60, 1080, 28):
+        draw.text((80, y), "Account settings  Profile  Security  Payments  Help " * 3, fill="black")
+    draw.rectangle((0, 0, 1920, 48), fill=(30, 80, 160))
+    yield base
+    for step in range(6):
+        frame = base.copy()
+        draw = ImageDraw.Draw(frame)
+        # A dialog opens and its contents change, the rest stays put
+        draw.rectangle((660, 340, 1260, 740), fill=(245, 245, 245), outline="black")
+        draw.text((700, 380 + step * 40), f"Step {step + 1}: enter the OTP sent to your phone", fill="black")
+        yield frame
+    yield Image.new("RGB", (1920, 1080), (20, 20, 20))
+
+
+def bench_screenshots(args):
+    """Bytes sent for a frame sequence, full frames vs. changed region + thumbnail"""
+    from utils.image_utils import (
+        load_image, normalize_image, encode_jpeg, diff_bbox, box_fraction,
+        make_thumbnail, SCREENSHOT_CROP_MAX_AREA
+    )
+
+    if args:
+        # Frames sorted by name
+        paths = sorted(glob.glob(os.path.join(args[0], "*")))
+        frames = (normalize_image(load_image(open(path, "rb").read())) for path in paths)
+    else:
+        frames = (normalize_image(img) for img in synthetic_frames())
+
+    previous = None
+    full_total = cropped_total = 0
+    for index, frame in enumerate(frames):
+        started = time.perf_counter()
+        full = len(encode_jpeg(frame))
+        box = diff_bbox(previous, frame) if previous is not None else (0, 0) + frame.size
+        if box is None:
+            sent, mode = 0, "unchanged"
+        elif box_fraction(box, frame.size) <= SCREENSHOT_CROP_MAX_AREA:
+            sent = len(encode_jpeg(frame.crop(box))) + len(encode_jpeg(make_thumbnail(frame)))
+            mode = f"crop {box_fraction(box, frame.size):.0%}"
+        else:
+            sent, mode = full, "full"
+        elapsed = (time.perf_counter() - started) * 1000
+        full_total += full
+        cropped_total += sent
+        previous = frame
+        print(f"frame {index}: full {full:7d} bytes, sent {sent:7d} bytes ({mode}) in {elapsed:.0f}ms")
+    print(f"total: full {full_total} bytes, with cropping {cropped_total} bytes "
+          f"({cropped_total / max(full_total, 1):.0%})")
+
+
+def bench_history(args):
+    """Prompt size over a 500-turn session, unbounded list vs. ConversationHistory"""
+    from services.history_service import ConversationHistory
+    from services.llm_service import build_reply_prompt
+    from services.prompt_builder import measure_prompt
+
+    user_turn = "मुझे अपने बैंक खाते का पासवर्ड बदलना है। कृपया बताइए कि सेटिंग्स में कहाँ जाना है?"
+    bot_turn = ("सबसे पहले ऐप खोलें और ऊपर दाईं ओर प्रोफ़ाइल आइकन पर टैप करें। "
+                "फिर 'सुरक्षा' विकल्प चुनें। जब आप यह कर लें तो मुझे बताइए।") * 3
+
+    unbounded = []
+    managed = ConversationHistory()
+    for turn in range(1, 501):
+        for message in ({"role": "user", "content": user_turn}, {"role": "assistant", "content": bot_turn}):
+            unbounded.append(message)
+            managed.append(message)
+        if turn in (1, 10, 50, 100, 250, 500):
+            plain = measure_prompt(build_reply_prompt(user_turn, "hi", unbounded))["total_bytes"]
+            bounded = measure_prompt(build_reply_prompt(user_turn, "hi", managed))["total_bytes"]
+            print(f"turn {turn:3d}: unbounded prompt {plain:8d} bytes, managed prompt {bounded:6d} bytes")
+
+
+def bench_messages(args):
+    """Append and page latency with 1M stored messages (pass a smaller count to go faster)"""
+    from services.message_store import InMemoryMessageStore, SQLiteMessageStore
+
+    total = int(args[0]) if args else 1_000_000
+    message = {"sender": "user", "text": "नमस्ते! मुझे मदद चाहिए।", "language": "hi", "mode": "standard"}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stores = {
+            "memory": InMemoryMessageStore(retention=total),
+            "sqlite": SQLiteMessageStore(os.path.join(temp_dir, "bench.db"), retention=total),
+        }
+        for name, store in stores.items():
+            started = time.perf_counter()
+            if isinstance(store, SQLiteMessageStore):
+                # Bulk-load in one transaction; per-row appends are measured below
+                payload = json.dumps(message, ensure_ascii=False)
+                store._conn.execute("BEGIN")
+                store._conn.executemany(
+                    "INSERT INTO messages (conversation_id, payload) VALUES (?, ?)",
+                    ((f"c{i % 100}", payload) for i in range(total))
+                )
+                store._conn.execute("COMMIT")
+            else:
+                for i in range(total):
+                    store.append(f"c{i % 100}", message)
+            load_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for _ in range(1000):
+                store.append("c0", message)
+            append_us = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            for _ in range(1000):
+                store.list("c42", limit=50)
+            latest_us = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            for _ in range(1000):
+                store.list("c42", after=total // 2, limit=50)
+            cursor_us = (time.perf_counter() - started) * 1000
+
+            print(f"{name}: loaded {total} in {load_s:.1f}s, append {append_us:.0f}us, "
+                  f"latest page {latest_us:.0f}us, cursor page {cursor_us:.0f}us")
+            store.close()
+
+
+BENCHMARKS = {
+    "intent": bench_intent,
+    "llm": bench_llm,
+    "text": bench_text,
+    "language": bench_language,
+    "audio": bench_audio,
+    "screenshots": bench_screenshots,
+    "history": bench_history,
+    "messages": bench_messages,
+}
+
+def main(argv):
+    # A name may be followed by its own arguments, e.g. "screenshots frames/"
+    selected = []
+    for arg in argv:
+        if arg in BENCHMARKS:
+            selected.append((arg, []))
+        elif selected:
+            selected[-1][1].append(arg)
+        else:
+            sys.exit(f"Unknown benchmark {arg!r}; choose from {', '.join(BENCHMARKS)}")
+    for name, args in selected or [(name, []) for name in BENCHMARKS]:
+        print(f"== {name}: {BENCHMARKS[name].__doc__.strip().splitlines()[0]}")
+        BENCHMARKS[name](args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+import os
+import re
+
+# Token budget for verbatim turns and for the folded summary
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_SUMMARY_BUDGET = int(os.getenv("HISTORY_SUMMARY_BUDGET", "500"))
+# Number of most recent turns always kept word for word
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "8"))
+
+# Longest excerpt of a single turn kept in the summary
+SUMMARY_EXCERPT_CHARS = 160
+
+_SENTENCE_END = re.compile(r'(?<=[।॥.?!])\s')
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate: about four UTF-8 bytes per token, which holds
+    roughly for English and errs on the high side for Indic scripts
+    """
+    return (len(text.encode("utf-8")) + 3) // 4
+
+def _excerpt(text):
+    """First sentence of a turn, cut to SUMMARY_EXCERPT_CHARS"""
+    text = " ".join(text.split())
+    first = _SENTENCE_END.split(text, 1)[0]
+    if len(first) > SUMMARY_EXCERPT_CHARS:
+        first = first[:SUMMARY_EXCERPT_CHARS - 3].rstrip() + "..."
+    return first
+
+
+class ConversationHistory:
+    """
+    Token-budgeted conversation history for a live session.
+
+    Behaves like the list of {"role", "content"} dicts it replaces (append,
+    iteration, len, reversed), but only the last `keep_turns` turns, within
+    `token_budget`, are kept verbatim. Older turns are folded one at a time
+    into a running extractive summary that is itself capped at
+    `summary_budget` tokens, so the rendered prompt stops growing no matter
+    how long the session runs. When a summary exists, iteration yields it
+    first as a {"role": "summary"} entry.
+    """
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, keep_turns=HISTORY_KEEP_TURNS,
+                 summary_budget=HISTORY_SUMMARY_BUDGET):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_budget = summary_budget
+        self._turns = []
+        self._turn_tokens = 0
+        self._summary_lines = []
+        self._summary_tokens = 0
+        self._summary_cache = None
+
+    @property
+    def summary(self):
+        """Summary of the turns that no longer fit, rebuilt only after a fold"""
+        if self._summary_cache is None:
+            self._summary_cache = "\n".join(self._summary_lines)
+        return self._summary_cache
+
+    def _fold_oldest(self):
+        """Move the oldest verbatim turn into the summary"""
+        turn = self._turns.pop(0)
+        self._turn_tokens -= turn["tokens"]
+
+        role = "User" if turn["role"] == "user" else "Assistant"
+        line = f"{role}: {_excerpt(turn['content'])}"
+        self._summary_lines.append(line)
+        self._summary_tokens += estimate_tokens(line) + 1
+
+        # The summary is capped too; the oldest points go first
+        while self._summary_tokens > self.summary_budget and len(self._summary_lines) > 1:
+            dropped = self._summary_lines.pop(0)
+            self._summary_tokens -= estimate_tokens(dropped) + 1
+        self._summary_cache = None
+
+    def append(self, message):
+        """Add a {"role", "content"} turn, folding older turns as needed"""
+        content = message.get("content", "")
+        tokens = estimate_tokens(content)
+        self._turns.append({"role": message.get("role"), "content": content, "tokens": tokens})
+        self._turn_tokens += tokens
+
+        # Always keep at least the newest turn, even if it alone is over budget
+        while len(self._turns) > 1 and (
+            len(self._turns) > self.keep_turns or self._turn_tokens > self.token_budget
+        ):
+            self._fold_oldest()
+
+    def _entries(self):
+        if self._summary_lines:
+            yield {"role": "summary", "content": self.summary}
+        for turn in self._turns:
+            yield {"role": turn["role"], "content": turn["content"]}
+
+    def __iter__(self):
+        return self._entries()
+
+    def __reversed__(self):
+        return reversed(list(self._entries()))
+
+    def __len__(self):
+        return len(self._turns) + (1 if self._summary_lines else 0)
+
+    def token_count(self):
+        """Estimated tokens of everything that will be rendered into a prompt"""
+        return self._turn_tokens + self._summary_tokens
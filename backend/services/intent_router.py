@@ -0,0 +1,142 @@
+import re
+
+# Prompt variants chosen by the router (see prompt_builder.VARIANT_SYSTEM_PROMPTS)
+SCREEN_GUIDANCE = "screen_guidance"
+PROCESS = "process"
+REGULAR = "regular"
+
+# Trigger phrases per language. "screen" phrases only count when a
+# screenshot is attached; "screen_or_process" phrases mean screen guidance
+# with a screenshot and a how-to question without one; "process" phrases
+# always ask for step-by-step help. Optional "regular" phrases contain a
+# process phrase but ask how something is ("how is the weather"); being
+# longer, they win the match and keep the message regular.
+INTENT_KEYWORDS = {
+    "en": {
+        "screen": ["what's on screen", "what is on screen", "help me understand", "what do i see",
+                   "screen shows", "on my screen", "looking at", "screenshot", "explain"],
+        "screen_or_process": ["how to proceed", "next step", "guide me", "what should i do", "how do i"],
+        "process": ["how to", "how can i", "steps", "step by step", "guide", "process", "procedure",
+                    "instructions", "help me", "walk me through"],
+    },
+    "hi": {
+        "screen": ["स्क्रीन", "क्या दिख रहा", "यह क्या है"],
+        "screen_or_process": ["आगे क्या करूँ", "आगे क्या करूं", "अगला कदम"],
+        "process": ["कैसे", "चरण", "मार्गदर्शन", "मदद", "तरीका", "प्रक्रिया"],
+    },
+    "mr": {
+        "screen": ["स्क्रीनवर", "काय दिसत"],
+        "screen_or_process": ["पुढे काय करू", "पुढची पायरी"],
+        "process": ["कसे", "कसा", "पायऱ्या", "मदत", "प्रक्रिया"],
+    },
+    "bn": {
+        "screen": ["স্ক্রিন", "কী দেখা যাচ্ছে"],
+        "screen_or_process": ["এরপর কী করব", "পরের ধাপ"],
+        "process": ["কিভাবে", "কীভাবে", "ধাপ", "নির্দেশিকা", "সাহায্য", "পদ্ধতি", "প্রক্রিয়া"],
+    },
+    "gu": {
+        "screen": ["સ્ક્રીન", "શું દેખાય"],
+        "screen_or_process": ["આગળ શું કરું", "આગળનું પગલું"],
+        "process": ["કેવી રીતે", "પગલાં", "માર્ગદર્શન", "મદદ", "પ્રક્રિયા"],
+    },
+    "pa": {
+        "screen": ["ਸਕ੍ਰੀਨ", "ਕੀ ਦਿਖ ਰਿਹਾ"],
+        "screen_or_process": ["ਅੱਗੇ ਕੀ ਕਰਾਂ", "ਅਗਲਾ ਕਦਮ"],
+        "process": ["ਕਿਵੇਂ", "ਕਦਮ", "ਮਾਰਗਦਰਸ਼ਨ", "ਮਦਦ", "ਤਰੀਕਾ", "ਪ੍ਰਕਿਰਿਆ"],
+    },
+    "ta": {
+        "screen": ["திரை", "ஸ்கிரீன்", "என்ன தெரிகிறது"],
+        "screen_or_process": ["அடுத்து என்ன செய்ய", "அடுத்த படி"],
+        "process": ["எப்படி", "படிகள்", "வழிகாட்டி", "உதவி", "செயல்முறை"],
+        # எப்படி + forms of இரு ("to be"): how is / how are you
+        "regular": ["எப்படி இருக்"],
+    },
+    "te": {
+        "screen": ["స్క్రీన్", "ఏమి కనిపిస్తోంది"],
+        "screen_or_process": ["తర్వాత ఏమి చేయాలి", "తదుపరి దశ"],
+        "process": ["ఎలా", "దశలు", "మార్గదర్శి", "సహాయం", "ప్రక్రియ", "విధానం"],
+    },
+    "kn": {
+        "screen": ["ಸ್ಕ್ರೀನ್", "ಪರದೆ", "ಏನು ಕಾಣುತ್ತಿದೆ"],
+        "screen_or_process": ["ಮುಂದೆ ಏನು ಮಾಡಬೇಕು", "ಮುಂದಿನ ಹಂತ"],
+        "process": ["ಹೇಗೆ", "ಹಂತಗಳು", "ಮಾರ್ಗದರ್ಶನ", "ಸಹಾಯ", "ಪ್ರಕ್ರಿಯೆ", "ವಿಧಾನ"],
+    },
+    "ml": {
+        "screen": ["സ്ക്രീൻ", "എന്താണ് കാണുന്നത്"],
+        "screen_or_process": ["അടുത്തത് എന്ത് ചെയ്യണം", "അടുത്ത ഘട്ടം"],
+        "process": ["എങ്ങനെ", "ഘട്ടങ്ങൾ", "മാർഗ്ഗനിർദ്ദേശം", "സഹായം", "പ്രക്രിയ", "രീതി"],
+    },
+    "zh": {
+        "screen": [],
+        "screen_or_process": [],
+        "process": ["步骤", "怎么"],
+    },
+}
+
+# Prompts shorter than this with a screenshot attached mean "explain my screen"
+MIN_SCREEN_PROMPT_CHARS = 5
+
+# Intent class of every phrase; a phrase listed under two classes keeps the first
+_PHRASE_CLASSES = {}
+for _by_class in INTENT_KEYWORDS.values():
+    for _intent_class in ("screen", "screen_or_process", "process", "regular"):
+        for _phrase in _by_class.get(_intent_class, []):
+            _PHRASE_CLASSES.setdefault(_phrase.lower(), _intent_class)
+
+def _trie_pattern(phrases):
+    """
+    Regex for a set of phrases, factored into a trie so the engine branches
+    on one character at a time instead of trying every phrase at every
+    position (the same idea as an Aho-Corasick automaton). Matches are the
+    longest phrase starting at each position.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node):
+        terminal = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return body + "?" if len(branches) == 1 and len(body) == 1 else "(?:" + body + ")?"
+        return body
+
+    return re.compile(render(trie))
+
+_INTENT_PATTERN = _trie_pattern(_PHRASE_CLASSES)
+
+def classify_intent(text, has_image=False):
+    """
+    Pick the prompt variant for a user message in one scan of the text
+
+    Args:
+        text: The user's message (or the prompt built around it)
+        has_image: Whether a screenshot is attached
+
+    Returns:
+        str: SCREEN_GUIDANCE (only with an image), PROCESS or REGULAR
+    """
+    text = text or ""
+    if has_image and len(text.strip()) < MIN_SCREEN_PROMPT_CHARS:
+        return SCREEN_GUIDANCE
+
+    intent = REGULAR
+    for match in _INTENT_PATTERN.finditer(text.lower()):
+        intent_class = _PHRASE_CLASSES[match.group()]
+        if intent_class == "regular":
+            continue
+        if intent_class == "process":
+            if not has_image:
+                return PROCESS
+            intent = PROCESS
+        elif has_image:
+            return SCREEN_GUIDANCE
+        elif intent_class == "screen_or_process":
+            return PROCESS
+    return intent
@@ -1,8 +1,12 @@
+import os
 import json
 import asyncio
-import base64
 import time
+import threading
 import uuid
+import functools
+import contextvars
+from collections import deque
 from fastapi import WebSocket, WebSocketDisconnect
 from typing import Dict, List, Optional, Any
 import logging
@@ -12,7 +16,308 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Import LLM service for generating responses
-from services.llm_service import generate_reply, process_image_with_text
+from services.llm_service import stream_reply, process_image_with_text
+from services.history_service import ConversationHistory
+from services.intent_router import classify_intent, REGULAR
+from services.stt_service import transcribe_audio
+from services.tts_service import chunk_text, resolve_voice, synthesize_stream
+from utils.audio_utils import UtteranceSegmenter, pcm_to_wav
+from utils.image_utils import (
+    SCREENSHOT_HASH_DISTANCE, SCREENSHOT_CROP_MAX_AREA, decode_data_uri, to_data_uri,
+    load_image, normalize_image, encode_jpeg, dhash, hash_distance, diff_bbox,
+    box_fraction, make_thumbnail
+)
+from utils.text_utils import strip_markdown, split_complete_sentences
+from utils.language_utils import detect_language, LANGUAGE_DETECT_MIN_CONFIDENCE
+from utils.language_registry import to_bcp47
+from utils.metrics import span, current_span, LIVE_SESSIONS, STAGE_SECONDS
+
+# Changes covering less of the screen than this (cursor blink, clock tick)
+# don't make a frame count as new
+SCREENSHOT_MIN_CHANGE_AREA = 0.002
+
+# Replies from process_image_with_text that report a failure and must not be reused
+_IMAGE_ERROR_PREFIXES = (
+    "Image processing not available", "Invalid image data",
+    "Failed to process image", "No response generated",
+)
+
+
+class ScreenshotMetrics:
+    """
+    Frame counts and cumulative per-stage timings across all sessions.
+    
+    Stages are timed in worker threads and read by the stats endpoint's
+    threadpool, so updates and snapshots are locked.
+    """
+    
+    def __init__(self):
+        self.frames = 0
+        self.unchanged_frames = 0
+        self.cropped_frames = 0
+        self.reused_answers = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # stage -> [calls, total milliseconds]
+        self.stages = {}
+        self._lock = threading.Lock()
+        
+    def count(self, counter, amount=1):
+        """Add to one of the frame or byte counters"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+        
+    def record_stage(self, stage, elapsed_ms):
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed_ms
+        
+    def snapshot(self):
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "unchanged_frames": self.unchanged_frames,
+                "cropped_frames": self.cropped_frames,
+                "reused_answers": self.reused_answers,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "stages": {
+                    stage: {"calls": calls, "avg_ms": round(total / calls, 2)}
+                    for stage, (calls, total) in self.stages.items()
+                },
+            }
+
+screenshot_metrics = ScreenshotMetrics()
+
+
+class ScreenshotPipeline:
+    """
+    Per-session screenshot preprocessing.
+    
+    Each frame is decoded, scaled down, hashed with a difference hash and
+    compared pixel-wise with the last distinct frame. A frame whose hash is
+    within SCREENSHOT_HASH_DISTANCE bits and whose changed region (if any)
+    is negligible, such as a blinking cursor, counts as unchanged: a
+    standalone unchanged frame is skipped, and the previous answer is
+    reused when the question is also the same. When only part of the screen
+    changed, Gemini gets that region at full resolution plus a thumbnail of
+    the whole screen instead of the full frame.
+    """
+    
+    def __init__(self, max_distance=SCREENSHOT_HASH_DISTANCE, metrics=screenshot_metrics):
+        self.max_distance = max_distance
+        self.metrics = metrics
+        self.last_hash = None
+        self.last_frame = None
+        self.last_question = None
+        self.last_answer = None
+        
+    def _timed(self, timings, stage, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        timings[stage] = (time.perf_counter() - started) * 1000
+        self.metrics.record_stage(stage, timings[stage])
+        return result
+        
+    def _analyze(self, data_uri, timings):
+        mime_type, raw = self._timed(timings, "decode", decode_data_uri, data_uri)
+        img = self._timed(timings, "load", load_image, raw)
+        img = self._timed(timings, "normalize", normalize_image, img)
+        frame_hash = self._timed(timings, "hash", dhash, img)
+        box = None
+        if self.last_frame is not None:
+            box = self._timed(timings, "diff", diff_bbox, self.last_frame, img)
+        return {"image": img, "hash": frame_hash, "box": box, "bytes_in": len(raw)}
+        
+    def _encode(self, img, timings):
+        return self._timed(timings, "encode", encode_jpeg, img)
+        
+    def _encode_region(self, img, box, timings):
+        region = self._timed(timings, "encode", encode_jpeg, img.crop(box))
+        thumbnail = self._timed(timings, "thumbnail", lambda: encode_jpeg(make_thumbnail(img)))
+        return region, thumbnail
+        
+    async def prepare(self, data_uri, question, language_code):
+        """
+        Analyze a screenshot before it is sent to the LLM
+        
+        Returns:
+            dict: "unchanged" (bool), "reused_answer" (previous reply or
+                  None), "image" (JPEG data URI of the frame or of its
+                  changed region, or None when no LLM call is needed),
+                  "context_image" (thumbnail of the whole frame when
+                  "image" is a region, otherwise None), "region" (the
+                  region's bounding box or None) and per-stage "timings" in ms
+        """
+        timings = {}
+        frame = await asyncio.to_thread(self._analyze, data_uri, timings)
+        self.metrics.count("frames")
+        self.metrics.count("bytes_in", frame["bytes_in"])
+        
+        img, box = frame["image"], frame["box"]
+        unchanged = (
+            self.last_hash is not None
+            and hash_distance(frame["hash"], self.last_hash) <= self.max_distance
+            and (box is None or box_fraction(box, img.size) <= SCREENSHOT_MIN_CHANGE_AREA)
+        )
+        if unchanged:
+            self.metrics.count("unchanged_frames")
+        else:
+            # Keep the last distinct frame so slow drift still counts as a change
+            self.last_hash = frame["hash"]
+            self.last_frame = img
+            self.last_question = self.last_answer = None
+        
+        key = (" ".join(question.lower().split()), language_code)
+        result = {
+            "unchanged": unchanged,
+            "reused_answer": None,
+            "image": None,
+            "context_image": None,
+            "region": None,
+            "timings": timings,
+        }
+        if unchanged and (not question or key == self.last_question):
+            if question:
+                result["reused_answer"] = self.last_answer
+                self.metrics.count("reused_answers")
+            return result
+        
+        if not unchanged and box is not None and box_fraction(box, img.size) <= SCREENSHOT_CROP_MAX_AREA:
+            region, thumbnail = await asyncio.to_thread(self._encode_region, img, box, timings)
+            self.metrics.count("cropped_frames")
+            self.metrics.count("bytes_out", len(region) + len(thumbnail))
+            result.update(image=to_data_uri(region), context_image=to_data_uri(thumbnail), region=box)
+            return result
+        
+        jpeg = await asyncio.to_thread(self._encode, img, timings)
+        self.metrics.count("bytes_out", len(jpeg))
+        result["image"] = to_data_uri(jpeg)
+        return result
+        
+    def remember(self, question, language_code, answer):
+        """Store the answer for the current frame so a repeated question can reuse it"""
+        if not question or not answer or answer.startswith(_IMAGE_ERROR_PREFIXES):
+            return
+        self.last_question = (" ".join(question.lower().split()), language_code)
+        self.last_answer = answer
+
+
+# Reply jobs that may wait per session while another one is being answered
+LIVE_INBOX_SIZE = int(os.getenv("LIVE_INBOX_SIZE", "8"))
+
+
+class SessionScheduler:
+    """
+    Runs a live session's reply jobs one at a time on a background task, so
+    the receive loop keeps reading audio and control frames while an
+    STT -> LLM -> TTS chain is in flight.
+    
+    Jobs wait in a bounded inbox. The policy for a job's kind decides what
+    happens when a job of the same kind is already waiting: "merge" replaces
+    it (only the newest standalone screenshot matters), "keep" queues behind
+    it. When the inbox is full the oldest waiting job is dropped.
+    cancel_current() stops the job in flight when the user barges in, but
+    only once it has started replying (LLM or TTS): an utterance still in
+    STT is the user's own speech and is never thrown away.
+    """
+    
+    POLICIES = {"screenshot": "merge", "text": "keep", "utterance": "keep"}
+    
+    def __init__(self, session_id, max_size=LIVE_INBOX_SIZE):
+        self.session_id = session_id
+        self.max_size = max_size
+        # (kind, zero-argument callable returning the job's coroutine, the
+        # submitter's contextvars so the job continues its trace)
+        self._inbox = deque()
+        self._ready = asyncio.Event()
+        self._current = None
+        self._worker = None
+        # Whether the job in flight has reached its reply; utterance jobs
+        # start in STT and call mark_replying() when they move on
+        self.replying = False
+        
+        self.merged = 0
+        self.dropped = 0
+        self.cancelled = 0
+        
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            
+    def submit(self, kind, job):
+        """Queue a job (a callable returning a coroutine) according to its kind's policy"""
+        entry = (kind, job, contextvars.copy_context())
+        if self.POLICIES.get(kind) == "merge":
+            for i, (queued_kind, _, _) in enumerate(self._inbox):
+                if queued_kind == kind:
+                    self._inbox[i] = entry
+                    self.merged += 1
+                    return
+        if len(self._inbox) >= self.max_size:
+            dropped_kind, _, _ = self._inbox.popleft()
+            self.dropped += 1
+            logger.warning(f"Inbox full for {self.session_id}, dropped a queued {dropped_kind} job")
+        self._inbox.append(entry)
+        self._ready.set()
+        
+    def mark_replying(self):
+        """Called by the job in flight when it starts generating its reply"""
+        self.replying = True
+        
+    def has_queued(self, kind):
+        """True if a job of this kind is waiting in the inbox"""
+        return any(queued_kind == kind for queued_kind, _, _ in self._inbox)
+        
+    def cancel_current(self):
+        """
+        Cancel the job in flight if it has started replying. Returns True if
+        one was cancelled
+        """
+        if self._current is not None and not self._current.done() and self.replying:
+            self._current.cancel()
+            self.cancelled += 1
+            return True
+        return False
+        
+    async def _run(self):
+        while True:
+            if not self._inbox:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            kind, job, job_context = self._inbox.popleft()
+            self.replying = kind != "utterance"
+            # The task copies the context it is created in
+            self._current = job_context.run(asyncio.create_task, job())
+            # asyncio.wait doesn't raise when the job itself is cancelled
+            await asyncio.wait({self._current})
+            if self._current.cancelled():
+                logger.info(f"Cancelled in-flight {kind} job for {self.session_id}")
+            elif self._current.exception() is not None:
+                logger.error(f"{kind} job failed for {self.session_id}: {self._current.exception()}")
+            self._current = None
+            self.replying = False
+            
+    async def close(self):
+        """Stop the worker and any job in flight"""
+        self._inbox.clear()
+        tasks = [task for task in (self._worker, self._current) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = self._current = None
+        
+    def stats(self):
+        return {
+            "queued": len(self._inbox),
+            "busy": self._current is not None,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "cancelled": self.cancelled,
+        }
+
 
 class ConnectionManager:
     """Manage WebSocket connections for live chat and screen sharing"""
@@ -29,13 +334,16 @@ class ConnectionManager:
         session_id = str(uuid.uuid4())
         self.active_connections[session_id] = websocket
         self.conversation_contexts[session_id] = {
-            "history": [],
+            "history": ConversationHistory(),
             "is_recording": False,
             "has_screenshot": False,
             "pending_screenshot": None,
             "last_activity": time.time(),
             "language_code": "en",  # Default language
+            "audio_segmenter": UtteranceSegmenter(),
+            "screenshot_pipeline": ScreenshotPipeline(),
         }
+        LIVE_SESSIONS.set(len(self.active_connections))
         logger.info(f"New connection established: {session_id}")
         return session_id
         
@@ -45,6 +353,7 @@ class ConnectionManager:
             del self.active_connections[session_id]
         if session_id in self.conversation_contexts:
             del self.conversation_contexts[session_id]
+        LIVE_SESSIONS.set(len(self.active_connections))
         logger.info(f"Connection closed: {session_id}")
             
     async def send_text(self, session_id: str, text: str, message_type: str = "text"):
@@ -58,6 +367,14 @@ class ConnectionManager:
             except Exception as e:
                 logger.error(f"Error sending message to {session_id}: {e}")
                 
+    async def send_json(self, session_id: str, payload: Dict[str, Any]):
+        """Send a structured JSON message to a specific client"""
+        if session_id in self.active_connections:
+            try:
+                await self.active_connections[session_id].send_json(payload)
+            except Exception as e:
+                logger.error(f"Error sending message to {session_id}: {e}")
+                
     async def send_binary(self, session_id: str, binary_data: bytes):
         """Send binary data (like audio) to a specific client"""
         if session_id in self.active_connections:
@@ -86,6 +403,11 @@ async def handle_live_connection(websocket: WebSocket, llm_model):
     # Accept the connection and get a session ID
     session_id = await connection_manager.connect(websocket)
     
+    # Replies run on their own task so this loop keeps receiving while they do
+    scheduler = SessionScheduler(session_id)
+    connection_manager.update_context(session_id, {"scheduler": scheduler})
+    scheduler.start()
+    
     # Send welcome message
     await connection_manager.send_text(
         session_id, 
@@ -105,10 +427,13 @@ async def handle_live_connection(websocket: WebSocket, llm_model):
                 break
                 
             # Check if message is text or binary
+            # Each message starts a trace that the jobs it submits continue
             if "text" in message:
-                await handle_text_message(session_id, message["text"], llm_model)
+                with span("live.text_message"):
+                    await handle_text_message(session_id, message["text"], llm_model)
             elif "bytes" in message:
-                await handle_binary_message(session_id, message["bytes"], llm_model)
+                with span("live.binary_message"):
+                    await handle_binary_message(session_id, message["bytes"], llm_model)
             else:
                 logger.warning(f"Received unknown message format: {message.keys()}")
                 
@@ -125,9 +450,21 @@ async def handle_live_connection(websocket: WebSocket, llm_model):
             pass
     finally:
         # Clean up when the connection is closed
+        await scheduler.close()
         connection_manager.disconnect(session_id)
 
 
+async def barge_in(session_id: str, context: Dict[str, Any]):
+    """
+    Cancel the reply in flight because the user started a new turn. Jobs
+    that haven't started replying (an utterance in STT) and queued jobs are
+    kept; see process_utterance for how consecutive utterances are merged.
+    """
+    if context["scheduler"].cancel_current():
+        logger.info(f"Barge-in: interrupted the current reply for {session_id}")
+        await connection_manager.send_json(session_id, {"type": "interrupted"})
+
+
 async def handle_text_message(session_id: str, text_message: str, llm_model):
     """Handle text messages, which could be text input or JSON commands"""
     try:
@@ -152,11 +489,12 @@ async def handle_text_message(session_id: str, text_message: str, llm_model):
             if "language" in data:
                 context["language_code"] = data.get("language", "en")
             else:
-                # Simple language detection based on text content
-                if any(char in "हिंदी" for char in user_text):
-                    context["language_code"] = "hi"
-                elif any(char in "தமிழ்" for char in user_text):
-                    context["language_code"] = "ta"
+                # Detect the language from the script the message is written in;
+                # the session language drives the LLM reply, STT and TTS
+                detected, confidence = detect_language(user_text)
+                if detected and confidence >= LANGUAGE_DETECT_MIN_CONFIDENCE:
+                    context["language_code"] = detected
+                    context["language_confidence"] = confidence
                 
             # Add message to history
             context["history"].append({"role": "user", "content": user_text})
@@ -169,8 +507,12 @@ async def handle_text_message(session_id: str, text_message: str, llm_model):
                 logger.info(f"Received text with pending screenshot from {session_id}")
                 # Message will be processed after screenshot is received
             else:
-                # No screenshot, process the message immediately
-                await process_message(session_id, user_text, None, llm_model)
+                # No screenshot, answer right away; a newer question supersedes a stale answer
+                await barge_in(session_id, context)
+                context["scheduler"].submit(
+                    "text",
+                    functools.partial(process_message, session_id, user_text, None, llm_model)
+                )
                 
         elif message_type == "screenshot":
             # Screenshot data from user
@@ -186,14 +528,21 @@ async def handle_text_message(session_id: str, text_message: str, llm_model):
                     if last_message:
                         user_text = last_message["content"]
                         # Process message with screenshot
-                        await process_message(session_id, user_text, screenshot_data, llm_model)
+                        await barge_in(session_id, context)
+                        context["scheduler"].submit(
+                            "text",
+                            functools.partial(process_message, session_id, user_text, screenshot_data, llm_model)
+                        )
                     
                     # Reset screenshot flag
                     context["has_screenshot"] = False
                     connection_manager.update_context(session_id, context)
                 else:
-                    # Standalone screenshot without text
-                    await process_message(session_id, "", screenshot_data, llm_model)
+                    # Standalone screenshot without text; only the newest waiting one is kept
+                    context["scheduler"].submit(
+                        "screenshot",
+                        functools.partial(process_message, session_id, "", screenshot_data, llm_model)
+                    )
             else:
                 logger.warning(f"Received invalid screenshot data from {session_id}")
         
@@ -203,12 +552,27 @@ async def handle_text_message(session_id: str, text_message: str, llm_model):
             connection_manager.update_context(session_id, context)
             logger.info(f"End of user turn for {session_id}")
             
+            # Send whatever speech is still buffered as the final utterance,
+            # or answer a transcript held back while the user was speaking
+            utterance = context["audio_segmenter"].flush()
+            if utterance or context.get("pending_transcript"):
+                context["scheduler"].submit(
+                    "utterance",
+                    functools.partial(process_utterance, session_id, utterance or b"", llm_model)
+                )
+            
         else:
             logger.warning(f"Received unknown message type: {message_type}")
             
     except json.JSONDecodeError:
         # Not JSON, assume plain text
-        await process_message(session_id, text_message, None, llm_model)
+        context = connection_manager.get_context(session_id)
+        if context:
+            await barge_in(session_id, context)
+            context["scheduler"].submit(
+                "text",
+                functools.partial(process_message, session_id, text_message, None, llm_model)
+            )
     except Exception as e:
         logger.error(f"Error handling text message: {e}", exc_info=True)
         await connection_manager.send_text(
@@ -218,137 +582,223 @@ async def handle_text_message(session_id: str, text_message: str, llm_model):
 
 
 async def handle_binary_message(session_id: str, binary_data: bytes, llm_model):
-    """Handle binary messages (audio data) with real-time transcription"""
-    import io
-    import os
-    import wave
-    from datetime import datetime
-    from services.stt_service import SarvamAI
-    from services.tts_service import tts_service
-    import base64
-    
-    # Update recording state
+    """Handle binary messages (raw PCM16 audio) by buffering until an utterance ends"""
     context = connection_manager.get_context(session_id)
     if not context:
         logger.error(f"No context found for session {session_id}")
         return
-        
-    if not context["is_recording"]:
-        # First audio packet, mark as recording
+    
+    segmenter = context["audio_segmenter"]
+    utterances = segmenter.feed(binary_data)
+    
+    if segmenter.in_speech and not context["is_recording"]:
+        # Speech onset detected: stop any reply still playing and let the
+        # client know we're listening
         context["is_recording"] = True
         connection_manager.update_context(session_id, context)
+        await barge_in(session_id, context)
         await connection_manager.send_text(session_id, "System: Processing audio...")
+    elif not segmenter.in_speech and context["is_recording"]:
+        context["is_recording"] = False
+        connection_manager.update_context(session_id, context)
+        if not utterances and context.get("pending_transcript"):
+            # The speech that deferred a transcript was too short to become an
+            # utterance, so nothing will pick the transcript up: reply to it now
+            context["scheduler"].submit(
+                "utterance",
+                functools.partial(process_utterance, session_id, b"", llm_model)
+            )
+    
+    for utterance in utterances:
+        context["scheduler"].submit(
+            "utterance",
+            functools.partial(process_utterance, session_id, utterance, llm_model)
+        )
+
+
+async def process_utterance(session_id: str, pcm_data: bytes, llm_model):
+    """
+    Transcribe one complete utterance, then stream the reply: each sentence
+    is sent to TTS as soon as the LLM finishes it, and its audio goes out
+    while later sentences are still being generated
+    
+    If the user is speaking again (or another utterance is already queued)
+    when transcription finishes, they only paused: the transcript is kept in
+    context["pending_transcript"] and merged into the next utterance's turn
+    instead of being answered on its own. Empty pcm_data replies to the
+    pending transcript alone.
+    """
+    context = connection_manager.get_context(session_id)
+    if not context:
+        logger.error(f"No context found for session {session_id}")
+        return
+    
+    turn_started = time.perf_counter()
+    timings = {}
     
     try:
-        # Get API key from environment
-        SARVAM_AI_API_KEY = os.getenv("SARVAM_AI_API_KEY")
-        if not SARVAM_AI_API_KEY:
-            logger.error("Missing Sarvam AI API key")
+        # Get language code for STT
+        language_code = to_bcp47(context.get("language_code", "en"))
+        
+        text = ""
+        if pcm_data:
+            # The client streams headerless PCM, so wrap the utterance in a WAV container
+            wav_bytes = pcm_to_wav(pcm_data, sample_rate=context["audio_segmenter"].sample_rate)
+            # Transcribe with the shared client, straight from memory
+            text = await transcribe_audio(wav_bytes, language_code, filename="utterance.wav")
+        timings["stt_ms"] = (time.perf_counter() - turn_started) * 1000
+        
+        # If the transcript is clearly in another script, the user switched
+        # language: reply and speak in it, and listen for it from now on
+        detected, confidence = detect_language(text)
+        if detected and confidence >= LANGUAGE_DETECT_MIN_CONFIDENCE and detected != language_code[:2]:
+            logger.info(f"Language switch for {session_id}: {language_code} -> {detected} ({confidence:.2f})")
+            language_code = to_bcp47(detected)
+            context["language_code"] = detected
+            context["language_confidence"] = confidence
+            
+        # Send transcription to client
+        if text and text.strip():
             await connection_manager.send_text(
                 session_id, 
-                "System: Error processing audio: Missing API key"
+                f"You: {text}"
             )
+        
+        # Speech split by a pause is answered as one turn
+        pending = context.pop("pending_transcript", None)
+        if pending:
+            text = f"{pending} {text or ''}".strip()
+        if text and text.strip() and (context["is_recording"] or context["scheduler"].has_queued("utterance")):
+            context["pending_transcript"] = text
+            logger.info(f"User still speaking in {session_id}; holding the transcript for the next utterance")
             return
             
-        # Save received audio to temporary file
-        temp_dir = os.path.join(os.path.dirname(__file__), "..", "temp_audio")
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_filename = f"live_{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.urandom(4).hex()}.wav"
-        temp_audio_path = os.path.join(temp_dir, temp_filename)
-        
-        # Check if audio data is already in WAV format or convert it
-        try:
-            with open(temp_audio_path, "wb") as f:
-                f.write(binary_data)
-                
-            # Get language code for STT
-            language_code = context.get("language_code", "en")
-            if len(language_code) <= 3 and '-' not in language_code:
-                language_code = f"{language_code}-IN"
-                
-            # Initialize Sarvam AI client and transcribe
-            client = SarvamAI(api_subscription_key=SARVAM_AI_API_KEY)
-            with open(temp_audio_path, "rb") as audio_file:
-                response = client.speech_to_text.transcribe(
-                    file=audio_file,
-                    model="saarika:v1",
-                    language_code=language_code
-                )
+        # Process only if we got meaningful text
+        if text and text.strip():
+            # From here on a barge-in cancels this reply
+            context["scheduler"].mark_replying()
             
-            # Extract transcript text
-            if isinstance(response, dict):
-                text = response.get("transcript", "")
-            else:
-                text = getattr(response, "transcript", str(response))
-                
-            # Process only if we got meaningful text
-            if text and text.strip():
-                # Add to conversation history
-                context["history"].append({"role": "user", "content": text})
-                connection_manager.update_context(session_id, context)
-                
-                # Send transcription to client
-                await connection_manager.send_text(
-                    session_id, 
-                    f"You: {text}"
-                )
-                
-                # Generate bot response
-                bot_response = generate_reply(
+            # Add to conversation history
+            context["history"].append({"role": "user", "content": text})
+            connection_manager.update_context(session_id, context)
+            
+            async def reply_sentences():
+                """Forward LLM deltas to the client and yield TTS chunks as sentences complete"""
+                llm_timings = {}
+                llm_started = time.perf_counter()
+                parts = []
+                buffer = ""
+                async for delta in stream_reply(
                     llm_model, 
                     text, 
                     language_code[:2] if '-' in language_code else language_code,
-                    context["history"]
-                )
+                    context["history"],
+                    timings=llm_timings
+                ):
+                    parts.append(delta)
+                    await connection_manager.send_text(session_id, delta, "text_delta")
+                    complete, buffer = split_complete_sentences(buffer + delta)
+                    for chunk in chunk_text(strip_markdown(complete)):
+                        timings.setdefault("first_sentence_ms", (time.perf_counter() - turn_started) * 1000)
+                        yield chunk
+                
+                timings["llm_ttft_ms"] = llm_timings.get("ttft_ms", 0.0)
+                timings["llm_ms"] = (time.perf_counter() - llm_started) * 1000
                 
-                # Add bot response to history
+                # Add bot response to history and send the full text to the client
+                bot_response = "".join(parts)
                 context["history"].append({"role": "assistant", "content": bot_response})
                 connection_manager.update_context(session_id, context)
-                
-                # Send text response to client
                 await connection_manager.send_text(session_id, bot_response)
                 
-                # Convert bot response to speech
-                tts_result = tts_service.text_to_speech(
-                    text=bot_response,
-                    target_language_code=f"{language_code[:2]}-IN" if '-' not in language_code else language_code,
-                    speaker=None,  # Will use default based on language
-                    model="bulbul:v1",
-                    enable_preprocessing=True
-                )
-                
-                if tts_result and "audio_base64" in tts_result:
-                    # Decode the base64 audio and send as binary
-                    audio_bytes = base64.b64decode(tts_result["audio_base64"])
-                    await connection_manager.send_binary(session_id, audio_bytes)
-                else:
-                    logger.warning(f"No audio data in TTS response for session {session_id}")
-            else:
-                # No transcription
-                await connection_manager.send_text(
-                    session_id, 
-                    "System: I couldn't hear what you said. Please try again."
-                )
-                
-        except Exception as e:
-            logger.error(f"Error processing audio: {e}", exc_info=True)
+                for chunk in chunk_text(strip_markdown(buffer)):
+                    timings.setdefault("first_sentence_ms", (time.perf_counter() - turn_started) * 1000)
+                    yield chunk
+            
+            await stream_speech(session_id, reply_sentences(), language_code, timings, turn_started)
+            
+            timings["total_ms"] = (time.perf_counter() - turn_started) * 1000
+            for stage in ("stt_ms", "llm_ttft_ms", "first_sentence_ms", "first_audio_ms", "total_ms"):
+                if stage in timings:
+                    STAGE_SECONDS.observe(timings[stage] / 1000, stage=f"voice_turn.{stage[:-3]}")
+            timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+            trace = current_span()
+            logger.info(
+                f"Voice turn for {session_id}: "
+                + " ".join(f"{stage}={value}" for stage, value in timings.items())
+                + (f" trace={trace.trace_id}" if trace else "")
+            )
+            await connection_manager.send_json(session_id, {
+                "type": "turn_metrics",
+                **timings,
+                "trace_id": trace.trace_id if trace else None
+            })
+        elif pcm_data:
+            # No transcription
             await connection_manager.send_text(
                 session_id, 
-                f"System: Error processing audio: {str(e)}"
+                "System: I couldn't hear what you said. Please try again."
             )
             
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_audio_path):
-            try:
-                os.remove(temp_audio_path)
-            except Exception as e:
-                logger.error(f"Error removing temp file: {e}")
-                
-        # Reset recording state
-        context["is_recording"] = False
-        connection_manager.update_context(session_id, context)
+    except Exception as e:
+        logger.error(f"Error processing audio: {e}", exc_info=True)
+        await connection_manager.send_text(
+            session_id, 
+            f"System: Error processing audio: {str(e)}"
+        )
+    
+
+async def stream_speech(session_id: str, chunks, language_code: str, timings=None, turn_started=None):
+    """
+    Synthesize TTS chunks as they arrive and send each chunk's PCM frames to
+    the client as soon as it is ready, preceded by an audio_format message
+    
+    Args:
+        chunks: Async iterable of speakable text chunks
+        timings: Optional dict that receives "first_audio_ms" (measured from
+                 turn_started) and "tts_chunks"
+    """
+    if timings is None:
+        timings = {}
+    if turn_started is None:
+        turn_started = time.perf_counter()
     
+    target_language_code, speaker = resolve_voice(
+        language_code[:2],
+        language_code if '-' in language_code else None
+    )
+    
+    audio_params = None
+    sent = 0
+    async for i, result in synthesize_stream(
+        chunks, target_language_code, speaker, "bulbul:v1", True
+    ):
+        if isinstance(result, Exception):
+            logger.warning(f"TTS chunk {i+1} failed for session {session_id}: {result}")
+            continue
+        
+        params, audio_data = result
+        if audio_params is None:
+            audio_params = params
+            sample_rate, sample_width, n_channels = params
+            await connection_manager.send_json(session_id, {
+                "type": "audio_format",
+                "sample_rate": sample_rate,
+                "sample_width": sample_width,
+                "channels": n_channels
+            })
+        elif params != audio_params:
+            logger.warning(f"TTS chunk {i+1} format {params} does not match {audio_params}")
+            continue
+        
+        await connection_manager.send_binary(session_id, audio_data)
+        timings.setdefault("first_audio_ms", (time.perf_counter() - turn_started) * 1000)
+        sent += 1
+    
+    timings["tts_chunks"] = sent
+    if audio_params is None:
+        logger.warning(f"No audio data in TTS response for session {session_id}")
+
 
 async def process_message(session_id: str, text: str, screenshot: Optional[str], llm_model):
     """Process a message with or without screenshot using the LLM"""
@@ -372,7 +822,7 @@ async def process_message(session_id: str, text: str, screenshot: Optional[str],
             # Process using the image processing function with enhanced screenshot guidance
             if text:
                 # Text with screenshot
-                if any(keyword in text.lower() for keyword in ["help", "guide", "how to", "what should", "next step", "explain"]):
+                if classify_intent(text, has_image=True) != REGULAR:
                     # User is explicitly asking for guidance based on what's on their screen
                     prompt = f"The user has shared their screen and is asking for help: '{text}'. Provide step-by-step guidance on what they're seeing and how to proceed next."
                 else:
@@ -382,21 +832,66 @@ async def process_message(session_id: str, text: str, screenshot: Optional[str],
                 # Screenshot only - assume user needs help understanding what's on screen
                 prompt = "The user has shared their screen without text. Analyze what's visible, explain key elements, and provide step-by-step guidance on possible next actions based on what you see."
                 
-            # Use the dedicated image processing function with conversation history
-            bot_response = process_image_with_text(
-                llm_model, 
-                screenshot, 
-                prompt, 
-                language_code,
-                conversation_history
+            pipeline = context["screenshot_pipeline"]
+            try:
+                frame = await pipeline.prepare(screenshot, text, language_code)
+            except ValueError as e:
+                await connection_manager.send_text(session_id, f"System: {e}")
+                return
+            
+            if frame["image"] is None and not frame["reused_answer"]:
+                # Standalone frame identical to the last one; nothing new to describe
+                logger.info(f"Skipped unchanged screenshot for {session_id}")
+                await connection_manager.send_text(session_id, "System: Screen unchanged since the last screenshot.")
+                return
+            
+            if frame["reused_answer"]:
+                bot_response = frame["reused_answer"]
+            else:
+                # Use the dedicated image processing function with conversation history
+                llm_started = time.perf_counter()
+                if frame["region"]:
+                    prompt = (
+                        "The first image is a low-resolution view of the whole screen; the second "
+                        "is the part of the screen that changed since the previous capture, at full "
+                        f"resolution. {prompt}"
+                    )
+                bot_response = await process_image_with_text(
+                    llm_model, 
+                    frame["image"], 
+                    prompt, 
+                    language_code,
+                    conversation_history,
+                    context_image=frame["context_image"],
+                    user_text=text
+                )
+                frame["timings"]["llm"] = (time.perf_counter() - llm_started) * 1000
+                pipeline.metrics.record_stage("llm", frame["timings"]["llm"])
+                pipeline.remember(text, language_code, bot_response)
+            
+            logger.info(
+                f"Screenshot for {session_id}: unchanged={frame['unchanged']} "
+                f"reused={bool(frame['reused_answer'])} region={frame['region']} "
+                + " ".join(f"{stage}={ms:.0f}ms" for stage, ms in frame["timings"].items())
             )
         else:
-            # Text-only message with conversation history
-            bot_response = generate_reply(
+            # Text-only message: stream deltas so the client can render the reply
+            # as it is generated, then send the full text as before
+            timings = {}
+            parts = []
+            async for delta in stream_reply(
                 llm_model, 
                 text, 
                 language_code,
-                conversation_history
+                conversation_history,
+                timings=timings
+            ):
+                parts.append(delta)
+                await connection_manager.send_text(session_id, delta, "text_delta")
+            bot_response = "".join(parts)
+            logger.info(
+                f"Streamed reply for {session_id}: "
+                f"ttft={timings.get('ttft_ms', 0):.0f}ms total={timings.get('total_ms', 0):.0f}ms"
             )
             
         # Add bot response to history
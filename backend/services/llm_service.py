@@ -1,9 +1,22 @@
 import os
+import asyncio
 from google import genai
 from google.genai import types
 import base64
 import re
+import time
 import pathlib
+from services.prompt_builder import assemble_prompt, build_generate_config
+from services.pdf_registry import pdf_registry, is_stale_handle_error
+from services.response_cache import response_cache
+from services.intent_router import classify_intent, PROCESS, SCREEN_GUIDANCE
+from utils.language_registry import language_name
+from utils.metrics import track_upstream, record_upstream, STAGE_SECONDS
+
+# Upper bound on Gemini requests in flight per worker, so a burst of sessions
+# queues here instead of opening unbounded upstream connections
+MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("MAX_CONCURRENT_LLM_REQUESTS", "16"))
+_llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_REQUESTS)
 
 def init_llm():
     """Initialize the LLM service"""
@@ -15,130 +28,188 @@ def init_llm():
     client = genai.Client(api_key=api_key)
     return client
 
-# System message to ensure Gemini maintains conversational memory and autonomously guides users
-AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT = """
-You are an advanced AI assistant that maintains complete memory of the conversation and proactively guides users.
-
-IMPORTANT GUIDELINES:
-1. ALWAYS maintain memory of previous interactions in this conversation
-2. Independently decide on the next steps without requiring explicit user confirmation
-3. Proactively offer relevant guidance based on the context and history of the conversation
-4. Remember specific details the user has mentioned previously and use them in your responses
-5. If a task spans multiple steps, keep track of which steps have been completed and which remain
-6. Take initiative to ask clarifying questions when needed rather than waiting for more information
-7. When the user hasn't provided a specific request, use conversation history to determine the most helpful next action
-8. Adjust your responses based on what has already been discussed to avoid repetition
-9. When a user shares a problem, remember it throughout the conversation until it's resolved
-
-Your goal is to demonstrate intelligent memory and autonomous decision-making to help users accomplish their tasks efficiently.
-"""
-
-# System message to guide Gemini to provide one-step-at-a-time assistance
-STEP_BY_STEP_SYSTEM_PROMPT = """
-You are an intelligent assistant designed to help users accomplish tasks by guiding them through ONE STEP AT A TIME.
-
-IMPORTANT: When responding to a user's request to complete a process or task:
-1. First, acknowledge the user's goal and express your intention to guide them
-2. Instead of listing all steps at once, FOCUS ONLY ON THE FIRST OR NEXT STEP
-3. For this single step:
-   - Provide a clear, specific instruction on what to do
-   - Explain why this step is important (if relevant)
-   - Include any cautions or tips that might help avoid common mistakes
-4. Use simple language and avoid technical jargon unless necessary
-5. After describing the step, ask the user to confirm when they've completed it
-6. Only after the user confirms completion of one step should you proceed to the next step
-7. If the user is confused or needs clarification, provide more details about the current step
-
-Remember to tailor your guidance to the user's indicated level of familiarity with the topic.
-Provide more detailed explanations for beginners and more concise guidance for experienced users.
-If the user is asking a simple question that doesn't require step-by-step instructions, respond conversationally.
-"""
-
-# System message for screenshot analysis and step-by-step guidance
-SCREENSHOT_GUIDANCE_SYSTEM_PROMPT = """
-You are a specialized assistant focused on analyzing screenshots and providing real-time guidance.
-You understand that the screenshots you're seeing are from the user's current screen, and they need help navigating
-or understanding what they're seeing.
-
-IMPORTANT: When guiding a user through a multi-step process:
-1. Focus ONLY on the IMMEDIATE NEXT STEP the user needs to take
-2. Do NOT list all steps of the process at once
-3. Guide the user through ONE STEP AT A TIME, waiting for them to complete each step before proceeding
-4. Ask for confirmation after each step is completed before providing the next step
-
-When analyzing the current screenshot:
-1. First, identify what's visible in the screenshot (application, webpage, dialog, etc.)
-2. Assess what the user is trying to accomplish based on the screenshot and their query
-3. Determine the SINGLE NEXT ACTION the user should take
-4. Provide clear, specific guidance for this ONE step:
-   - Highlight exactly which button, link, or field the user should interact with
-   - Explain precisely what the user should do (click, type, select, etc.)
-   - Mention where on the screen the element is located using directional terms
-5. If you notice potential issues or warnings on the screen, point them out
-6. After describing the step, ask the user to confirm when they've completed it
-
-Since these are live screenshots, your guidance will help the user navigate in real-time.
-Be concise but specific. Use directional terms like "In the top-right corner" or "At the bottom of the form" 
-to help them locate elements quickly.
-
-If something is unclear or partially visible in the screenshot, acknowledge this and ask for clarification
-before proceeding.
-"""
-
-def generate_reply(model, user_text, language_code, conversation_history=None):
-    """Generate a reply using LLM in the specified language with conversation memory"""
-    if not model:
-        return f"आपने कहा: {user_text}"
+async def generate_content(client, **kwargs):
+    """
+    Call Gemini through the SDK's async surface so the event loop keeps
+    serving other sessions while a request is in flight.
+    
+    Args:
+        client: The Gemini client returned by init_llm
+        **kwargs: Passed straight to models.generate_content
         
-    lang_map = {
-        "hi": "हिंदी", "en": "English", "ta": "தமிழ்", "bn": "বাংলা",
-        "gu": "ગુજરાતી", "mr": "मराठी", "te": "తెలుగు", "kn": "ಕನ್ನಡ",
-        "ml": "മലയാളം", "pa": "ਪੰਜਾਬੀ",
-    }
+    Returns:
+        The SDK response object
+    """
+    async with _llm_semaphore:
+        # Timed inside the semaphore so queueing here isn't counted as upstream latency
+        with track_upstream("gemini", kwargs.get("model", "unknown")):
+            return await client.aio.models.generate_content(**kwargs)
+
+def build_reply_prompt(user_text, language_code, conversation_history=None, context=None):
+    """
+    Assemble the structured prompt used by generate_reply and stream_reply
     
-    lang_name = lang_map.get(language_code, "हिंदी")
+    context is sent ahead of the user's words in the same turn (e.g. PDF
+    excerpts) but, unlike user_text, never affects the prompt variant.
+    """
+    lang_name = language_name(language_code, default="hi")
+    prefix = f"{context}\n\n" if context else ""
     
     # Check if the query appears to be asking for a process or how-to guidance
-    process_keywords = ["how to", "steps", "guide", "process", "procedure", "instructions", 
-                        "help me", "कैसे", "चरण", "मार्गदर्शन", "मदद", "步骤", "怎么",
-                        "எப்படி", "படிகள்", "வழிகாட்டி"]
-    
-    is_process_query = any(keyword in user_text.lower() for keyword in process_keywords)
+    if classify_intent(user_text) == PROCESS:
+        # For process queries, add the step-by-step system prompt
+        return assemble_prompt(
+            "process",
+            f"{prefix}Reply in {lang_name} language.\nUser said: {user_text}",
+            conversation_history,
+            current_text=user_text
+        )
+    # For regular queries, use the standard system prompt
+    return assemble_prompt(
+        "regular",
+        f"{prefix}Reply in {lang_name} and help the user. User said: {user_text}",
+        conversation_history,
+        current_text=user_text
+    )
+
+async def generate_reply(model, user_text, language_code, conversation_history=None, use_cache=True,
+                         context=None, cache_scope=None):
+    """
+    Generate a reply using LLM in the specified language with conversation memory
     
-    # Format conversation history if available
-    history_text = ""
-    if conversation_history and len(conversation_history) > 0:
-        history_text = "Previous conversation:\n"
-        for msg in conversation_history:
-            role = "User" if msg.get("role") == "user" else "Assistant"
-            content = msg.get("content", "")
-            history_text += f"{role}: {content}\n"
-        history_text += "\n"
+    Args:
+        user_text: The bare user question; it picks the prompt variant and
+                   is the response cache key
+        context: Optional text the answer must draw on (e.g. retrieved PDF
+                 excerpts), sent with the question
+        cache_scope: What the context came from (e.g. a file_id). Replies
+                     with context are only cached when it is given, and
+                     only reused within the same scope.
+        use_cache: Pass False to skip the response cache
+    """
+    if not model:
+        return f"आपने कहा: {user_text}"
+        
+    prompt = build_reply_prompt(user_text, language_code, conversation_history, context)
+    cache_variant = f"{prompt['variant']}@{cache_scope}" if cache_scope else prompt["variant"]
     
-    if is_process_query:
-        # For process queries, include the step-by-step system prompt and conversation history
-        prompt = f"{AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT}\n{STEP_BY_STEP_SYSTEM_PROMPT}\n\n{history_text}Reply in {lang_name} language.\nUser said: {user_text}"
+    # Only stand-alone questions are cached; with history the answer depends on context
+    cacheable = use_cache and not conversation_history and (not context or cache_scope)
+    if cacheable:
+        cached = response_cache.get(user_text, language_code, cache_variant)
+        if cached is not None:
+            return cached
     else:
-        # For regular queries, use the standard prompt with conversation history
-        prompt = f"{AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT}\n\n{history_text}Reply in {lang_name} and help the user. User said: {user_text}"
+        response_cache.record_bypass()
     
     try:
         # Use Gemini 2.0 Flash for standard queries
         model_version = 'gemini-2.0-flash-001'
         
-        response = model.models.generate_content(
+        response = await generate_content(
+            model,
             model=model_version,
-            contents=prompt
+            contents=prompt["contents"],
+            config=await build_generate_config(model, model_version, prompt)
         )
         bot_text = getattr(response, "text", None)
         if not bot_text:
-            bot_text = "API did not return a valid response."
+            return "API did not return a valid response."
     except Exception as e:
-        bot_text = f"API error: {e}"
-        
+        return f"API error: {e}"
+    
+    if cacheable:
+        response_cache.put(user_text, language_code, cache_variant, bot_text)
     return bot_text
 
-def process_image_with_text(model, image_data, prompt_text, language_code="en", conversation_history=None):
+async def stream_reply(model, user_text, language_code, conversation_history=None, timings=None):
+    """
+    Stream a reply from the LLM as incremental text deltas
+    
+    Args:
+        model: The Gemini model client
+        user_text: The user's message
+        language_code: Language code for the response
+        conversation_history: Previous messages in the conversation for context
+        timings: Optional dict that receives "ttft_ms" (time to first token)
+                 and "total_ms" once the stream finishes
+        
+    Yields:
+        Text fragments in the order Gemini produces them
+    """
+    if timings is None:
+        timings = {}
+    started = time.perf_counter()
+    
+    if not model:
+        timings["ttft_ms"] = timings["total_ms"] = 0.0
+        yield f"आपने कहा: {user_text}"
+        return
+    
+    prompt = build_reply_prompt(user_text, language_code, conversation_history)
+    
+    cacheable = not conversation_history
+    if cacheable:
+        cached = response_cache.get(user_text, language_code, prompt["variant"])
+        if cached is not None:
+            timings["ttft_ms"] = timings["total_ms"] = (time.perf_counter() - started) * 1000
+            timings["cached"] = True
+            yield cached
+            return
+    else:
+        response_cache.record_bypass()
+    
+    try:
+        model_version = 'gemini-2.0-flash-001'
+        config = await build_generate_config(model, model_version, prompt)
+        parts = []
+        upstream_started = time.perf_counter()
+        stream = None
+        try:
+            # A slot is held only while Gemini is working (opening the stream,
+            # producing the next chunk), never while the consumer handles a
+            # chunk, so a slow client can't starve other sessions
+            async with _llm_semaphore:
+                stream = await model.aio.models.generate_content_stream(
+                    model=model_version,
+                    contents=prompt["contents"],
+                    config=config
+                )
+            chunks = stream.__aiter__()
+            while True:
+                async with _llm_semaphore:
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                text = getattr(chunk, "text", None)
+                if not text:
+                    continue
+                if "ttft_ms" not in timings:
+                    timings["ttft_ms"] = (time.perf_counter() - started) * 1000
+                parts.append(text)
+                yield text
+        except Exception as e:
+            record_upstream("gemini", f"{model_version}:stream", upstream_started, e)
+            raise
+        finally:
+            # Close the upstream stream if the consumer stopped early
+            if stream is not None and hasattr(stream, "aclose"):
+                await stream.aclose()
+        record_upstream("gemini", f"{model_version}:stream", upstream_started)
+        if cacheable and parts:
+            response_cache.put(user_text, language_code, prompt["variant"], "".join(parts))
+    except Exception as e:
+        timings.setdefault("ttft_ms", (time.perf_counter() - started) * 1000)
+        yield f"API error: {e}"
+    finally:
+        timings.setdefault("ttft_ms", (time.perf_counter() - started) * 1000)
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        STAGE_SECONDS.observe(timings["ttft_ms"] / 1000, stage="llm.ttft")
+        STAGE_SECONDS.observe(timings["total_ms"] / 1000, stage="llm.total")
+
+async def process_image_with_text(model, image_data, prompt_text, language_code="en", conversation_history=None,
+                                  context_image=None, user_text=None):
     """
     Process an image with text prompt using Gemini
     
@@ -148,6 +219,10 @@ def process_image_with_text(model, image_data, prompt_text, language_code="en",
         prompt_text: Text prompt to send with the image
         language_code: Language code for the response (default: "en")
         conversation_history: Previous messages in the conversation for context
+        context_image: Optional data URI sent before image_data, e.g. a
+                       thumbnail of the whole screen when image_data is a crop
+        user_text: The user's own words, when conversation_history already
+                   ends with them and prompt_text wraps them
         
     Returns:
         Generated text response
@@ -171,71 +246,50 @@ def process_image_with_text(model, image_data, prompt_text, language_code="en",
             image_bytes = base64.b64decode(base64_data)
             
             # Add language preference to the prompt if specified
-            lang_map = {
-                "hi": "हिंदी", "en": "English", "ta": "தமிழ்", "bn": "বাংলা",
-                "gu": "ગુજરાતી", "mr": "मराठी", "te": "తెలుగు", "kn": "ಕನ್ನಡ",
-                "ml": "മലയാളം", "pa": "ਪੰਜਾਬੀ",
-            }
-            
-            lang_name = lang_map.get(language_code, "English")
+            lang_name = language_name(language_code)
             
-            # Format conversation history if available
-            history_text = ""
-            if conversation_history and len(conversation_history) > 0:
-                history_text = "Previous conversation:\n"
-                for msg in conversation_history:
-                    role = "User" if msg.get("role") == "user" else "Assistant"
-                    content = msg.get("content", "")
-                    history_text += f"{role}: {content}\n"
-                history_text += "\n"
+            # Screen guidance, a how-to question, or a regular question about the image
+            variant = classify_intent(prompt_text, has_image=True)
             
-            # Check if the query appears to be asking for help with what's on screen
-            screen_help_keywords = ["what's on screen", "help me understand", "what do I see", 
-                                   "how to proceed", "next step", "guide me", "what should I do",
-                                   "how do I", "screen shows", "on my screen", "looking at"]
-            
-            # Detect if this is likely a request for guidance based on what's on screen
-            is_screen_guidance_query = (
-                any(keyword in prompt_text.lower() for keyword in screen_help_keywords) or
-                "screenshot" in prompt_text.lower() or
-                len(prompt_text.strip()) < 5  # Empty or very short prompt suggests just showing a screenshot
-            )
-            
-            if is_screen_guidance_query:
+            if variant == SCREEN_GUIDANCE:
                 # For screenshot guidance, use the specialized system prompt
-                screen_guidance_prompt = f"{AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT}\n{SCREENSHOT_GUIDANCE_SYSTEM_PROMPT}\n\n{history_text}Respond in {lang_name} language.\n\nAnalyze this screenshot and help the user understand what they're seeing and how to proceed. {prompt_text}"
-                full_prompt = screen_guidance_prompt
+                user_prompt = f"Respond in {lang_name} language.\n\nAnalyze this screenshot and help the user understand what they're seeing and how to proceed. {prompt_text}"
+            elif variant == PROCESS:
+                # For process queries, include the step-by-step system prompt
+                user_prompt = f"Respond in {lang_name} language. {prompt_text}"
             else:
-                # Check if it's a process query
-                process_keywords = ["how to", "steps", "guide", "process", "procedure", "instructions", 
-                                   "help me", "कैसे", "चरण", "मार्गदर्शन", "मदद", "步骤", "怎么",
-                                   "எப்படி", "படிகள்", "வழிகாட்டி"]
-                
-                is_process_query = any(keyword in prompt_text.lower() for keyword in process_keywords)
-                
-                if is_process_query:
-                    # For process queries, include the step-by-step system prompt
-                    full_prompt = f"{AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT}\n{STEP_BY_STEP_SYSTEM_PROMPT}\n\n{history_text}Respond in {lang_name} language. {prompt_text}"
+                # For regular queries about images
+                if language_code != "en":
+                    user_prompt = f"Respond in {lang_name} language. {prompt_text}"
                 else:
-                    # For regular queries about images
-                    if language_code != "en":
-                        full_prompt = f"{AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT}\n\n{history_text}Respond in {lang_name} language. {prompt_text}"
-                    else:
-                        full_prompt = f"{AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT}\n\n{history_text}{prompt_text}"
+                    user_prompt = prompt_text
+            
+            image_parts = [types.Part.from_bytes(data=image_bytes, mime_type=mime_type)]
+            if context_image:
+                context_match = re.match(pattern, context_image)
+                if context_match:
+                    image_parts.insert(0, types.Part.from_bytes(
+                        data=base64.b64decode(context_match.group(2)),
+                        mime_type=context_match.group(1)
+                    ))
+            
+            prompt = assemble_prompt(
+                variant,
+                user_prompt,
+                conversation_history,
+                image_part=image_parts,
+                current_text=user_text
+            )
             
             # Use the newer Gemini 2.5 Flash preview model for screenshot processing
             model_version = 'gemini-2.5-flash-preview-04-17'
             
             # Create the request with image and text
-            response = model.models.generate_content(
+            response = await generate_content(
+                model,
                 model=model_version,
-                contents=[
-                    types.Part.from_bytes(
-                        data=image_bytes,
-                        mime_type=mime_type,
-                    ),
-                    full_prompt
-                ]
+                contents=prompt["contents"],
+                config=await build_generate_config(model, model_version, prompt)
             )
             
             # Extract and return the response text
@@ -252,7 +306,7 @@ def process_image_with_text(model, image_data, prompt_text, language_code="en",
         print(f"Image processing error: {e}\n{error_details}")
         return f"Failed to process image: {str(e)}"
 
-def process_pdf_with_genai(model, pdf_path, query, language_code="en"):
+async def process_pdf_with_genai(model, pdf_path, query, language_code="en"):
     """
     Process a PDF document using Google Generative AI
     
@@ -270,16 +324,7 @@ def process_pdf_with_genai(model, pdf_path, query, language_code="en"):
     
     try:
         # Get the language name for the response
-        lang_map = {
-            "hi": "हिंदी", "en": "English", "ta": "தமிழ்", "bn": "বাংলা",
-            "gu": "ગુજરાતી", "mr": "मराठी", "te": "తెలుగు", "kn": "ಕನ್ನಡ",
-            "ml": "മലയാളം", "pa": "ਪੰਜਾਬੀ",
-        }
-        
-        lang_name = lang_map.get(language_code, "English")
-        
-        # Create a file path object
-        filepath = pathlib.Path(pdf_path)
+        lang_name = language_name(language_code)
         
         # Create a prompt that includes instructions to process the PDF
         prompt = f"Please analyze this PDF document and respond to the following query in {lang_name} language: {query}"
@@ -287,17 +332,30 @@ def process_pdf_with_genai(model, pdf_path, query, language_code="en"):
         # Use Gemini 2.0 Flash model which has PDF understanding capabilities
         model_version = 'gemini-2.0-flash'
         
-        # Send the PDF along with the query to Gemini using the simplified approach
-        response = model.models.generate_content(
-            model=model_version,
-            contents=[
-                types.Part.from_bytes(
-                    data=filepath.read_bytes(), 
-                    mime_type="application/pdf"
-                ),
-                prompt
-            ]
-        )
+        # Reference the PDF by its uploaded handle; it is only sent once per content
+        for attempt in range(2):
+            try:
+                pdf_part = await pdf_registry.get_part(model, pdf_path)
+            except Exception as e:
+                # Files API unavailable: fall back to sending the bytes inline
+                print(f"PDF upload failed, sending inline: {e}")
+                filepath = pathlib.Path(pdf_path)
+                pdf_bytes = await asyncio.to_thread(filepath.read_bytes)
+                pdf_part = types.Part.from_bytes(data=pdf_bytes, mime_type="application/pdf")
+            
+            try:
+                response = await generate_content(
+                    model,
+                    model=model_version,
+                    contents=[pdf_part, prompt]
+                )
+                break
+            except Exception as e:
+                # The remote file was deleted or expired early; upload again once
+                if attempt == 0 and is_stale_handle_error(e):
+                    pdf_registry.invalidate(pdf_path)
+                    continue
+                raise
         
         # Extract and return the response text
         if hasattr(response, "text"):
@@ -311,7 +369,7 @@ def process_pdf_with_genai(model, pdf_path, query, language_code="en"):
         print(f"PDF processing error: {e}\n{error_details}")
         return f"Failed to process PDF: {str(e)}"
 
-def search_with_gemini(model, query, language_code="en"):
+async def search_with_gemini(model, query, language_code="en"):
     """
     Use Gemini model with Google Search to answer queries with up-to-date information
     
@@ -328,20 +386,15 @@ def search_with_gemini(model, query, language_code="en"):
     
     try:
         # Get the language name for the response
-        lang_map = {
-            "hi": "हिंदी", "en": "English", "ta": "தமிழ்", "bn": "বাংলা",
-            "gu": "ગુજરાતી", "mr": "मराठी", "te": "తెలుగు", "kn": "ಕನ್ನಡ",
-            "ml": "മലയാളം", "pa": "ਪੰਜਾਬੀ",
-        }
-        
-        lang_name = lang_map.get(language_code, "English")
+        lang_name = language_name(language_code)
         
         # Create the search query with language instructions
         search_query = f"Answer this query in {lang_name} language: {query}"
         
         # Use the direct approach with Google Search 
         # Note: Use google_search instead of google_search_retrieval as per the API requirement
-        response = model.models.generate_content(
+        response = await generate_content(
+            model,
             model='gemini-2.0-flash',
             contents=search_query,
             config=types.GenerateContentConfig(
@@ -0,0 +1,186 @@
+import os
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Default number of messages kept per conversation before the oldest are dropped
+DEFAULT_RETENTION = int(os.getenv("MESSAGE_RETENTION", "10000"))
+
+class MessageStore(ABC):
+    """
+    Append-only chat history, partitioned by conversation ID.
+
+    Every stored message gets a monotonically increasing integer "id" that
+    doubles as the pagination cursor: list(after=cursor) returns messages
+    newer than the cursor, and list() without one returns the most recent
+    page. Conversations are capped at `retention` messages.
+
+    Methods are synchronous and may block on I/O; async code should call
+    them through asyncio.to_thread.
+    """
+
+    def __init__(self, retention: int = DEFAULT_RETENTION):
+        self.retention = retention
+
+    @abstractmethod
+    def append(self, conversation_id: str, message: Dict) -> Dict:
+        """Store a message and return it with its assigned id"""
+
+    @abstractmethod
+    def list(self, conversation_id: str, after: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Return a page of messages in chronological order
+
+        Returns:
+            tuple: (messages, next_cursor); next_cursor is the id of the last
+                   returned message, or the given cursor if nothing is newer
+        """
+
+    @abstractmethod
+    def is_empty(self, conversation_id: str) -> bool:
+        """True if the conversation has no stored messages"""
+
+    def close(self):
+        """Release any resources held by the store"""
+
+
+class InMemoryMessageStore(MessageStore):
+    """Process-local store; fast, but lost on restart and not shared between workers"""
+
+    def __init__(self, retention: int = DEFAULT_RETENTION):
+        super().__init__(retention)
+        self._conversations: Dict[str, deque] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, conversation_id, message):
+        with self._lock:
+            stored = dict(message, id=self._next_id)
+            self._next_id += 1
+            if conversation_id not in self._conversations:
+                self._conversations[conversation_id] = deque(maxlen=self.retention)
+            self._conversations[conversation_id].append(stored)
+        return stored
+
+    def list(self, conversation_id, after=None, limit=50):
+        with self._lock:
+            history = self._conversations.get(conversation_id)
+            if not history:
+                return [], after
+            if after is None:
+                start = max(0, len(history) - limit)
+            else:
+                # ids increase along the deque, so binary search for the cursor
+                lo, hi = 0, len(history)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if history[mid]["id"] <= after:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                start = lo
+            page = [dict(history[i]) for i in range(start, min(start + limit, len(history)))]
+        return page, (page[-1]["id"] if page else after)
+
+    def is_empty(self, conversation_id):
+        with self._lock:
+            return not self._conversations.get(conversation_id)
+
+
+class SQLiteMessageStore(MessageStore):
+    """
+    Durable store on SQLite in WAL mode, so readers don't block the writer
+    and several workers can share one database file.
+    """
+
+    # Prune a conversation's old rows every this many of its own appends
+    # (or every `retention` appends if that is smaller) instead of on every
+    # write, so a conversation never holds more than twice its retention
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path: str, retention: int = DEFAULT_RETENTION):
+        super().__init__(retention)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        # conversation_id -> appends since that conversation was last pruned
+        self._appends_since_prune: Dict[str, int] = {}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " conversation_id TEXT NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_conversation"
+                " ON messages (conversation_id, id)"
+            )
+
+    def append(self, conversation_id, message):
+        payload = json.dumps(message, ensure_ascii=False)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (conversation_id, payload) VALUES (?, ?)",
+                (conversation_id, payload)
+            )
+            message_id = cursor.lastrowid
+            appends = self._appends_since_prune.get(conversation_id, 0) + 1
+            if appends >= min(self.PRUNE_INTERVAL, self.retention):
+                self._prune(conversation_id)
+                self._appends_since_prune.pop(conversation_id, None)
+            else:
+                self._appends_since_prune[conversation_id] = appends
+        return dict(message, id=message_id)
+
+    def _prune(self, conversation_id):
+        """Drop messages beyond the retention limit for one conversation"""
+        self._conn.execute(
+            "DELETE FROM messages WHERE conversation_id = ? AND id <= ("
+            " SELECT id FROM messages WHERE conversation_id = ?"
+            " ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (conversation_id, conversation_id, self.retention)
+        )
+
+    def list(self, conversation_id, after=None, limit=50):
+        with self._lock:
+            if after is None:
+                rows = self._conn.execute(
+                    "SELECT id, payload FROM messages WHERE conversation_id = ?"
+                    " ORDER BY id DESC LIMIT ?",
+                    (conversation_id, limit)
+                ).fetchall()
+                rows.reverse()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, payload FROM messages WHERE conversation_id = ? AND id > ?"
+                    " ORDER BY id LIMIT ?",
+                    (conversation_id, after, limit)
+                ).fetchall()
+        page = [dict(json.loads(payload), id=message_id) for message_id, payload in rows]
+        return page, (page[-1]["id"] if page else after)
+
+    def is_empty(self, conversation_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM messages WHERE conversation_id = ? LIMIT 1",
+                (conversation_id,)
+            ).fetchone()
+        return row is None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_message_store():
+    """Build the store selected by MESSAGE_STORE ("sqlite" or "memory")"""
+    backend = os.getenv("MESSAGE_STORE", "sqlite").lower()
+    if backend == "memory":
+        return InMemoryMessageStore()
+    return SQLiteMessageStore(os.getenv("MESSAGE_DB_PATH", "messages.db"))
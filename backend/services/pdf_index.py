@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import math
+import tempfile
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+from utils.text_utils import split_text_for_tts
+
+# Characters per indexed passage
+PASSAGE_CHARS = int(os.getenv("PDF_PASSAGE_CHARS", "800"))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Bumped when tokenization changes, so indexes on disk are rebuilt
+INDEX_VERSION = 2
+
+# Parsed indexes kept in memory (least recently used are dropped beyond this)
+PDF_INDEX_CACHE_SIZE = int(os.getenv("PDF_INDEX_CACHE_SIZE", "32"))
+
+# Word characters plus the letters, marks and digits of the Indic blocks
+# (Devanagari through Malayalam), so vowel signs and viramas stay inside the
+# word. Indic punctuation such as the danda (।, ॥) is left out, so a
+# sentence-final "है।" indexes as "है".
+_INDIC_WORD_CHARS = "".join(
+    chr(code_point) for code_point in range(0x0900, 0x0D80)
+    if unicodedata.category(chr(code_point))[0] in "LMN"
+)
+_TOKEN = re.compile(f"[\\w{re.escape(_INDIC_WORD_CHARS)}]+")
+
+# Parsed indexes, keyed by file_id, in least-recently-used order
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+def _cache_index(file_id, index):
+    with _index_cache_lock:
+        _index_cache[file_id] = index
+        _index_cache.move_to_end(file_id)
+        while len(_index_cache) > PDF_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+
+def _cached_index(file_id):
+    with _index_cache_lock:
+        index = _index_cache.get(file_id)
+        if index is not None:
+            _index_cache.move_to_end(file_id)
+        return index
+
+def tokenize(text):
+    """Lower-cased word tokens for indexing and querying"""
+    return _TOKEN.findall(text.lower())
+
+def index_path(pdf_path):
+    """Location of the index stored next to an uploaded PDF"""
+    return f"{pdf_path}.index.json"
+
+def extract_pages(pdf_path):
+    """Extract the text of each page of a PDF"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+def build_pdf_index(pdf_path):
+    """
+    Extract, split and index a PDF, writing the index next to it
+
+    Returns:
+        dict: The index, with "passages" ({"page", "text"}), "postings"
+              (term -> [[passage, term frequency], ...]), "lengths" and
+              "avg_length"
+    """
+    passages = []
+    for page_number, page_text in enumerate(extract_pages(pdf_path), start=1):
+        text = " ".join(page_text.split())
+        for passage in split_text_for_tts(text, PASSAGE_CHARS):
+            passages.append({"page": page_number, "text": passage})
+
+    postings = {}
+    lengths = []
+    for passage_id, passage in enumerate(passages):
+        terms = Counter(tokenize(passage["text"]))
+        lengths.append(sum(terms.values()))
+        for term, count in terms.items():
+            postings.setdefault(term, []).append([passage_id, count])
+
+    index = {
+        "version": INDEX_VERSION,
+        "passages": passages,
+        "postings": postings,
+        "lengths": lengths,
+        "avg_length": (sum(lengths) / len(lengths)) if lengths else 0.0,
+    }
+
+    # A unique temp file per build: the ingestion worker and a /pdf_query
+    # fallback can build the same index at once, and each must replace the
+    # final file with a complete copy of its own
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(index_path(pdf_path)) or ".",
+        prefix=os.path.basename(index_path(pdf_path)) + ".",
+        suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_path, index_path(pdf_path))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    _cache_index(os.path.basename(pdf_path), index)
+    print(f"Indexed {pdf_path}: {len(passages)} passages, {len(postings)} terms")
+    return index
+
+def load_pdf_index(pdf_path):
+    """Load a PDF's index, building it first if the PDF predates indexing"""
+    file_id = os.path.basename(pdf_path)
+    index = _cached_index(file_id)
+    if index is not None:
+        return index
+
+    try:
+        with open(index_path(pdf_path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return build_pdf_index(pdf_path)
+    if index.get("version") != INDEX_VERSION:
+        return build_pdf_index(pdf_path)
+
+    _cache_index(file_id, index)
+    return index
+
+def search_pdf_index(index, query, top_k=4):
+    """
+    Rank passages against a query with BM25
+
+    Returns:
+        list: Up to top_k passages ({"page", "text", "score"}), best first
+    """
+    passages = index["passages"]
+    if not passages:
+        return []
+
+    total = len(passages)
+    avg_length = index["avg_length"] or 1.0
+    scores = Counter()
+    for term in set(tokenize(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+        for passage_id, tf in postings:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index["lengths"][passage_id] / avg_length)
+            scores[passage_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    return [
+        dict(passages[passage_id], score=round(score, 3))
+        for passage_id, score in scores.most_common(top_k)
+    ]
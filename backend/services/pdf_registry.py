@@ -0,0 +1,143 @@
+import os
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from google.genai import types
+from utils.metrics import track_upstream
+
+# Files uploaded to Gemini expire after 48 hours; re-upload a little before that
+DEFAULT_REMOTE_TTL = 47 * 3600
+# Drop handles that haven't been used for this long and delete the remote copy
+PDF_HANDLE_IDLE_TTL = int(os.getenv("PDF_HANDLE_IDLE_TTL", str(6 * 3600)))
+# Refresh handles this many seconds before they expire
+EXPIRY_MARGIN = 300
+
+def _hash_file(path):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _expiry_timestamp(remote_file):
+    """Wall-clock expiry of an uploaded file, falling back to the documented TTL"""
+    expiration = getattr(remote_file, "expiration_time", None)
+    if isinstance(expiration, datetime):
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        return expiration.timestamp()
+    return time.time() + DEFAULT_REMOTE_TTL
+
+def is_stale_handle_error(error):
+    """True if Gemini rejected a request because the referenced file is gone"""
+    message = str(error)
+    return "NOT_FOUND" in message or "PERMISSION_DENIED" in message or "expired" in message.lower()
+
+
+class PdfRegistry:
+    """
+    Upload-once registry of PDFs sent to Gemini.
+
+    Each PDF is uploaded through the Files API the first time it is queried
+    and follow-up questions reference the remote file by URI instead of
+    re-sending the bytes. Handles are keyed by content hash, so identical
+    uploads under different file_ids share one remote file. Handles are
+    re-uploaded shortly before they expire and deleted after sitting idle
+    for PDF_HANDLE_IDLE_TTL seconds.
+    """
+
+    def __init__(self, idle_ttl=PDF_HANDLE_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        # file_id -> (content hash, mtime, size), so unchanged files aren't rehashed
+        self._file_hashes = {}
+        # content hash -> {"name", "uri", "mime_type", "expires_at", "last_used"}
+        self._handles = {}
+        self._locks = {}
+
+        self.uploads = 0
+        self.reuses = 0
+
+    async def _content_hash(self, file_id, path):
+        stat = os.stat(path)
+        known = self._file_hashes.get(file_id)
+        if known and known[1] == stat.st_mtime and known[2] == stat.st_size:
+            return known[0]
+        content_hash = await asyncio.to_thread(_hash_file, path)
+        self._file_hashes[file_id] = (content_hash, stat.st_mtime, stat.st_size)
+        return content_hash
+
+    async def get_part(self, client, path, file_id=None):
+        """
+        Return a Part referencing the uploaded PDF, uploading it if needed
+
+        Args:
+            client: The Gemini client
+            path: Local path of the PDF
+            file_id: Upload ID (defaults to the file name)
+        """
+        file_id = file_id or os.path.basename(path)
+        await self.evict_idle(client)
+
+        content_hash = await self._content_hash(file_id, path)
+        lock = self._locks.setdefault(content_hash, asyncio.Lock())
+        async with lock:
+            handle = self._handles.get(content_hash)
+            now = time.time()
+            if handle is None or handle["expires_at"] - EXPIRY_MARGIN <= now:
+                with track_upstream("gemini", "files.upload"):
+                    remote_file = await client.aio.files.upload(
+                        file=path,
+                        config=types.UploadFileConfig(
+                            mime_type="application/pdf",
+                            display_name=file_id
+                        )
+                    )
+                handle = {
+                    "name": remote_file.name,
+                    "uri": remote_file.uri,
+                    "mime_type": remote_file.mime_type or "application/pdf",
+                    "expires_at": _expiry_timestamp(remote_file),
+                    "last_used": now,
+                }
+                self._handles[content_hash] = handle
+                self.uploads += 1
+                print(f"Uploaded PDF {file_id} to Gemini as {handle['name']}")
+            else:
+                handle["last_used"] = now
+                self.reuses += 1
+
+        return types.Part.from_uri(file_uri=handle["uri"], mime_type=handle["mime_type"])
+
+    def invalidate(self, path, file_id=None):
+        """Forget the handle for a PDF, e.g. after Gemini reports it missing"""
+        file_id = file_id or os.path.basename(path)
+        known = self._file_hashes.get(file_id)
+        if known:
+            self._handles.pop(known[0], None)
+
+    async def evict_idle(self, client):
+        """Delete remote files for handles that are expired or idle past the TTL"""
+        now = time.time()
+        stale = [
+            content_hash for content_hash, handle in self._handles.items()
+            if handle["expires_at"] <= now or now - handle["last_used"] > self.idle_ttl
+        ]
+        for content_hash in stale:
+            handle = self._handles.pop(content_hash)
+            self._locks.pop(content_hash, None)
+            if handle["expires_at"] > now:
+                try:
+                    await client.aio.files.delete(name=handle["name"])
+                except Exception as e:
+                    print(f"Failed to delete remote PDF {handle['name']}: {e}")
+
+    def stats(self):
+        return {
+            "handles": len(self._handles),
+            "uploads": self.uploads,
+            "reuses": self.reuses,
+        }
+
+pdf_registry = PdfRegistry()
@@ -0,0 +1,308 @@
+import os
+import time
+import asyncio
+from google.genai import types
+
+# System message to ensure Gemini maintains conversational memory and autonomously guides users
+AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT = """
+You are an advanced AI assistant that maintains complete memory of the conversation and proactively guides users.
+
+IMPORTANT GUIDELINES:
+1. ALWAYS maintain memory of previous interactions in this conversation
+2. Independently decide on the next steps without requiring explicit user confirmation
+3. Proactively offer relevant guidance based on the context and history of the conversation
+4. Remember specific details the user has mentioned previously and use them in your responses
+5. If a task spans multiple steps, keep track of which steps have been completed and which remain
+6. Take initiative to ask clarifying questions when needed rather than waiting for more information
+7. When the user hasn't provided a specific request, use conversation history to determine the most helpful next action
+8. Adjust your responses based on what has already been discussed to avoid repetition
+9. When a user shares a problem, remember it throughout the conversation until it's resolved
+
+Your goal is to demonstrate intelligent memory and autonomous decision-making to help users accomplish their tasks efficiently.
+"""
+
+# System message to guide Gemini to provide one-step-at-a-time assistance
+STEP_BY_STEP_SYSTEM_PROMPT = """
+You are an intelligent assistant designed to help users accomplish tasks by guiding them through ONE STEP AT A TIME.
+
+IMPORTANT: When responding to a user's request to complete a process or task:
+1. First, acknowledge the user's goal and express your intention to guide them
+2. Instead of listing all steps at once, FOCUS ONLY ON THE FIRST OR NEXT STEP
+3. For this single step:
+   - Provide a clear, specific instruction on what to do
+   - Explain why this step is important (if relevant)
+   - Include any cautions or tips that might help avoid common mistakes
+4. Use simple language and avoid technical jargon unless necessary
+5. After describing the step, ask the user to confirm when they've completed it
+6. Only after the user confirms completion of one step should you proceed to the next step
+7. If the user is confused or needs clarification, provide more details about the current step
+
+Remember to tailor your guidance to the user's indicated level of familiarity with the topic.
+Provide more detailed explanations for beginners and more concise guidance for experienced users.
+If the user is asking a simple question that doesn't require step-by-step instructions, respond conversationally.
+"""
+
+# System message for screenshot analysis and step-by-step guidance
+SCREENSHOT_GUIDANCE_SYSTEM_PROMPT = """
+You are a specialized assistant focused on analyzing screenshots and providing real-time guidance.
+You understand that the screenshots you're seeing are from the user's current screen, and they need help navigating
+or understanding what they're seeing.
+
+IMPORTANT: When guiding a user through a multi-step process:
+1. Focus ONLY on the IMMEDIATE NEXT STEP the user needs to take
+2. Do NOT list all steps of the process at once
+3. Guide the user through ONE STEP AT A TIME, waiting for them to complete each step before proceeding
+4. Ask for confirmation after each step is completed before providing the next step
+
+When analyzing the current screenshot:
+1. First, identify what's visible in the screenshot (application, webpage, dialog, etc.)
+2. Assess what the user is trying to accomplish based on the screenshot and their query
+3. Determine the SINGLE NEXT ACTION the user should take
+4. Provide clear, specific guidance for this ONE step:
+   - Highlight exactly which button, link, or field the user should interact with
+   - Explain precisely what the user should do (click, type, select, etc.)
+   - Mention where on the screen the element is located using directional terms
+5. If you notice potential issues or warnings on the screen, point them out
+6. After describing the step, ask the user to confirm when they've completed it
+
+Since these are live screenshots, your guidance will help the user navigate in real-time.
+Be concise but specific. Use directional terms like "In the top-right corner" or "At the bottom of the form" 
+to help them locate elements quickly.
+
+If something is unclear or partially visible in the screenshot, acknowledge this and ask for clarification
+before proceeding.
+"""
+
+# Prompt variants and the static system prompts each one uses. The system
+# instruction for a variant never changes, which is what makes it cacheable.
+VARIANT_SYSTEM_PROMPTS = {
+    "regular": (AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT,),
+    "process": (AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT, STEP_BY_STEP_SYSTEM_PROMPT),
+    "screen_guidance": (AUTONOMOUS_ASSISTANT_SYSTEM_PROMPT, SCREENSHOT_GUIDANCE_SYSTEM_PROMPT),
+}
+
+_SYSTEM_INSTRUCTIONS = {
+    variant: "\n".join(part.strip() for part in parts)
+    for variant, parts in VARIANT_SYSTEM_PROMPTS.items()
+}
+
+def system_instruction_for(variant):
+    """Static system instruction text for a prompt variant"""
+    return _SYSTEM_INSTRUCTIONS.get(variant, _SYSTEM_INSTRUCTIONS["regular"])
+
+def build_contents(conversation_history, user_parts):
+    """
+    Convert conversation history into structured Gemini turns.
+    
+    Args:
+        conversation_history: List of {"role", "content"} dicts or a
+                              ConversationHistory (may start with a summary)
+        user_parts: Parts for the final user turn (text and/or image)
+        
+    Returns:
+        list: types.Content turns ending with the current user turn
+    """
+    turns = []
+    for msg in conversation_history or []:
+        content = msg.get("content", "")
+        if not content:
+            continue
+        if msg.get("role") == "summary":
+            # Folded older turns travel as context from the user side
+            role, content = "user", f"Summary of earlier conversation:\n{content}"
+        else:
+            role = "user" if msg.get("role") == "user" else "model"
+        turns.append((role, content))
+    
+    contents = []
+    for role, text in turns:
+        # Gemini expects alternating roles, so merge consecutive same-role turns
+        if contents and contents[-1].role == role:
+            contents[-1].parts.append(types.Part.from_text(text=text))
+        else:
+            contents.append(types.Content(role=role, parts=[types.Part.from_text(text=text)]))
+    
+    if contents and contents[-1].role == "user":
+        contents[-1].parts.extend(user_parts)
+    else:
+        contents.append(types.Content(role="user", parts=list(user_parts)))
+    return contents
+
+def assemble_prompt(variant, user_text, conversation_history=None, image_part=None, current_text=None):
+    """
+    Assemble a structured prompt.
+    
+    Args:
+        variant: "regular", "process" or "screen_guidance"
+        user_text: Text of the current user turn, including any per-request
+                   instructions such as the reply language
+        conversation_history: Previous turns for context
+        image_part: Optional types.Part (or list of Parts) with screenshots
+                    to send before the text
+        current_text: The user's own words as stored in history, when the
+                      caller has already appended them there
+        
+    Returns:
+        dict: {"variant", "system_instruction", "contents"}
+    """
+    history = list(conversation_history or [])
+    # Live sessions append the current message to history before replying;
+    # don't send it twice. Only an exact match is dropped, so an earlier
+    # unanswered turn (e.g. cut off by a barge-in) stays in context.
+    if (current_text and history and history[-1].get("role") == "user"
+            and history[-1].get("content") == current_text):
+        history = history[:-1]
+    
+    user_parts = []
+    if isinstance(image_part, list):
+        user_parts.extend(image_part)
+    elif image_part is not None:
+        user_parts.append(image_part)
+    user_parts.append(types.Part.from_text(text=user_text))
+    
+    return {
+        "variant": variant,
+        "system_instruction": system_instruction_for(variant),
+        "contents": build_contents(history, user_parts),
+    }
+
+def measure_prompt(prompt):
+    """Byte sizes of a prompt's system instruction, text turns and inline media"""
+    system_bytes = len(prompt["system_instruction"].encode("utf-8"))
+    text_bytes = 0
+    media_bytes = 0
+    for content in prompt["contents"]:
+        for part in content.parts:
+            if part.text is not None:
+                text_bytes += len(part.text.encode("utf-8"))
+            elif part.inline_data is not None and part.inline_data.data:
+                media_bytes += len(part.inline_data.data)
+    return {
+        "system_bytes": system_bytes,
+        "contents_bytes": text_bytes,
+        "media_bytes": media_bytes,
+        "total_bytes": system_bytes + text_bytes + media_bytes,
+    }
+
+
+class PromptMetrics:
+    """Running byte counts of what is sent to Gemini, per prompt variant"""
+    
+    def __init__(self):
+        self.variants = {}
+    
+    def record(self, prompt, cached_system):
+        sizes = measure_prompt(prompt)
+        stats = self.variants.setdefault(prompt["variant"], {
+            "requests": 0,
+            "system_bytes_sent": 0,
+            "system_bytes_cached": 0,
+            "contents_bytes": 0,
+            "media_bytes": 0,
+        })
+        stats["requests"] += 1
+        if cached_system:
+            stats["system_bytes_cached"] += sizes["system_bytes"]
+        else:
+            stats["system_bytes_sent"] += sizes["system_bytes"]
+        stats["contents_bytes"] += sizes["contents_bytes"]
+        stats["media_bytes"] += sizes["media_bytes"]
+        return sizes
+    
+    def snapshot(self):
+        return {variant: dict(stats) for variant, stats in self.variants.items()}
+
+prompt_metrics = PromptMetrics()
+
+
+class SystemInstructionCache:
+    """
+    Gemini context caches holding the static system instruction of each
+    prompt variant, so it is stored upstream once instead of being sent
+    and re-processed on every request.
+    
+    Caches are created lazily per (model, variant) and recreated shortly
+    before they expire. Gemini rejects caches below a minimum token count
+    and not every model supports them; in that case the pair is remembered
+    as unsupported and requests fall back to an inline system_instruction.
+    Other failures (timeouts, 5xx, quota) fall back for the request and
+    the cache is retried after `retry_seconds`.
+    Enable with GEMINI_CONTEXT_CACHE=1.
+    """
+    
+    def __init__(self, enabled=False, ttl_seconds=3600, retry_seconds=60):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._entries = {}
+        self._unsupported = set()
+        # (model, variant) -> monotonic time before which creation isn't retried
+        self._retry_at = {}
+        self._lock = asyncio.Lock()
+    
+    @staticmethod
+    def _is_unsupported(error):
+        """Whether a creation error means this pair can never be cached"""
+        message = str(error).lower()
+        return (
+            getattr(error, "status", None) == "INVALID_ARGUMENT"
+            or "invalid_argument" in message
+            or "token count" in message
+            or "min_total_token_count" in message
+        )
+    
+    async def get(self, client, model_version, variant):
+        """Return the cache name for this model and variant, or None"""
+        if not self.enabled:
+            return None
+        key = (model_version, variant)
+        if key in self._unsupported or time.monotonic() < self._retry_at.get(key, 0):
+            return None
+        
+        entry = self._entries.get(key)
+        # Refresh a minute early so a request never races the expiry
+        if entry and entry[1] - 60 > time.monotonic():
+            return entry[0]
+        
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] - 60 > time.monotonic():
+                return entry[0]
+            try:
+                cache = await client.aio.caches.create(
+                    model=model_version,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=system_instruction_for(variant),
+                        display_name=f"indic-chat-{variant}",
+                        ttl=f"{self.ttl_seconds}s",
+                    )
+                )
+            except Exception as e:
+                if self._is_unsupported(e):
+                    print(f"Context cache unsupported for {model_version}/{variant}, sending inline: {e}")
+                    self._unsupported.add(key)
+                else:
+                    print(f"Context cache unavailable for {model_version}/{variant}, "
+                          f"retrying in {self.retry_seconds}s: {e}")
+                    self._retry_at[key] = time.monotonic() + self.retry_seconds
+                return None
+            self._retry_at.pop(key, None)
+            self._entries[key] = (cache.name, time.monotonic() + self.ttl_seconds)
+            return cache.name
+
+system_instruction_cache = SystemInstructionCache(
+    enabled=os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1",
+    ttl_seconds=int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600")),
+    retry_seconds=int(os.getenv("GEMINI_CONTEXT_CACHE_RETRY", "60"))
+)
+
+async def build_generate_config(client, model_version, prompt, **config_kwargs):
+    """
+    Build the GenerateContentConfig for an assembled prompt, referencing the
+    cached system instruction when one is available, and record its size
+    """
+    cache_name = await system_instruction_cache.get(client, model_version, prompt["variant"])
+    prompt_metrics.record(prompt, cached_system=cache_name is not None)
+    if cache_name:
+        return types.GenerateContentConfig(cached_content=cache_name, **config_kwargs)
+    return types.GenerateContentConfig(system_instruction=prompt["system_instruction"], **config_kwargs)
@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import math
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Entries kept across all languages and variants
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Trigram similarity needed for a fuzzy hit. Off by default: near-identical
+# questions can still need different answers, so only exact (normalized)
+# matches are served unless this is set above 0
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+# Sentence-ending punctuation (including the danda and double danda) is
+# dropped from the end of a query. Everything else is kept: symbols such
+# as + - * / < > = # % change what is being asked ("2+2" vs "2-2").
+_TRAILING_PUNCTUATION = re.compile(r'[\s?.!\u0964\u0965]+$')
+
+# Punctuation trimmed from words before comparing them for negations
+_WORD_EDGES = ".,;:!?\"()\u0964\u0965"
+
+# Words that flip a question's meaning; queries whose words differ by one of
+# these are never similar ("is it safe" vs "is it not safe")
+_NEGATIONS = frozenset([
+    "not", "no", "never", "dont", "don't", "doesnt", "doesn't", "isnt", "isn't",
+    "cant", "can't", "cannot", "wont", "won't", "without",
+    "नहीं", "नही", "न", "ना", "मत", "बिना", "नाही", "नको",
+])
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query, without its final punctuation"""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return _TRAILING_PUNCTUATION.sub("", " ".join(text.split()))
+
+def _words(normalized):
+    return {word.strip(_WORD_EDGES) for word in normalized.split()}
+
+def trigrams(text):
+    """Character trigrams of a normalized query, padded so short words count"""
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class ResponseCache:
+    """
+    Cache of standard-mode LLM replies for stand-alone questions.
+
+    Lookups first try an exact match on the normalized query within the
+    same language and prompt variant. If that misses and a similarity
+    threshold is set (it is off by default), the most similar cached query
+    in the same bucket is used when its character-trigram Jaccard
+    similarity reaches the threshold and the two don't differ by a
+    negation. Keys must be the bare user question: text that embeds shared
+    context (retrieved excerpts) makes different questions look alike.
+    Entries expire after `ttl` seconds and the least recently used are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 similarity=RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        # (language, variant, normalized query) -> {"reply", "grams", "expires_at"}
+        self._entries = OrderedDict()
+        # (language, variant, trigram) -> keys of the entries containing it,
+        # so similarity lookups only score queries sharing rare trigrams
+        self._gram_index = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def _index(self, key, grams):
+        for gram in grams:
+            self._gram_index.setdefault((key[0], key[1], gram), set()).add(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for gram in entry["grams"]:
+            index_key = (key[0], key[1], gram)
+            postings = self._gram_index.get(index_key)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._gram_index[index_key]
+
+    def _candidates(self, language_code, variant, grams):
+        """
+        Keys that can reach the similarity threshold. A match needs at least
+        need = ceil(similarity * len(grams)) shared trigrams, so it must
+        contain one of any len(grams) - need + 1 of the query's trigrams
+        (prefix filtering); probing the rarest ones keeps the set small.
+        """
+        need = max(1, math.ceil(self.similarity * len(grams)))
+        postings = sorted(
+            (self._gram_index.get((language_code, variant, gram), ()) for gram in grams),
+            key=len
+        )
+        candidates = set()
+        for keys in postings[:len(grams) - need + 1]:
+            candidates.update(keys)
+        return candidates
+
+    def _find_similar(self, language_code, variant, normalized, now):
+        grams = trigrams(normalized)
+        words = _words(normalized)
+        best_key, best_score = None, 0.0
+        for key in self._candidates(language_code, variant, grams):
+            entry = self._entries[key]
+            if entry["expires_at"] <= now:
+                continue
+            # Size filter: Jaccard can't reach the threshold across very different lengths
+            if min(len(grams), len(entry["grams"])) < self.similarity * max(len(grams), len(entry["grams"])):
+                continue
+            if _NEGATIONS & (words ^ _words(key[2])):
+                continue
+            union = len(grams | entry["grams"])
+            score = len(grams & entry["grams"]) / union if union else 0.0
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_key is not None and best_score >= self.similarity:
+            return best_key
+        return None
+
+    def get(self, query, language_code, variant):
+        """Return a cached reply or None"""
+        normalized = normalize_query(query)
+        key = (language_code, variant, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["reply"]
+            if entry is not None:
+                self._remove(key)
+
+            if self.similarity > 0 and normalized:
+                similar = self._find_similar(language_code, variant, normalized, now)
+                if similar is not None:
+                    self._entries.move_to_end(similar)
+                    self.similar_hits += 1
+                    return self._entries[similar]["reply"]
+
+            self.misses += 1
+            return None
+
+    def put(self, query, language_code, variant, reply):
+        """Cache a reply for a stand-alone question"""
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        key = (language_code, variant, normalized)
+        grams = trigrams(normalized)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "reply": reply,
+                "grams": grams,
+                "expires_at": time.time() + self.ttl,
+            }
+            self._index(key, grams)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def record_bypass(self):
+        """Count a request that skipped the cache because it had history"""
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+response_cache = ResponseCache()
@@ -1,81 +1,105 @@
 import os
+import httpx
 from fastapi import UploadFile
-from sarvamai import SarvamAI
+from sarvamai import AsyncSarvamAI
 from services.llm_service import generate_reply
+from utils.language_registry import STT_LANGUAGE_CODES, DEFAULT_LANGUAGE, to_bcp47
+from utils.metrics import span, track_upstream
 
-# Get the API key
-SARVAM_AI_API_KEY = os.getenv("SARVAM_AI_API_KEY")
+# Shared Sarvam AI client, created once by init_stt at application startup
+_stt_client = None
+_stt_http_client = None
+
+def init_stt():
+    """Initialize the shared STT client with a pooled HTTP connection"""
+    global _stt_client, _stt_http_client
+    api_key = os.getenv("SARVAM_AI_API_KEY")
+    if not api_key:
+        print("Warning: SARVAM_AI_API_KEY not set. Speech-to-text is unavailable.")
+        return None
+
+    _stt_http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(float(os.getenv("SARVAM_STT_TIMEOUT", "60")), connect=5.0)
+    )
+    _stt_client = AsyncSarvamAI(api_subscription_key=api_key, httpx_client=_stt_http_client)
+    return _stt_client
+
+async def close_stt():
+    """Close the shared STT client's connections on shutdown"""
+    global _stt_client, _stt_http_client
+    if _stt_http_client is not None:
+        await _stt_http_client.aclose()
+    _stt_client = None
+    _stt_http_client = None
+
+def get_stt_client():
+    """Return the shared STT client, creating it if startup hasn't run"""
+    if _stt_client is None:
+        return init_stt()
+    return _stt_client
+
+async def transcribe_audio(audio_bytes, language_code, filename="audio.wav", content_type="audio/wav"):
+    """
+    Transcribe an in-memory audio buffer with Sarvam AI
+
+    Args:
+        audio_bytes: Encoded audio (WAV, WebM, ...)
+        language_code: BCP-47 code such as "hi-IN"
+        filename: Name reported to the API; its extension hints the format
+        content_type: MIME type of the audio
+
+    Returns:
+        Transcript text (may be empty)
+    """
+    client = get_stt_client()
+    if client is None:
+        raise Exception("Missing Sarvam AI API key")
+
+    with track_upstream("sarvam_stt", "saarika:v1"):
+        response = await client.speech_to_text.transcribe(
+            file=(filename, audio_bytes, content_type),
+            model="saarika:v1",
+            language_code=language_code
+        )
+
+    # Extract transcript text
+    if isinstance(response, dict):
+        return response.get("transcript", "")
+    return getattr(response, "transcript", str(response))
 
 async def whisper_transcribe_handler(audio: UploadFile, language: str, llm_model):
     """Handle speech-to-text conversion using Sarvam AI"""
-    audio_file = None
-    temp_audio_path = None
-    
     try:
-        # Save uploaded audio to temporary file
-        audio_bytes = await audio.read()
-        
-        # Create temp directory if it doesn't exist
-        temp_dir = os.path.join(os.path.dirname(__file__), "..", "temp_audio")
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_audio_path = os.path.join(temp_dir, f"temp_{os.urandom(4).hex()}.wav")
-        
-        with open(temp_audio_path, "wb") as f:
-            f.write(audio_bytes)
-        
-        # Format language code
-        if len(language) <= 3 and '-' not in language:
-            language = f"{language}-IN"
-        
-        # Initialize Sarvam AI client
-        client = SarvamAI(api_subscription_key=SARVAM_AI_API_KEY)
-        
-        # Validate language code
-        valid_languages = ['unknown', 'hi-IN', 'bn-IN', 'kn-IN', 'ml-IN', 
-                          'mr-IN', 'od-IN', 'pa-IN', 'ta-IN', 'te-IN', 
-                          'en-IN', 'gu-IN']
-        
-        if language not in valid_languages:
-            language = "hi-IN"
-        
-        # Transcribe audio
-        audio_file = open(temp_audio_path, "rb")
-        response = client.speech_to_text.transcribe(
-            file=audio_file,
-            model="saarika:v1",
-            language_code=language
-        )
-        audio_file.close()
-        audio_file = None
-        
-        # Extract transcript text
-        if isinstance(response, dict):
-            text = response.get("transcript", "")
-        else:
-            text = getattr(response, "transcript", str(response))
-        
+        # Spans split the request time between reading the upload, STT and the LLM
+        with span("whisper.read_upload"):
+            audio_bytes = await audio.read()
+
+        # Format and validate language code
+        language = to_bcp47(language)
+        if language not in STT_LANGUAGE_CODES:
+            language = DEFAULT_LANGUAGE.bcp47
+
+        # Transcribe audio straight from memory
+        with span("whisper.stt"):
+            text = await transcribe_audio(
+                audio_bytes,
+                language,
+                filename=audio.filename or "audio.wav",
+                content_type=audio.content_type or "audio/wav"
+            )
+
         # Generate bot reply using LLM
         bot_text = ""
         if text and text.strip():
-            bot_text = generate_reply(llm_model, text, language[:2])
+            with span("whisper.reply"):
+                bot_text = await generate_reply(llm_model, text, language[:2])
         else:
             bot_text = "I couldn't hear what you said. Could you please try again?"
-            
+
         return {"text": text, "bot": bot_text}
-        
+
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f"STT exception: {e}\n{error_details}")
         return {"text": "", "error": f"Speech-to-text failed: {e}"}
-        
-    finally:
-        # Clean up resources
-        if audio_file and not audio_file.closed:
-            audio_file.close()
-        
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            try:
-                os.remove(temp_audio_path)
-            except:
-                pass
@@ -0,0 +1,217 @@
+import os
+import asyncio
+import hashlib
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+
+def normalize_tts_text(text):
+    """Normalize text so trivially different strings share a cache entry"""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+class TTSCache:
+    """
+    Content-addressed cache for synthesized audio.
+
+    Entries are keyed on a hash of the normalized text plus every voice
+    parameter that changes the audio. Recently used entries live in an
+    in-memory LRU bounded by total audio bytes; if a directory is given,
+    entries are also written there and survive restarts. The disk tier is
+    bounded by disk_max_bytes and evicts the files least recently used,
+    going by modification time (refreshed on every disk hit).
+
+    Async callers use aget/aput, which serve memory hits inline and run
+    disk reads and writes in a worker thread so the event loop never
+    blocks on file I/O. Worker threads and the loop share the counters
+    and the memory tier, so that state is locked.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @staticmethod
+    def make_key(text, target_language_code, speaker, model, pitch, pace, loudness, enable_preprocessing):
+        """Build the cache key for one synthesis request"""
+        parts = [
+            normalize_tts_text(text), target_language_code, speaker, model,
+            str(pitch), str(pace), str(loudness), str(bool(enable_preprocessing)),
+        ]
+        return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _store(self, key, result):
+        """Insert into the memory tier and evict least recently used entries over budget"""
+        size = len(result["audio_base64"])
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key)["audio_base64"])
+        self._entries[key] = result
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted["audio_base64"])
+            self.evictions += 1
+
+    def _disk_files(self):
+        """(mtime, size, path) of every entry file in the disk tier"""
+        files = []
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return files
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _get_memory(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def _get_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            # Mark as recently used for disk eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._store(key, result)
+            self.disk_hits += 1
+        return dict(result)
+
+    def _record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _put_disk(self, key, result):
+        """Write an entry file, then evict the oldest files over the disk budget"""
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"TTS cache: failed to write {path}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size - previous
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove least recently used entry files until the disk tier fits its budget"""
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            # Recount from the listing so concurrent writers can't drift the total
+            self._disk_bytes = total
+            self.disk_evictions += removed
+
+    def get(self, key):
+        """Return a cached TTS result dict, or None"""
+        result = self._get_memory(key)
+        if result is None and self.disk_dir:
+            result = self._get_disk(key)
+        if result is None:
+            self._record_miss()
+        return result
+
+    async def aget(self, key):
+        """get for async callers; disk reads run in a worker thread"""
+        result = self._get_memory(key)
+        if result is None and self.disk_dir:
+            result = await asyncio.to_thread(self._get_disk, key)
+        if result is None:
+            self._record_miss()
+        return result
+
+    def put(self, key, result):
+        """Cache a successful TTS result dict"""
+        if not result or "audio_base64" not in result:
+            return
+        result = dict(result)
+        with self._lock:
+            self._store(key, result)
+        if self.disk_dir:
+            self._put_disk(key, result)
+
+    async def aput(self, key, result):
+        """put for async callers; the disk write runs in a worker thread"""
+        if not result or "audio_base64" not in result:
+            return
+        result = dict(result)
+        with self._lock:
+            self._store(key, result)
+        if self.disk_dir:
+            await asyncio.to_thread(self._put_disk, key, result)
+
+    def stats(self):
+        """Hit/miss counters and current memory and disk usage"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_evictions": self.disk_evictions,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else 0,
+            }
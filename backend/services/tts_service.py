@@ -1,15 +1,47 @@
 import os
 import io
+import asyncio
 import base64
 import uuid
 import wave
 from fastapi import Request
+from fastapi.responses import StreamingResponse
 
 from sarvam_tts import SarvamTTS
-from utils.text_utils import strip_markdown
+from services.tts_cache import TTSCache
+from utils.text_utils import strip_markdown, split_text_for_tts, TTS_MAX_CHARS
+from utils.audio_utils import streaming_wav_header
+from utils.language_registry import LANGUAGES, DEFAULT_LANGUAGE
+
+# Cache synthesized audio so repeated messages (greetings, replays) skip the API.
+# Set TTS_CACHE_DIR to also keep entries on disk across restarts, up to
+# TTS_CACHE_DISK_MAX_BYTES.
+tts_cache = TTSCache(
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    disk_dir=os.getenv("TTS_CACHE_DIR") or None,
+    disk_max_bytes=int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+)
 
 # Initialize the TTS service
-tts_service = SarvamTTS()
+tts_service = SarvamTTS(cache=tts_cache)
+
+# Maximum number of chunks synthesized at the same time for one request
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+
+def chunk_text(text, chunk_size=TTS_MAX_CHARS, enable_preprocessing=True):
+    """Split text into TTS-sized chunks at sentence and grapheme boundaries"""
+    # Number formatting adds commas, so apply it before measuring chunk lengths
+    # (it is idempotent, so text_to_speech running it again is harmless)
+    if enable_preprocessing:
+        text = tts_service.preprocess_text(text)
+    return split_text_for_tts(text, chunk_size)
+
+def resolve_voice(language, target_language_code=None, speaker=None):
+    """Fill in the TTS language code and speaker for a short language code"""
+    voice = LANGUAGES.get(language)
+    if not voice or not voice.tts_speaker:
+        voice = DEFAULT_LANGUAGE
+    return target_language_code or voice.bcp47, speaker or voice.tts_speaker
 
 async def tts_handler(request: Request):
     """Handle TTS requests with multi-chunk processing for longer texts"""
@@ -30,30 +62,14 @@ async def tts_handler(request: Request):
         
         print(f"TTS request: language={language}, length={len(text)}")
         
-        # Map language codes
-        if not target_language_code:
-            language_code_map = {
-                "hi": "hi-IN", "en": "en-IN", "ta": "ta-IN", "bn": "bn-IN",
-                "gu": "gu-IN", "mr": "mr-IN", "te": "te-IN", "kn": "kn-IN", 
-                "ml": "ml-IN", "pa": "pa-IN",
-            }
-            target_language_code = language_code_map.get(language, "hi-IN")
+        target_language_code, speaker = resolve_voice(language, target_language_code, speaker)
         
-        # Map speakers
-        if not speaker:
-            speakers = {
-                "hi": "meera", "en": "arjun", "ta": "maitreyi", "bn": "amartya",
-                "gu": "meera", "mr": "amol", "te": "arvind", "kn": "maya",
-                "ml": "diya", "pa": "neel",
-            }
-            speaker = speakers.get(language, "meera")
-        
-        # Process text in chunks if longer than 500 characters
-        chunk_size = 500
+        # Process text in chunks if longer than the API limit
+        chunk_size = TTS_MAX_CHARS
         
         if len(text) <= chunk_size:
             # For short texts
-            return tts_service.text_to_speech(
+            return await tts_service.text_to_speech(
                 text=text,
                 target_language_code=target_language_code,
                 speaker=speaker,
@@ -62,7 +78,7 @@ async def tts_handler(request: Request):
             )
         else:
             # For longer texts
-            return process_long_text(
+            return await process_long_text(
                 text, chunk_size, target_language_code, 
                 speaker, model, enable_preprocessing
             )
@@ -72,50 +88,224 @@ async def tts_handler(request: Request):
         print(f"TTS exception: {e}\n{error_details}")
         return {"error": f"TTS service failed: {e}"}
 
-def process_long_text(text, chunk_size, target_language_code, speaker, model, enable_preprocessing):
-    """Process long text by splitting into chunks and combining the audio"""
-    # Split text into chunks
-    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-    print(f"Processing text in {len(chunks)} chunks")
+async def synthesize_chunk(index, chunk, semaphore, target_language_code, speaker, model, enable_preprocessing):
+    """
+    Synthesize one chunk and decode it into raw frames
     
-    # WAV processing parameters
-    all_audio_data = []
-    sample_rate = None
-    sample_width = None
-    n_channels = None
+    Returns:
+        tuple: ((sample_rate, sample_width, n_channels), frames)
+    """
+    async with semaphore:
+        chunk_result = await tts_service.text_to_speech(
+            text=chunk,
+            target_language_code=target_language_code,
+            speaker=speaker,
+            model=model,
+            enable_preprocessing=enable_preprocessing
+        )
+    
+    if not chunk_result or "audio_base64" not in chunk_result:
+        raise Exception("No audio data in TTS response")
+    
+    chunk_audio_bytes = base64.b64decode(chunk_result["audio_base64"])
+    
+    # Extract audio data from WAV
+    with wave.open(io.BytesIO(chunk_audio_bytes), 'rb') as wf:
+        params = (wf.getframerate(), wf.getsampwidth(), wf.getnchannels())
+        audio_data = wf.readframes(wf.getnframes())
+    
+    print(f"Processed chunk {index+1}: {len(audio_data)} bytes")
+    return params, audio_data
+
+async def synthesize_in_order(chunks, target_language_code, speaker, model, enable_preprocessing,
+                              max_concurrency=TTS_MAX_CONCURRENCY):
+    """
+    Start synthesizing every chunk (bounded by max_concurrency) and yield
+    results in chunk order as soon as each one is ready, so the first
+    chunk can be played while later ones are still being generated.
+    
+    Yields:
+        tuple: (index, ((sample_rate, sample_width, n_channels), frames)) or
+               (index, Exception) for a chunk that failed
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    tasks = [
+        asyncio.create_task(synthesize_chunk(
+            i, chunk, semaphore, target_language_code,
+            speaker, model, enable_preprocessing
+        ))
+        for i, chunk in enumerate(chunks)
+    ]
+    try:
+        for i, task in enumerate(tasks):
+            try:
+                yield i, await task
+            except Exception as e:
+                yield i, e
+    finally:
+        # The consumer may stop early (client disconnected); don't leave work running
+        for task in tasks:
+            task.cancel()
+
+async def synthesize_stream(chunk_source, target_language_code, speaker, model, enable_preprocessing,
+                            max_concurrency=TTS_MAX_CONCURRENCY):
+    """
+    Like synthesize_in_order, but for chunks that arrive over time (e.g.
+    sentences streamed from the LLM): each chunk starts synthesizing as
+    soon as chunk_source yields it, while earlier results are delivered.
     
-    # Process each chunk
-    for i, chunk in enumerate(chunks):
+    Yields:
+        tuple: (index, ((sample_rate, sample_width, n_channels), frames)) or
+               (index, Exception) for a chunk that failed
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    pending = asyncio.Queue()
+    tasks = []
+    
+    async def produce():
         try:
-            chunk_result = tts_service.text_to_speech(
-                text=chunk,
-                target_language_code=target_language_code,
-                speaker=speaker,
-                model=model,
-                enable_preprocessing=enable_preprocessing
-            )
+            async for chunk in chunk_source:
+                task = asyncio.create_task(synthesize_chunk(
+                    len(tasks), chunk, semaphore, target_language_code,
+                    speaker, model, enable_preprocessing
+                ))
+                tasks.append(task)
+                pending.put_nowait(task)
+        finally:
+            pending.put_nowait(None)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        index = 0
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            try:
+                yield index, await task
+            except Exception as e:
+                yield index, e
+            index += 1
+        # Surface errors raised by the chunk source
+        await producer
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+async def tts_stream_handler(request: Request):
+    """
+    Stream TTS audio as a single WAV over chunked HTTP.
+    
+    The WAV header goes out as soon as the first chunk is synthesized and
+    each following chunk's PCM frames are written as they become ready.
+    If the first chunk fails, an error is returned instead of audio.
+    """
+    try:
+        data = await request.json()
+        text = data.get("text")
+        language = data.get("language", "hi")
+        model = data.get("model", "bulbul:v1")
+        enable_preprocessing = data.get("enable_preprocessing", True)
+        target_language_code, speaker = resolve_voice(
+            language, data.get("target_language_code"), data.get("speaker")
+        )
+        
+        if not text:
+            return {"error": "Missing text"}
+        
+        text = strip_markdown(text)
+        chunks = chunk_text(text, TTS_MAX_CHARS, enable_preprocessing)
+        if not chunks:
+            return {"error": "Missing text"}
+    except Exception as e:
+        print(f"TTS stream exception: {e}")
+        return {"error": f"TTS service failed: {e}"}
+    print(f"TTS stream request: language={language}, length={len(text)}, chunks={len(chunks)}")
+    
+    results = synthesize_in_order(chunks, target_language_code, speaker, model, enable_preprocessing)
+    
+    # Wait for the first chunk before committing to a 200 audio response, so
+    # a failure (e.g. TTS down) is reported instead of an empty WAV
+    _, first = await results.__anext__()
+    if isinstance(first, Exception):
+        await results.aclose()
+        print(f"Error processing chunk 1: {first}")
+        return {"error": f"TTS service failed: {first}"}
+    
+    async def audio_stream():
+        audio_params, audio_data = first
+        yield streaming_wav_header(*audio_params)
+        yield audio_data
+        async for i, result in results:
+            if isinstance(result, Exception):
+                print(f"Error processing chunk {i+1}: {result}")
+                continue
             
-            if chunk_result and "audio_base64" in chunk_result:
-                chunk_audio_bytes = base64.b64decode(chunk_result["audio_base64"])
-                
-                # Extract audio data from WAV
-                with wave.open(io.BytesIO(chunk_audio_bytes), 'rb') as wf:
-                    if sample_rate is None:
-                        sample_rate = wf.getframerate()
-                        sample_width = wf.getsampwidth()
-                        n_channels = wf.getnchannels()
-                    
-                    audio_data = wf.readframes(wf.getnframes())
-                    all_audio_data.append(audio_data)
-                    print(f"Processed chunk {i+1}: {len(audio_data)} bytes")
-            else:
-                print(f"Warning: No audio data for chunk {i+1}")
-                
-        except Exception as e:
-            print(f"Error processing chunk {i+1}: {e}")
+            params, audio_data = result
+            if params != audio_params:
+                print(f"Error processing chunk {i+1}: Audio format {params} does not match {audio_params}")
+                continue
+            
+            yield audio_data
+    
+    return StreamingResponse(
+        audio_stream(),
+        media_type="audio/wav",
+        headers={"X-TTS-Chunks": str(len(chunks))}
+    )
+
+async def process_long_text(text, chunk_size, target_language_code, speaker, model, enable_preprocessing,
+                            max_concurrency=TTS_MAX_CONCURRENCY):
+    """
+    Process long text by synthesizing chunks concurrently and combining the audio in order
+    
+    Chunks whose audio is missing, fails, or doesn't match the sample rate,
+    width and channel count of the first good chunk are left out and
+    reported in "chunk_errors".
+    """
+    # Split text into chunks at sentence boundaries
+    chunks = chunk_text(text, chunk_size, enable_preprocessing)
+    print(f"Processing text in {len(chunks)} chunks (concurrency {max_concurrency})")
+    
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    # gather keeps results in chunk order regardless of completion order
+    results = await asyncio.gather(
+        *[
+            synthesize_chunk(
+                i, chunk, semaphore, target_language_code,
+                speaker, model, enable_preprocessing
+            )
+            for i, chunk in enumerate(chunks)
+        ],
+        return_exceptions=True
+    )
+    
+    all_audio_data = []
+    audio_params = None
+    chunk_errors = []
+    
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"Error processing chunk {i+1}: {result}")
+            chunk_errors.append({"chunk": i + 1, "error": str(result)})
+            continue
+        
+        params, audio_data = result
+        if audio_params is None:
+            audio_params = params
+        elif params != audio_params:
+            error = f"Audio format {params} does not match {audio_params}"
+            print(f"Error processing chunk {i+1}: {error}")
+            chunk_errors.append({"chunk": i + 1, "error": error})
+            continue
+        
+        all_audio_data.append(audio_data)
     
     # Combine all audio chunks
-    if all_audio_data and sample_rate:
+    if all_audio_data and audio_params:
+        sample_rate, sample_width, n_channels = audio_params
         combined_audio_data = b''.join(all_audio_data)
         
         # Create WAV in memory
@@ -136,7 +326,9 @@ def process_long_text(text, chunk_size, target_language_code, speaker, model, en
             "audio_base64": combined_audio_base64,
             "content_type": "audio/wav",
             "text_length": len(text),
-            "chunks_processed": len(chunks)
+            "chunks_processed": len(chunks),
+            "chunks_failed": len(chunk_errors),
+            "chunk_errors": chunk_errors
         }
     else:
-        raise Exception("Failed to generate audio chunks")
+        raise Exception(f"Failed to generate audio chunks: {chunk_errors}")
@@ -0,0 +1,261 @@
+import os
+import io
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+
+from services.pdf_index import build_pdf_index
+from services.pdf_registry import pdf_registry
+
+logger = logging.getLogger(__name__)
+
+# Size of each read from the request body while streaming an upload to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Background ingestion workers and how many jobs may wait for one
+PDF_INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", "2"))
+PDF_INGEST_QUEUE_SIZE = int(os.getenv("PDF_INGEST_QUEUE_SIZE", "100"))
+# Finished ("done" or "failed") ingestion statuses are dropped after this
+# many seconds, and the oldest of them beyond the entry cap
+PDF_STATUS_TTL = int(os.getenv("PDF_STATUS_TTL", "3600"))
+PDF_STATUS_MAX_ENTRIES = int(os.getenv("PDF_STATUS_MAX_ENTRIES", "1000"))
+# Longest side of the generated first-page thumbnail
+THUMBNAIL_SIZE = 256
+
+def thumbnail_path(pdf_path):
+    """Location of the thumbnail stored next to an uploaded PDF"""
+    return f"{pdf_path}.thumb.jpg"
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _count_pages(pdf_path):
+    from pypdf import PdfReader
+
+    return len(PdfReader(pdf_path).pages)
+
+def _make_thumbnail(pdf_path):
+    """
+    Save a thumbnail of the first image on the first page
+
+    pypdf can't rasterize pages, so PDFs whose first page has no embedded
+    image (most text-only documents) get no thumbnail.
+
+    Returns:
+        bool: True if a thumbnail was written
+    """
+    from pypdf import PdfReader
+    from PIL import Image
+
+    page = PdfReader(pdf_path).pages[0]
+    for image in page.images:
+        try:
+            with Image.open(io.BytesIO(image.data)) as img:
+                img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                img.convert("RGB").save(thumbnail_path(pdf_path), "JPEG", quality=80)
+            return True
+        except Exception:
+            continue
+    return False
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingestion queue can't take another file"""
+
+
+class UploadService:
+    """
+    Streams uploads to disk, deduplicates them by content hash and runs
+    ingestion (page count, text index, thumbnail, Gemini upload) on a
+    bounded pool of background workers, tracking progress per file_id.
+    Statuses of finished files are kept for status_ttl seconds and at
+    most max_statuses of them are kept.
+    """
+
+    def __init__(self, uploads_dir, workers=PDF_INGEST_WORKERS, queue_size=PDF_INGEST_QUEUE_SIZE,
+                 status_ttl=PDF_STATUS_TTL, max_statuses=PDF_STATUS_MAX_ENTRIES):
+        self.uploads_dir = uploads_dir
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self._hashes = None
+        self._hash_lock = asyncio.Lock()
+        self.llm_model = None
+        # file_id -> {"state", "steps", "page_count", "error", "updated_at"}
+        self.status = {}
+        self.status_ttl = status_ttl
+        self.max_statuses = max_statuses
+
+    async def _known_hashes(self):
+        """Content hash -> file_id for everything already in the uploads directory"""
+        if self._hashes is None:
+            def scan():
+                hashes = {}
+                for name in sorted(os.listdir(self.uploads_dir)):
+                    path = os.path.join(self.uploads_dir, name)
+                    # Uploads are stored under their bare UUID; skip sidecar files
+                    if "." in name or not os.path.isfile(path):
+                        continue
+                    hashes.setdefault(_hash_file(path), name)
+                return hashes
+            self._hashes = await asyncio.to_thread(scan)
+        return self._hashes
+
+    async def save_upload(self, upload):
+        """
+        Stream an UploadFile to disk in fixed-size chunks, hashing as it goes
+
+        Returns:
+            tuple: (file_id, duplicate); duplicate uploads return the
+                   file_id of the existing identical file
+        """
+        temp_path = os.path.join(self.uploads_dir, f".upload-{uuid.uuid4()}.tmp")
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, "wb") as buffer:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    await asyncio.to_thread(buffer.write, chunk)
+            content_hash = digest.hexdigest()
+
+            async with self._hash_lock:
+                hashes = await self._known_hashes()
+                existing = hashes.get(content_hash)
+                if existing and os.path.exists(os.path.join(self.uploads_dir, existing)):
+                    os.remove(temp_path)
+                    return existing, True
+
+                file_id = str(uuid.uuid4())
+                os.replace(temp_path, os.path.join(self.uploads_dir, file_id))
+                hashes[content_hash] = file_id
+                return file_id, False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _prune_status(self):
+        """Drop finished statuses past their TTL, then the oldest while a new one wouldn't fit"""
+        finished = sorted(
+            (entry["updated_at"], file_id) for file_id, entry in self.status.items()
+            if entry["state"] in ("done", "failed")
+        )
+        expired = time.time() - self.status_ttl
+        excess = len(self.status) + 1 - self.max_statuses
+        for updated_at, file_id in finished:
+            if updated_at > expired and excess <= 0:
+                break
+            del self.status[file_id]
+            excess -= 1
+
+    def _set_status(self, file_id, **update):
+        if file_id not in self.status:
+            self._prune_status()
+        entry = self.status.setdefault(file_id, {
+            "state": "queued",
+            "steps": {},
+            "page_count": None,
+            "error": None,
+        })
+        entry.update(update)
+        entry["updated_at"] = time.time()
+        return entry
+
+    def enqueue(self, file_id):
+        """
+        Queue background ingestion for an uploaded file
+
+        Raises:
+            IngestQueueFull: If the queue is full; the upload request is
+                             answered right away instead of waiting
+        """
+        current = self.status.get(file_id)
+        if current and current["state"] in ("queued", "processing", "done"):
+            return current
+        try:
+            self._queue.put_nowait(file_id)
+        except asyncio.QueueFull:
+            raise IngestQueueFull(f"Ingestion queue is full ({self._queue.maxsize} files waiting)")
+        return self._set_status(file_id, state="queued", steps={}, error=None)
+
+    async def _run_step(self, file_id, step, func, *args):
+        """Run one ingestion step on a thread, recording its outcome"""
+        steps = self.status[file_id]["steps"]
+        steps[step] = "running"
+        try:
+            result = await asyncio.to_thread(func, *args)
+            steps[step] = "done"
+            return result
+        except Exception as e:
+            logger.error(f"Ingestion step {step} failed for {file_id}: {e}")
+            steps[step] = f"failed: {e}"
+            return None
+
+    async def _ingest(self, file_id):
+        path = os.path.join(self.uploads_dir, file_id)
+        self._set_status(file_id, state="processing")
+
+        page_count = await self._run_step(file_id, "page_count", _count_pages, path)
+        self._set_status(file_id, page_count=page_count)
+        await self._run_step(file_id, "text_index", build_pdf_index, path)
+
+        steps = self.status[file_id]["steps"]
+        made = await self._run_step(file_id, "thumbnail", _make_thumbnail, path)
+        if made is False:
+            steps["thumbnail"] = "skipped: no image on first page"
+
+        if self.llm_model is not None:
+            steps["remote_upload"] = "running"
+            try:
+                await pdf_registry.get_part(self.llm_model, path, file_id)
+                steps["remote_upload"] = "done"
+            except Exception as e:
+                logger.error(f"Remote upload failed for {file_id}: {e}")
+                steps["remote_upload"] = f"failed: {e}"
+        else:
+            steps["remote_upload"] = "skipped: LLM not configured"
+
+        failed = [step for step, state in steps.items() if state.startswith("failed")]
+        self._set_status(
+            file_id,
+            state="failed" if failed else "done",
+            error=f"Failed steps: {', '.join(failed)}" if failed else None
+        )
+
+    async def _worker(self):
+        while True:
+            file_id = await self._queue.get()
+            try:
+                await self._ingest(file_id)
+            except Exception as e:
+                logger.error(f"Ingestion failed for {file_id}: {e}", exc_info=True)
+                self._set_status(file_id, state="failed", error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def start(self, llm_model=None):
+        """Start the worker pool (call from application startup)"""
+        self.llm_model = llm_model
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the worker pool on shutdown"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_status(self, file_id):
+        """Progress of a file's ingestion, or None if it was never queued"""
+        entry = self.status.get(file_id)
+        if entry is None:
+            return None
+        return dict(entry, steps=dict(entry["steps"]), queue_depth=self._queue.qsize())
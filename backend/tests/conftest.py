@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules import each other as top-level packages (services, utils), as they
+# do when the app is started from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+import glob
+import math
+import os
+import wave
+from array import array
+
+import pytest
+
+from utils.audio_utils import UtteranceSegmenter, LIVE_SAMPLE_RATE, LIVE_SAMPLE_WIDTH
+
+TEST_AUDIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_audio")
+
+
+def tone(ms, amplitude=8000, rate=LIVE_SAMPLE_RATE):
+    samples = array('h', (int(amplitude * math.sin(2 * math.pi * 220 * i / rate)) for i in range(rate * ms // 1000)))
+    return samples.tobytes()
+
+
+def silence(ms, rate=LIVE_SAMPLE_RATE):
+    return bytes(rate * ms // 1000 * LIVE_SAMPLE_WIDTH)
+
+
+def feed_in_packets(segmenter, pcm, rate=LIVE_SAMPLE_RATE):
+    """Feed 20 ms packets, the way the live client sends them"""
+    packet_bytes = int(rate * 0.02) * LIVE_SAMPLE_WIDTH
+    utterances = []
+    for i in range(0, len(pcm), packet_bytes):
+        utterances.extend(segmenter.feed(pcm[i:i + packet_bytes]))
+    return utterances
+
+
+def test_pause_splits_speech_into_utterances():
+    pcm = silence(500) + tone(1000) + silence(1000) + tone(800) + silence(1000)
+    utterances = feed_in_packets(UtteranceSegmenter(), pcm)
+    assert len(utterances) == 2
+    # Each utterance keeps its onset (pre-roll) and is at least as long as the speech
+    assert len(utterances[0]) >= len(tone(1000))
+
+
+def test_short_click_is_not_an_utterance():
+    segmenter = UtteranceSegmenter()
+    assert feed_in_packets(segmenter, silence(300) + tone(120) + silence(1000)) == []
+    assert segmenter.flush() is None
+
+
+def test_flush_returns_speech_in_progress():
+    segmenter = UtteranceSegmenter()
+    assert feed_in_packets(segmenter, silence(300) + tone(600)) == []
+    assert segmenter.in_speech
+    assert segmenter.flush()
+    assert not segmenter.in_speech
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(TEST_AUDIO, "*.wav"))), ids=os.path.basename)
+def test_recordings_segment_into_a_few_utterances(path):
+    with wave.open(path, 'rb') as wf:
+        rate = wf.getframerate()
+        pcm = wf.readframes(wf.getnframes())
+    segmenter = UtteranceSegmenter(sample_rate=rate)
+    utterances = feed_in_packets(segmenter, pcm, rate)
+    tail = segmenter.flush()
+    if tail:
+        utterances.append(tail)
+    # Natural pauses between sentences must not turn into an STT call each
+    duration = len(pcm) / (rate * LIVE_SAMPLE_WIDTH)
+    assert 1 <= len(utterances) <= max(1, duration // 10)
@@ -0,0 +1,36 @@
+from services.history_service import ConversationHistory
+from services.llm_service import build_reply_prompt
+from services.prompt_builder import measure_prompt
+
+USER_TURN = "मुझे अपने बैंक खाते का पासवर्ड बदलना है। कृपया बताइए कि सेटिंग्स में कहाँ जाना है?"
+BOT_TURN = ("सबसे पहले ऐप खोलें और ऊपर दाईं ओर प्रोफ़ाइल आइकन पर टैप करें। "
+            "फिर 'सुरक्षा' विकल्प चुनें। जब आप यह कर लें तो मुझे बताइए।") * 3
+
+
+def prompt_bytes(history):
+    return measure_prompt(build_reply_prompt(USER_TURN, "hi", history))["total_bytes"]
+
+
+def test_prompt_stops_growing_over_a_long_session():
+    history = ConversationHistory()
+    sizes = {}
+    for turn in range(1, 501):
+        history.append({"role": "user", "content": USER_TURN})
+        history.append({"role": "assistant", "content": BOT_TURN})
+        if turn in (1, 50, 500):
+            sizes[turn] = prompt_bytes(history)
+
+    unbounded = [{"role": "user", "content": USER_TURN}, {"role": "assistant", "content": BOT_TURN}] * 500
+    assert sizes[1] < sizes[50]
+    assert sizes[500] == sizes[50]
+    assert sizes[500] * 20 < prompt_bytes(unbounded)
+
+
+def test_older_turns_are_folded_into_a_leading_summary():
+    history = ConversationHistory(keep_turns=4)
+    for i in range(10):
+        history.append({"role": "user", "content": f"Question number {i}."})
+    entries = list(history)
+    assert entries[0]["role"] == "summary"
+    assert "Question number 0." in history.summary
+    assert [entry["content"] for entry in entries[-4:]] == [f"Question number {i}." for i in range(6, 10)]
@@ -0,0 +1,54 @@
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageDraw
+
+from utils.image_utils import diff_bbox, box_fraction, normalize_image, SCREENSHOT_CROP_MAX_AREA
+
+
+def settings_page():
+    page = Image.new("RGB", (1920, 1080), "white")
+    draw = ImageDraw.Draw(page)
+    for y in range(60, 1080, 28):
+        draw.text((80, y), "Account settings  Profile  Security  Payments  Help " * 3, fill="black")
+    draw.rectangle((0, 0, 1920, 48), fill=(30, 80, 160))
+    return page
+
+
+def with_dialog(page, step):
+    frame = page.copy()
+    draw = ImageDraw.Draw(frame)
+    draw.rectangle((660, 340, 1260, 740), fill=(245, 245, 245), outline="black")
+    draw.text((700, 380 + step * 40), f"Step {step + 1}: enter the OTP sent to your phone", fill="black")
+    return frame
+
+
+def test_identical_frames_have_no_diff():
+    page = normalize_image(settings_page())
+    assert diff_bbox(page, page.copy()) is None
+
+
+def test_changed_dialog_is_cropped_to_its_region():
+    base = settings_page()
+    previous = normalize_image(with_dialog(base, 0))
+    current = normalize_image(with_dialog(base, 1))
+    box = diff_bbox(previous, current)
+    assert box is not None
+    # The change is inside the dialog, scaled to the normalized frame
+    scale = current.width / base.width
+    left, top, right, bottom = box
+    assert left >= 660 * scale - 16 and right <= 1260 * scale + 16
+    assert top >= 340 * scale - 16 and bottom <= 740 * scale + 16
+    assert box_fraction(box, current.size) <= SCREENSHOT_CROP_MAX_AREA
+
+
+def test_whole_screen_change_is_not_cropped():
+    previous = normalize_image(settings_page())
+    current = normalize_image(Image.new("RGB", (1920, 1080), (20, 20, 20)))
+    assert box_fraction(diff_bbox(previous, current), current.size) > SCREENSHOT_CROP_MAX_AREA
+
+
+def test_size_change_counts_as_entirely_changed():
+    previous = Image.new("RGB", (100, 100), "white")
+    current = Image.new("RGB", (200, 100), "white")
+    assert diff_bbox(previous, current) == (0, 0, 200, 100)
@@ -0,0 +1,49 @@
+import pytest
+
+from services.intent_router import classify_intent, SCREEN_GUIDANCE, PROCESS, REGULAR
+
+# Labeled corpus: (text, has_image, expected). scripts/benchmark.py times
+# the router on it.
+CORPUS = [
+    ("How to reset my UPI PIN?", False, PROCESS),
+    ("What is the capital of France?", False, REGULAR),
+    ("Tell me a joke", False, REGULAR),
+    ("Can you walk me through opening a bank account", False, PROCESS),
+    ("How do I change my password?", False, PROCESS),
+    ("मुझे पासवर्ड बदलने का तरीका बताइए", False, PROCESS),
+    ("आधार कार्ड कैसे डाउनलोड करें?", False, PROCESS),
+    ("भारत की राजधानी क्या है?", False, REGULAR),
+    ("পাসওয়ার্ড কীভাবে বদলাব?", False, PROCESS),
+    ("আজকের আবহাওয়া কেমন?", False, REGULAR),
+    ("પાસવર્ડ કેવી રીતે બદલવો?", False, PROCESS),
+    ("ਪਾਸਵਰਡ ਕਿਵੇਂ ਬਦਲਣਾ ਹੈ?", False, PROCESS),
+    ("கடவுச்சொல்லை எப்படி மாற்றுவது?", False, PROCESS),
+    ("இன்று வானிலை எப்படி இருக்கிறது", False, REGULAR),
+    ("நீங்கள் எப்படி இருக்கிறீர்கள்?", False, REGULAR),
+    ("இந்த படிவத்தை எப்படி நிரப்புவது?", False, PROCESS),
+    ("పాస్‌వర్డ్ ఎలా మార్చాలి?", False, PROCESS),
+    ("ಪಾಸ್‌ವರ್ಡ್ ಹೇಗೆ ಬದಲಾಯಿಸುವುದು?", False, PROCESS),
+    ("പാസ്‌വേഡ് എങ്ങനെ മാറ്റാം?", False, PROCESS),
+    ("पासवर्ड कसा बदलायचा?", False, PROCESS),
+    ("", True, SCREEN_GUIDANCE),
+    ("hi", True, SCREEN_GUIDANCE),
+    ("What should I do next on this page?", True, SCREEN_GUIDANCE),
+    ("What is on my screen?", True, SCREEN_GUIDANCE),
+    ("How to fill this form", True, PROCESS),
+    ("Is this a phishing email? Tell me honestly", True, REGULAR),
+    ("मेरी स्क्रीन पर यह क्या है?", True, SCREEN_GUIDANCE),
+    ("আমার স্ক্রিনে কী দেখা যাচ্ছে?", True, SCREEN_GUIDANCE),
+    ("இந்த திரையில் அடுத்த படி என்ன?", True, SCREEN_GUIDANCE),
+    ("ఈ స్క్రీన్‌లో తదుపరి దశ ఏమిటి?", True, SCREEN_GUIDANCE),
+    ("ಈ ಫಾರ್ಮ್ ಹೇಗೆ ತುಂಬುವುದು", True, PROCESS),
+]
+
+
+@pytest.mark.parametrize("text, has_image, expected", CORPUS)
+def test_classify_intent(text, has_image, expected):
+    assert classify_intent(text, has_image) == expected
+
+
+def test_matching_is_case_insensitive():
+    assert classify_intent("HOW TO reset my PIN") == PROCESS
+    assert classify_intent("Explain THIS", has_image=True) == SCREEN_GUIDANCE
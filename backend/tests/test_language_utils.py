@@ -0,0 +1,26 @@
+import pytest
+
+from utils.language_utils import detect_language, LANGUAGE_DETECT_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("expected, sample", [
+    ("hi", "मुझे अपना पासवर्ड बदलना है, क्या आप मदद कर सकते हैं?"),
+    ("mr", "मला माझा पासवर्ड बदलायचा आहे, तुम्ही मदत करू शकता का?"),
+    ("bn", "আমি আমার পাসওয়ার্ড পরিবর্তন করতে চাই, আপনি কি সাহায্য করতে পারেন?"),
+    ("pa", "ਮੈਂ ਆਪਣਾ ਪਾਸਵਰਡ ਬਦਲਣਾ ਚਾਹੁੰਦਾ ਹਾਂ, ਕੀ ਤੁਸੀਂ ਮਦਦ ਕਰ ਸਕਦੇ ਹੋ?"),
+    ("gu", "મારે મારો પાસવર્ડ બદલવો છે, શું તમે મદદ કરી શકો?"),
+    ("ta", "நான் என் கடவுச்சொல்லை மாற்ற வேண்டும், நீங்கள் உதவ முடியுமா?"),
+    ("te", "నేను నా పాస్‌వర్డ్ మార్చాలి, మీరు సహాయం చేయగలరా?"),
+    ("kn", "ನಾನು ನನ್ನ ಪಾಸ್‌ವರ್ಡ್ ಬದಲಾಯಿಸಬೇಕು, ನೀವು ಸಹಾಯ ಮಾಡಬಹುದೇ?"),
+    ("ml", "എനിക്ക് എന്റെ പാസ്‌വേഡ് മാറ്റണം, നിങ്ങൾക്ക് സഹായിക്കാമോ?"),
+    ("en", "I need to change my password, can you help me?"),
+])
+def test_detects_one_sentence_per_language(expected, sample):
+    detected, confidence = detect_language(sample)
+    assert detected == expected
+    assert confidence >= LANGUAGE_DETECT_MIN_CONFIDENCE
+
+
+def test_text_without_letters_is_undetected():
+    assert detect_language("") == (None, 0.0)
+    assert detect_language("12345 !!") == (None, 0.0)
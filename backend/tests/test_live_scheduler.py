@@ -0,0 +1,116 @@
+import asyncio
+import functools
+
+import pytest
+
+from services import live_service
+from services.history_service import ConversationHistory
+from services.live_service import SessionScheduler, process_utterance
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_barge_in_spares_an_utterance_still_in_stt():
+    async def scenario():
+        scheduler = SessionScheduler("s")
+        scheduler.start()
+        stage = asyncio.Event()
+        finished = []
+
+        async def utterance_job():
+            stage.set()
+            await asyncio.sleep(0.05)           # "STT"
+            scheduler.mark_replying()
+            await asyncio.sleep(10)             # "LLM/TTS"
+            finished.append(True)
+
+        scheduler.submit("utterance", utterance_job)
+        await stage.wait()
+        assert not scheduler.cancel_current()
+        await asyncio.sleep(0.1)
+        assert scheduler.cancel_current()
+        await scheduler.close()
+        return finished, scheduler.cancelled
+
+    finished, cancelled = run(scenario())
+    assert finished == [] and cancelled == 1
+
+
+def test_text_jobs_are_cancellable_right_away():
+    async def scenario():
+        scheduler = SessionScheduler("s")
+        scheduler.start()
+        scheduler.submit("text", lambda: asyncio.sleep(10))
+        await asyncio.sleep(0.01)
+        cancelled = scheduler.cancel_current()
+        await scheduler.close()
+        return cancelled
+
+    assert run(scenario())
+
+
+@pytest.fixture
+def session(monkeypatch):
+    transcripts = iter(["I want to change", "my password"])
+    replies = []
+
+    async def fake_transcribe(wav, language_code, filename=None):
+        return next(transcripts)
+
+    async def fake_stream_reply(model, text, language_code, history=None, timings=None):
+        replies.append(text)
+        if timings is not None:
+            timings["ttft_ms"] = 5.0
+        yield "Sure."
+
+    async def fake_stream_speech(session_id, chunks, *args):
+        async for _ in chunks:
+            pass
+
+    monkeypatch.setattr(live_service, "transcribe_audio", fake_transcribe)
+    monkeypatch.setattr(live_service, "stream_reply", fake_stream_reply)
+    monkeypatch.setattr(live_service, "stream_speech", fake_stream_speech)
+
+    context = {
+        "history": ConversationHistory(),
+        "is_recording": False,
+        "language_code": "en",
+        "audio_segmenter": live_service.UtteranceSegmenter(),
+        "scheduler": SessionScheduler("s"),
+    }
+    monkeypatch.setitem(live_service.connection_manager.conversation_contexts, "s", context)
+    return context, replies
+
+
+def test_paused_speech_is_merged_into_one_turn(session):
+    context, replies = session
+    context["is_recording"] = True                     # user resumed talking during STT
+    run(process_utterance("s", b"\0\0" * 160, None))
+    assert replies == [] and context["pending_transcript"] == "I want to change"
+
+    context["is_recording"] = False
+    run(process_utterance("s", b"\0\0" * 160, None))
+    assert replies == ["I want to change my password"]
+    assert "pending_transcript" not in context
+
+
+def test_pending_transcript_is_answered_when_no_utterance_follows(session):
+    context, replies = session
+    context["scheduler"].submit("utterance", functools.partial(process_utterance, "s", b"\0\0", None))
+    run(process_utterance("s", b"\0\0" * 160, None))   # another utterance queued: hold
+    assert replies == []
+
+    context["scheduler"]._inbox.clear()
+    run(process_utterance("s", b"", None))             # flush job after the speech ended
+    assert replies == ["I want to change"]
+
+
+def test_voice_turn_stages_are_exported(session):
+    context, replies = session
+    run(process_utterance("s", b"\0\0" * 160, None))
+    assert replies == ["I want to change"]
+    rendered = live_service.STAGE_SECONDS.render()
+    for stage in ("stt", "llm_ttft", "first_sentence", "total"):
+        assert f'stage_duration_seconds_count{{stage="voice_turn.{stage}"}}' in rendered
@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import time
+import types
+
+from services import llm_service
+from services.response_cache import ResponseCache
+
+UPSTREAM_SECONDS = 0.2
+
+
+class FakeGemini:
+    """Stands in for genai.Client: every generate_content takes UPSTREAM_SECONDS"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.aio = types.SimpleNamespace(models=types.SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(UPSTREAM_SECONDS)
+        finally:
+            self.in_flight -= 1
+        return types.SimpleNamespace(text="ok")
+
+
+async def run_sessions(client, sessions):
+    """Send one uncached message per session at once; returns (elapsed, largest event loop stall)"""
+    stalls = []
+
+    async def heartbeat():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            stalls.append(time.perf_counter() - started - 0.005)
+
+    ticker = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    replies = await asyncio.gather(*(
+        llm_service.generate_reply(client, f"question {i}", "en", use_cache=False)
+        for i in range(sessions)
+    ))
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+    assert replies == ["ok"] * sessions
+    return elapsed, max(stalls)
+
+
+def test_concurrent_sessions_do_not_serialize(monkeypatch):
+    async def scenario():
+        # Fresh semaphore bound to this test's event loop
+        monkeypatch.setattr(llm_service, "_llm_semaphore", asyncio.Semaphore(16))
+        client = FakeGemini()
+        elapsed, stall = await run_sessions(client, 16)
+        # Serialized, 16 calls would take 16 * UPSTREAM_SECONDS
+        assert elapsed < 3 * UPSTREAM_SECONDS
+        assert client.max_in_flight == 16
+        # The loop keeps serving other sessions while calls are in flight
+        assert stall < 0.1
+
+    asyncio.run(scenario())
+
+
+def test_calls_beyond_the_limit_queue(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(llm_service, "_llm_semaphore", asyncio.Semaphore(4))
+        client = FakeGemini()
+        elapsed, _ = await run_sessions(client, 12)
+        assert client.max_in_flight == 4
+        # Three waves of four
+        assert elapsed >= 3 * UPSTREAM_SECONDS
+
+    asyncio.run(scenario())
+
+
+class FakeStream:
+    """Async iterator of text chunks, like the SDK's streaming response"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.texts:
+            raise StopAsyncIteration
+        await asyncio.sleep(0.01)
+        return types.SimpleNamespace(text=self.texts.pop(0))
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeStreamingGemini:
+    def __init__(self):
+        self.streams = []
+        self.aio = types.SimpleNamespace(models=types.SimpleNamespace(
+            generate_content_stream=self.generate_content_stream
+        ))
+
+    async def generate_content_stream(self, **kwargs):
+        stream = FakeStream(["one ", "two ", "three"])
+        self.streams.append(stream)
+        return stream
+
+
+def test_stalled_stream_consumer_does_not_hold_a_slot(monkeypatch):
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        monkeypatch.setattr(llm_service, "_llm_semaphore", semaphore)
+        client = FakeStreamingGemini()
+
+        # A consumer that reads one delta and then stops reading
+        stalled = llm_service.stream_reply(client, "first question", "en", [{"role": "user", "content": "hi"}])
+        assert await stalled.__anext__() == "one "
+        assert not semaphore.locked()
+
+        # Another session still gets the only slot and streams to the end
+        deltas = [delta async for delta in llm_service.stream_reply(
+            client, "second question", "en", [{"role": "user", "content": "hi"}]
+        )]
+        assert deltas == ["one ", "two ", "three"]
+
+        # Abandoning the stalled stream closes its upstream stream
+        await stalled.aclose()
+        assert client.streams[0].closed
+        assert not semaphore.locked()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+def test_stream_timings_are_exported_as_stages(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(llm_service, "_llm_semaphore", asyncio.Semaphore(1))
+        timings = {}
+        deltas = [delta async for delta in llm_service.stream_reply(
+            FakeStreamingGemini(), "a question", "en", [{"role": "user", "content": "hi"}], timings=timings
+        )]
+        assert "".join(deltas) == "one two three"
+        return timings
+
+    timings = asyncio.run(scenario())
+    assert 0 < timings["ttft_ms"] <= timings["total_ms"]
+    rendered = llm_service.STAGE_SECONDS.render()
+    assert 'stage_duration_seconds_count{stage="llm.ttft"}' in rendered
+    assert 'stage_duration_seconds_count{stage="llm.total"}' in rendered
+
+
+def test_context_does_not_pick_the_variant():
+    context = "Answer using these excerpts.\n\n[Page 2] Steps: how to renew the licence..."
+    prompt = llm_service.build_reply_prompt("Who signed the agreement?", "en", context=context)
+    assert prompt["variant"] == "regular"
+    turn = prompt["contents"][-1].parts[-1].text
+    assert turn.startswith(context) and turn.endswith("User said: Who signed the agreement?")
+
+
+def test_context_replies_are_cached_per_scope(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(llm_service, "_llm_semaphore", asyncio.Semaphore(1))
+        monkeypatch.setattr(llm_service, "response_cache", ResponseCache())
+        client = FakeGemini()
+        calls = []
+        original = client.generate_content
+
+        async def counting(**kwargs):
+            calls.append(kwargs)
+            return await original(**kwargs)
+
+        client.aio.models.generate_content = counting
+        ask = functools.partial(llm_service.generate_reply, client, "What is the due date?", "en")
+        await ask(context="[Page 1] Due 5 May", cache_scope="pdf:a")
+        await ask(context="[Page 1] Due 5 May", cache_scope="pdf:a")
+        assert len(calls) == 1
+        # Same question about another file, or with unscoped context, goes upstream
+        await ask(context="[Page 3] Due 9 June", cache_scope="pdf:b")
+        await ask(context="[Page 3] Due 9 June")
+        await ask(context="[Page 3] Due 9 June")
+        assert len(calls) == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,61 @@
+import pytest
+
+from services.message_store import InMemoryMessageStore, MessageStore, SQLiteMessageStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make(retention=1000):
+        if request.param == "memory":
+            store = InMemoryMessageStore(retention=retention)
+        else:
+            store = SQLiteMessageStore(str(tmp_path / f"messages{len(stores)}.db"), retention=retention)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def count(store, conversation_id):
+    page, _ = store.list(conversation_id, limit=100000)
+    return len(page)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        MessageStore()
+
+
+def test_cursor_pagination(make_store):
+    store = make_store()
+    assert store.is_empty("a")
+    ids = [store.append("a", {"text": str(i)})["id"] for i in range(10)]
+    store.append("b", {"text": "other"})
+
+    page, cursor = store.list("a", limit=3)
+    assert [m["text"] for m in page] == ["7", "8", "9"]
+    assert cursor == ids[-1]
+
+    page, cursor = store.list("a", after=ids[4], limit=3)
+    assert [m["text"] for m in page] == ["5", "6", "7"]
+    assert cursor == ids[7]
+
+    page, cursor = store.list("a", after=ids[-1])
+    assert page == [] and cursor == ids[-1]
+
+
+def test_retention_holds_for_interleaved_conversations(make_store):
+    store = make_store(retention=50)
+    for i in range(1000):
+        store.append("a", {"text": str(i)})
+        if i % 20 == 0:
+            store.append("b", {"text": str(i)})
+    # Pruning runs per conversation at most every `retention` appends
+    assert count(store, "a") < 2 * 50
+    assert count(store, "b") == 50
+    page, _ = store.list("a", limit=1)
+    assert page[0]["text"] == "999"
@@ -0,0 +1,66 @@
+import os
+import threading
+
+import pytest
+
+from services import pdf_index
+from services.pdf_index import build_pdf_index, load_pdf_index, search_pdf_index, tokenize
+
+
+def test_danda_is_not_part_of_a_token():
+    assert tokenize("यह बहुत आसान है। क्या आप तैयार हैं॥") == ["यह", "बहुत", "आसान", "है", "क्या", "आप", "तैयार", "हैं"]
+    # Vowel signs and viramas stay inside the word
+    assert tokenize("प्रक्रिया") == ["प्रक्रिया"]
+    assert tokenize("পদ্ধতি।") == ["পদ্ধতি"]
+
+
+@pytest.fixture
+def fake_pdf(tmp_path, monkeypatch):
+    pages = {
+        "doc.pdf": ["आधार कार्ड डाउनलोड करना आसान है।", "Reset your UPI PIN from the app settings."],
+    }
+    monkeypatch.setattr(pdf_index, "extract_pages", lambda path: pages[os.path.basename(path)])
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-")
+    monkeypatch.setattr(pdf_index, "_index_cache", pdf_index.OrderedDict())
+    return str(path)
+
+
+def test_sentence_final_words_match_queries(fake_pdf):
+    results = search_pdf_index(build_pdf_index(fake_pdf), "आसान", top_k=1)
+    assert results and results[0]["page"] == 1
+
+
+def test_concurrent_builds_leave_a_complete_index(fake_pdf):
+    errors = []
+
+    def build():
+        try:
+            build_pdf_index(fake_pdf)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert not [name for name in os.listdir(os.path.dirname(fake_pdf)) if name.endswith(".tmp")]
+    pdf_index._index_cache.clear()
+    assert len(load_pdf_index(fake_pdf)["passages"]) == 2
+
+
+def test_index_cache_is_bounded(fake_pdf, monkeypatch):
+    monkeypatch.setattr(pdf_index, "PDF_INDEX_CACHE_SIZE", 2)
+    index = load_pdf_index(fake_pdf)
+    for i in range(5):
+        pdf_index._cache_index(f"other{i}.pdf", index)
+    assert list(pdf_index._index_cache) == ["other3.pdf", "other4.pdf"]
+
+
+def test_indexes_from_an_older_tokenizer_are_rebuilt(fake_pdf):
+    with open(pdf_index.index_path(fake_pdf), "w", encoding="utf-8") as f:
+        f.write('{"passages": [], "postings": {}, "lengths": [], "avg_length": 0}')
+    assert load_pdf_index(fake_pdf)["version"] == pdf_index.INDEX_VERSION
@@ -0,0 +1,84 @@
+import asyncio
+import types
+
+from services import prompt_builder
+from services.llm_service import build_reply_prompt
+from services.prompt_builder import assemble_prompt, SystemInstructionCache
+
+
+def texts(prompt):
+    return [[part.text for part in content.parts] for content in prompt["contents"]]
+
+
+def test_current_message_already_in_history_is_sent_once():
+    history = [
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": "hi there"},
+        {"role": "user", "content": "what is the time"},
+    ]
+    prompt = build_reply_prompt("what is the time", "en", history)
+    assert texts(prompt) == [
+        ["hello"],
+        ["hi there"],
+        ["Reply in English and help the user. User said: what is the time"],
+    ]
+
+
+def test_unanswered_turn_that_is_a_substring_is_kept():
+    # A short turn cut off by a barge-in, followed by a new message containing it
+    history = [{"role": "user", "content": "time"}]
+    prompt = build_reply_prompt("what is the time", "en", history)
+    assert texts(prompt) == [
+        ["time", "Reply in English and help the user. User said: what is the time"],
+    ]
+
+
+def test_history_is_kept_without_current_text():
+    history = [{"role": "user", "content": "look at this"}]
+    prompt = assemble_prompt("screen_guidance", "look at this", history)
+    assert texts(prompt) == [["look at this", "look at this"]]
+
+
+class FakeCaches:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def create(self, model, config):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return types.SimpleNamespace(name=f"cachedContents/{self.calls}")
+
+
+def fake_client(errors):
+    return types.SimpleNamespace(aio=types.SimpleNamespace(caches=FakeCaches(errors)))
+
+
+def test_transient_cache_error_is_retried_after_backoff(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(prompt_builder, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+    cache = SystemInstructionCache(enabled=True, retry_seconds=60)
+    client = fake_client([Exception("503 UNAVAILABLE. The service is currently unavailable")])
+
+    assert asyncio.run(cache.get(client, "gemini", "regular")) is None
+    # Inside the backoff window no new attempt is made
+    assert asyncio.run(cache.get(client, "gemini", "regular")) is None
+    assert client.aio.caches.calls == 1
+
+    clock[0] += 60
+    assert asyncio.run(cache.get(client, "gemini", "regular")) == "cachedContents/2"
+
+
+def test_too_small_instruction_is_never_retried(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(prompt_builder, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+    cache = SystemInstructionCache(enabled=True, retry_seconds=60)
+    client = fake_client([Exception(
+        "400 INVALID_ARGUMENT. Cached content is too small. total_token_count=900, min_total_token_count=1024"
+    )])
+
+    assert asyncio.run(cache.get(client, "gemini", "regular")) is None
+    clock[0] += 3600
+    assert asyncio.run(cache.get(client, "gemini", "regular")) is None
+    assert client.aio.caches.calls == 1
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from services.response_cache import ResponseCache, normalize_query, trigrams
+
+
+def test_exact_tier_only_by_default():
+    cache = ResponseCache()
+    cache.put("How do I reset my UPI PIN?", "en", "process", "Open the app...")
+    assert cache.get("how do i reset my upi pin", "en", "process") == "Open the app..."
+    assert cache.get("How do I reset my UPI PIN now?", "en", "process") is None
+
+
+def test_keys_are_scoped_by_language_and_variant():
+    cache = ResponseCache()
+    cache.put("hello", "en", "regular", "Hi!")
+    assert cache.get("hello", "hi", "regular") is None
+    assert cache.get("hello", "en", "process") is None
+
+
+def test_danda_is_stripped_like_other_punctuation():
+    assert normalize_query("क्या है।") == normalize_query("क्या है?") == "क्या है"
+    assert normalize_query("ठीक है॥") == "ठीक है"
+
+
+def test_case_whitespace_and_final_punctuation_are_folded():
+    assert normalize_query("  What is   UPI? ") == normalize_query("what is upi") == "what is upi"
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What is 2+2?", "What is 2-2?"),
+    ("What is 2+2?", "what is 2*2"),
+    ("What is 2-2?", "what is 2*2"),
+    ("Is 5 > 3?", "Is 5 < 3?"),
+    ("C++ vs C#", "C vs C"),
+    ("10% of 50", "10 of 50"),
+    ("x = 4 / 2", "x = 4 * 2"),
+])
+def test_symbols_keep_questions_apart(first, second):
+    assert normalize_query(first) != normalize_query(second)
+    cache = ResponseCache()
+    cache.put(first, "en", "regular", "first answer")
+    assert cache.get(second, "en", "regular") is None
+    assert cache.get(first, "en", "regular") == "first answer"
+
+
+def test_similar_tier_matches_rephrasings():
+    cache = ResponseCache(similarity=0.7)
+    cache.put("how do i change my password", "en", "process", "Go to settings")
+    assert cache.get("how do i change my password please", "en", "process") == "Go to settings"
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_similar_tier_ignores_negated_questions():
+    cache = ResponseCache(similarity=0.85)
+    cache.put("Is it safe to share my OTP with the bank?", "en", "regular", "No.")
+    assert cache.get("Is it not safe to share my OTP with the bank?", "en", "regular") is None
+    cache.put("क्या ओटीपी बताना सुरक्षित है", "hi", "regular", "नहीं।")
+    assert cache.get("क्या ओटीपी बताना सुरक्षित नहीं है", "hi", "regular") is None
+
+
+def test_similar_tier_only_scores_indexed_candidates():
+    cache = ResponseCache(max_entries=5000, similarity=0.85)
+    for i in range(2000):
+        cache.put(f"unrelated question number {i} about topic {i * 7}", "en", "regular", str(i))
+    cache.put("what is the capital of france", "en", "regular", "Paris")
+    candidates = cache._candidates("en", "regular", trigrams(normalize_query("what is the capital of france?")))
+    assert len(candidates) < 50
+    assert cache.get("what is the capital of france?", "en", "regular") == "Paris"
+
+
+def test_eviction_and_expiry_keep_the_index_in_step():
+    cache = ResponseCache(max_entries=2, similarity=0.5)
+    cache.put("first question", "en", "regular", "1")
+    cache.put("second question", "en", "regular", "2")
+    cache.put("third question", "en", "regular", "3")
+    assert cache.get("first question", "en", "regular") is None
+    indexed = set().union(*cache._gram_index.values())
+    assert indexed == set(cache._entries)
+
+    cache = ResponseCache(ttl=0)
+    cache.put("hello", "en", "regular", "Hi!")
+    time.sleep(0.01)
+    assert cache.get("hello", "en", "regular") is None
+    assert not cache._gram_index
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import types
+
+import httpx
+import pytest
+
+import sarvam_tts
+from sarvam_tts import CircuitBreaker, CircuitOpenError, SarvamTTS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # Replace the module's time reference only; patching time.monotonic
+    # itself would also freeze the asyncio event loop's clock
+    monkeypatch.setattr(sarvam_tts, "time", types.SimpleNamespace(monotonic=fake))
+    return fake
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30.0
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    # Only one trial at a time
+    assert not breaker.allow()
+
+
+def test_breaker_trial_success_closes_and_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_release_trial_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+def make_tts(handler, **breaker_args):
+    tts = SarvamTTS()
+    tts.max_retries = 0
+    tts.breaker = CircuitBreaker(**{"failure_threshold": 1, "reset_timeout": 10.0, **breaker_args})
+    tts._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return tts
+
+
+def open_to_half_open(tts, clock):
+    tts.breaker.record_failure()
+    clock.now += 10.0
+    assert tts.breaker.state == "half-open"
+
+
+def test_client_error_during_trial_releases_the_slot(clock):
+    tts = make_tts(lambda request: httpx.Response(400, text="bad speaker"))
+    open_to_half_open(tts, clock)
+
+    with pytest.raises(Exception, match="400"):
+        asyncio.run(tts._post({}))
+    assert not tts.breaker.trial_in_flight
+    assert tts.breaker.allow()
+
+
+def test_cancelled_trial_reopens_instead_of_sticking(clock):
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={"audios": ["x"]})
+
+    tts = make_tts(slow)
+    open_to_half_open(tts, clock)
+
+    async def cancel_mid_request():
+        task = asyncio.create_task(tts._post({}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_mid_request())
+    assert not tts.breaker.trial_in_flight
+    assert tts.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(tts._post({}))
+    clock.now += 10.0
+    assert tts.breaker.allow()
+
+
+def test_cancelled_call_while_closed_is_not_a_failure(clock):
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={"audios": ["x"]})
+
+    tts = make_tts(slow, failure_threshold=2)
+
+    async def cancel_mid_request():
+        task = asyncio.create_task(tts._post({}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_mid_request())
+    assert tts.breaker.failures == 0
+    assert tts.breaker.state == "closed"
+
+
+def test_exhausted_retries_count_one_failure(clock):
+    calls = []
+
+    def unavailable(request):
+        calls.append(request)
+        return httpx.Response(503, text="busy")
+
+    tts = make_tts(unavailable, failure_threshold=2)
+    tts.max_retries = 2
+    tts.backoff_max = 0
+
+    with pytest.raises(Exception, match="503"):
+        asyncio.run(tts._post({}))
+    assert len(calls) == 3
+    assert tts.breaker.failures == 1
+
+
+def test_requests_reuse_one_connection_against_stub_server():
+    """A local HTTP/1.1 stub counts TCP connections across several TTS calls"""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            body = json.dumps({"audios": ["UklGRg=="]}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            if reader.at_eof():
+                break
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        tts = SarvamTTS()
+        tts.url = f"http://127.0.0.1:{port}/text-to-speech"
+        try:
+            for i in range(5):
+                result = await tts.text_to_speech(f"chunk number {i}")
+                assert result["audio_base64"] == "UklGRg=="
+        finally:
+            await tts.aclose()
+            server.close()
+            for writer in connections:
+                writer.close()
+
+    asyncio.run(run())
+    assert len(connections) == 1
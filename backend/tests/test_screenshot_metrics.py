@@ -0,0 +1,23 @@
+import threading
+
+from services.live_service import ScreenshotMetrics
+
+
+def test_concurrent_updates_are_not_lost():
+    metrics = ScreenshotMetrics()
+
+    def work():
+        for _ in range(2000):
+            metrics.record_stage("decode", 1.0)
+            metrics.count("bytes_out", 10)
+            metrics.snapshot()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["stages"]["decode"] == {"calls": 16000, "avg_ms": 1.0}
+    assert snapshot["bytes_out"] == 160000
@@ -0,0 +1,35 @@
+import pytest
+
+from utils.text_utils import strip_markdown, split_text_for_tts, TTS_MAX_CHARS
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("Some **bold** and *italic* text.", "Some bold and italic text."),
+    ("# Title\n\n## Sub heading", "Title Sub heading"),
+    ("- one\n* two\n  + nested\n1. first\n10. tenth", "one two nested first tenth"),
+    ("> quoted line\n> - quoted bullet", "quoted line quoted bullet"),
+    ("before\n---\nafter", "before after"),
+    ("See [the docs](https://example.com) and `pip install x`.", "See the docs and pip install x."),
+    ("Run:\n```bash\nrm -rf build\n```\nDone.", "Run: Done."),
+    ("**[Settings](app://settings)** then *`Save`*", "Settings then Save"),
+    ("5 * 3 = 15, version 2.5 costs ₹1,000.", "5 * 3 = 15, version 2.5 costs ₹1,000."),
+    ("1. **सेटिंग्स** खोलें।\n2. *सुरक्षा* चुनें।", "सेटिंग्स खोलें। सुरक्षा चुनें।"),
+    ("- **அமைப்புகள்** திறக்கவும்.\n- `சேமி` அழுத்தவும்.", "அமைப்புகள் திறக்கவும். சேமி அழுத்தவும்."),
+    ("  \n\n  ", ""),
+])
+def test_strip_markdown(source, expected):
+    assert strip_markdown(source) == expected
+
+
+@pytest.mark.parametrize("sample", [
+    "भारत एक विशाल देश है। यहाँ अनेक भाषाएँ बोली जाती हैं और हर क्षेत्र की अपनी संस्कृति है। " * 30,
+    "தமிழ் ஒரு பழமையான மொழி. இது இலக்கிய வளம் மிக்கது, பல நூற்றாண்டுகளாக வளர்ந்து வருகிறது. " * 30,
+    "বাংলা একটি সমৃদ্ধ ভাষা। রবীন্দ্রনাথ ঠাকুর এই ভাষায় অনেক কবিতা লিখেছেন। " * 30,
+    "Open the settings menu. Then choose the network tab, and check the connection status? " * 30,
+], ids=["hi", "ta", "bn", "en"])
+def test_split_text_for_tts_cuts_only_between_sentences(sample):
+    chunks = split_text_for_tts(sample)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= TTS_MAX_CHARS for chunk in chunks)
+    assert all(chunk.endswith(("।", ".", "?", "!")) for chunk in chunks)
+    assert " ".join(chunks) == sample.strip()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import threading
+
+from services.tts_cache import TTSCache
+
+
+def result(size):
+    return {"success": True, "audio_base64": "A" * size, "content_type": "audio/wav"}
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = TTSCache(max_bytes=10_000, disk_dir=str(tmp_path), disk_max_bytes=3_000)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, result(800))
+        os.utime(tmp_path / f"{key}.json", (1000 + i, 1000 + i))
+
+    # A disk hit refreshes "a", so "b" is now the oldest file
+    fresh = TTSCache(max_bytes=10_000, disk_dir=str(tmp_path), disk_max_bytes=3_000)
+    assert fresh.get("a") is not None
+    fresh.put("d", result(800))
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.json", "c.json", "d.json"]
+    stats = fresh.stats()
+    assert stats["disk_evictions"] == 1
+    assert stats["disk_bytes"] <= 3_000
+
+
+def test_disk_usage_is_counted_across_restarts(tmp_path):
+    cache = TTSCache(disk_dir=str(tmp_path))
+    cache.put("a", result(500))
+    assert TTSCache(disk_dir=str(tmp_path)).stats()["disk_bytes"] == cache.stats()["disk_bytes"] > 500
+
+
+def test_async_access_does_disk_io_off_the_event_loop(tmp_path, monkeypatch):
+    cache = TTSCache(disk_dir=str(tmp_path))
+    loop_thread = threading.get_ident()
+    io_threads = []
+    put_disk, get_disk = cache._put_disk, cache._get_disk
+
+    def spy(fn):
+        def wrapper(*args):
+            io_threads.append(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    monkeypatch.setattr(cache, "_put_disk", spy(put_disk))
+    monkeypatch.setattr(cache, "_get_disk", spy(get_disk))
+
+    async def run():
+        await cache.aput("a", result(100))
+        # Memory hit: no disk read
+        assert (await cache.aget("a"))["audio_base64"] == "A" * 100
+        cache._entries.clear()
+        assert (await cache.aget("a"))["audio_base64"] == "A" * 100
+        assert await cache.aget("missing") is None
+
+    asyncio.run(run())
+    assert len(io_threads) == 3
+    assert loop_thread not in io_threads
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
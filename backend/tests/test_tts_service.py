@@ -0,0 +1,69 @@
+import base64
+import io
+import wave
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services import tts_service as tts_module
+
+app = FastAPI()
+
+
+@app.post("/tts/stream")
+async def tts_stream(request: Request):
+    return await tts_module.tts_stream_handler(request)
+
+
+def wav_base64(frames=b"\x01\x00" * 160):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(frames)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def long_text():
+    return "This is one sentence of a long reply. " * 40
+
+
+def test_malformed_json_returns_an_error(client):
+    response = client.post("/tts/stream", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+    assert "error" in response.json()
+
+
+def test_every_chunk_failing_returns_an_error_not_empty_audio(client, monkeypatch):
+    async def failing(**kwargs):
+        raise Exception("Circuit open")
+
+    monkeypatch.setattr(tts_module.tts_service, "text_to_speech", failing)
+    response = client.post("/tts/stream", json={"text": long_text(), "language": "en"})
+    assert response.headers["content-type"].startswith("application/json")
+    assert "Circuit open" in response.json()["error"]
+
+
+def test_audio_streams_when_the_first_chunk_succeeds(client, monkeypatch):
+    calls = []
+
+    async def synthesize(**kwargs):
+        calls.append(kwargs["text"])
+        if len(calls) == 2:
+            raise Exception("one bad chunk")
+        return {"success": True, "audio_base64": wav_base64()}
+
+    monkeypatch.setattr(tts_module.tts_service, "text_to_speech", synthesize)
+    response = client.post("/tts/stream", json={"text": long_text(), "language": "en"})
+    assert response.headers["content-type"] == "audio/wav"
+    chunks = int(response.headers["X-TTS-Chunks"])
+    assert chunks > 2
+    # Header plus the frames of every chunk except the failed one
+    assert len(response.content) == 44 + 320 * (chunks - 1)
@@ -0,0 +1,50 @@
+import asyncio
+import types
+
+import pytest
+
+from services import upload_service as upload_module
+from services.upload_service import UploadService, IngestQueueFull
+
+
+def finish(service, file_id, state="done"):
+    service._set_status(file_id, state=state)
+
+
+def test_finished_statuses_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(upload_module, "time", types.SimpleNamespace(time=lambda: now[0]))
+    service = UploadService(str(tmp_path), status_ttl=60, max_statuses=100)
+    finish(service, "old")
+    finish(service, "broken", state="failed")
+    service._set_status("busy", state="processing")
+
+    now[0] += 61
+    finish(service, "new")
+    assert set(service.status) == {"busy", "new"}
+
+
+def test_status_count_is_capped_without_dropping_active_files(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(upload_module, "time", types.SimpleNamespace(time=lambda: now[0]))
+    service = UploadService(str(tmp_path), status_ttl=3600, max_statuses=3)
+    service._set_status("queued", state="queued")
+    for file_id in ("a", "b", "c", "d"):
+        now[0] += 1
+        finish(service, file_id)
+    assert set(service.status) == {"queued", "c", "d"}
+    assert service.get_status("a") is None
+
+
+def test_full_queue_fails_fast_instead_of_waiting(tmp_path):
+    async def scenario():
+        service = UploadService(str(tmp_path), queue_size=1)
+        assert service.enqueue("first")["state"] == "queued"
+        with pytest.raises(IngestQueueFull):
+            service.enqueue("second")
+        # A rejected file has no status, so it can be queued again later
+        assert service.get_status("second") is None
+        service._queue.get_nowait()
+        assert service.enqueue("second")["state"] == "queued"
+
+    asyncio.run(scenario())
@@ -0,0 +1,161 @@
+import io
+import math
+import struct
+import wave
+from array import array
+from collections import deque
+
+# The live client streams 16 kHz mono PCM16 (see liveAudioHelper.js)
+LIVE_SAMPLE_RATE = 16000
+LIVE_SAMPLE_WIDTH = 2
+LIVE_CHANNELS = 1
+
+def pcm_to_wav(pcm_bytes, sample_rate=LIVE_SAMPLE_RATE, sample_width=LIVE_SAMPLE_WIDTH, channels=LIVE_CHANNELS):
+    """Wrap raw PCM samples in a WAV container, entirely in memory"""
+    wav_io = io.BytesIO()
+    with wave.open(wav_io, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm_bytes)
+    return wav_io.getvalue()
+
+def streaming_wav_header(sample_rate, sample_width, channels):
+    """
+    WAV header for a stream whose length isn't known yet.
+    
+    The RIFF and data sizes are set to the maximum value, which browsers
+    and most decoders treat as "read until the stream ends".
+    """
+    byte_rate = sample_rate * sample_width * channels
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, byte_rate,
+        sample_width * channels, sample_width * 8,
+        b'data', 0xFFFFFFFF
+    )
+
+def frame_rms(frame_bytes):
+    """Root-mean-square energy of a little-endian PCM16 frame"""
+    samples = array('h')
+    samples.frombytes(frame_bytes)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class UtteranceSegmenter:
+    """
+    Energy-based endpointer for a continuous PCM16 mono stream.
+
+    Audio is fed in arbitrarily sized packets and cut into fixed frames.
+    Recent silent frames are kept in a ring buffer so the onset of speech
+    is not clipped. Once speech starts, frames accumulate until enough
+    trailing silence is seen (or the utterance hits its maximum length),
+    and the utterance is returned as raw PCM.
+    """
+
+    def __init__(self, sample_rate=LIVE_SAMPLE_RATE, frame_ms=30, threshold=500.0,
+                 noise_ratio=3.0, start_ms=90, end_silence_ms=700, preroll_ms=300,
+                 min_utterance_ms=300, max_utterance_ms=30000):
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * LIVE_SAMPLE_WIDTH
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.min_frames = max(1, min_utterance_ms // frame_ms)
+        self.max_frames = max(1, max_utterance_ms // frame_ms)
+
+        self._pending = bytearray()
+        self._preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._utterance = bytearray()
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+        self._noise_floor = None
+
+    @property
+    def in_speech(self):
+        return self._in_speech
+
+    def _is_voiced(self, rms):
+        # Track the background level on quiet frames so a noisy room
+        # raises the bar instead of triggering constantly
+        floor = self._noise_floor if self._noise_floor is not None else rms
+        voiced = rms >= max(self.threshold, floor * self.noise_ratio)
+        if not voiced:
+            self._noise_floor = rms if self._noise_floor is None else 0.95 * self._noise_floor + 0.05 * rms
+        return voiced
+
+    def _finish(self):
+        """Close the current utterance and return it if it is long enough"""
+        utterance = bytes(self._utterance)
+        keep = self._speech_frames >= self.min_frames
+        self._utterance = bytearray()
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+        self._preroll.clear()
+        return utterance if keep else None
+
+    def feed(self, pcm_bytes):
+        """
+        Add a packet of PCM16 audio.
+
+        Returns:
+            list: Completed utterances (raw PCM bytes), usually empty
+        """
+        completed = []
+        self._pending.extend(pcm_bytes)
+
+        while len(self._pending) >= self.frame_bytes:
+            frame = bytes(self._pending[:self.frame_bytes])
+            del self._pending[:self.frame_bytes]
+            voiced = self._is_voiced(frame_rms(frame))
+
+            if not self._in_speech:
+                self._preroll.append(frame)
+                self._voiced_run = self._voiced_run + 1 if voiced else 0
+                if self._voiced_run >= self.start_frames:
+                    # Speech onset: start the utterance with the buffered lead-in
+                    self._in_speech = True
+                    self._utterance = bytearray(b''.join(self._preroll))
+                    self._speech_frames = self._voiced_run
+                    self._preroll.clear()
+                continue
+
+            self._utterance.extend(frame)
+            if voiced:
+                self._speech_frames += 1
+                self._silent_run = 0
+            else:
+                self._silent_run += 1
+
+            utterance_frames = len(self._utterance) // self.frame_bytes
+            if self._silent_run >= self.end_frames or utterance_frames >= self.max_frames:
+                utterance = self._finish()
+                if utterance:
+                    completed.append(utterance)
+
+        return completed
+
+    def flush(self):
+        """
+        Force the end of the current turn (e.g. on an explicit end_turn).
+
+        Returns:
+            bytes or None: The in-progress utterance, if it contains speech
+        """
+        if self._in_speech:
+            self._utterance.extend(self._pending)
+            utterance = self._finish()
+        else:
+            utterance = None
+            self._preroll.clear()
+            self._voiced_run = 0
+        self._pending = bytearray()
+        return utterance
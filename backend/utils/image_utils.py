@@ -0,0 +1,117 @@
+import io
+import os
+import re
+import base64
+
+# Screenshots are scaled so their longest side is at most this many pixels
+# and re-encoded as JPEG at this quality before they are sent to Gemini
+SCREENSHOT_MAX_SIDE = int(os.getenv("SCREENSHOT_MAX_SIDE", "1280"))
+SCREENSHOT_JPEG_QUALITY = int(os.getenv("SCREENSHOT_JPEG_QUALITY", "70"))
+# Frames whose difference hashes differ in at most this many of 64 bits
+# are treated as the same screen
+SCREENSHOT_HASH_DISTANCE = int(os.getenv("SCREENSHOT_HASH_DISTANCE", "4"))
+# When the changed region covers at most this share of the frame, only that
+# region is sent at full resolution, alongside a thumbnail of the whole screen
+SCREENSHOT_CROP_MAX_AREA = float(os.getenv("SCREENSHOT_CROP_MAX_AREA", "0.5"))
+SCREENSHOT_THUMBNAIL_SIDE = int(os.getenv("SCREENSHOT_THUMBNAIL_SIDE", "384"))
+
+_DATA_URI = re.compile(r'data:(image/[^;]+);base64,(.+)', re.DOTALL)
+
+def decode_data_uri(data_uri):
+    """
+    Split an image data URI into its MIME type and raw bytes
+
+    Raises:
+        ValueError: If the string is not a base64 image data URI
+    """
+    match = _DATA_URI.match(data_uri or "")
+    if not match:
+        raise ValueError("Invalid image data: must be a data URI with base64 encoding")
+    return match.group(1), base64.b64decode(match.group(2))
+
+def to_data_uri(image_bytes, mime_type="image/jpeg"):
+    """Encode raw image bytes as a base64 data URI"""
+    return f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('ascii')}"
+
+def load_image(image_bytes):
+    """Decode image bytes into an RGB Pillow image"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return img.convert("RGB")
+
+def normalize_image(img, max_side=SCREENSHOT_MAX_SIDE):
+    """Scale an image down so its longest side is at most max_side"""
+    from PIL import Image
+
+    if max(img.size) <= max_side:
+        return img
+    scale = max_side / max(img.size)
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+def encode_jpeg(img, quality=SCREENSHOT_JPEG_QUALITY):
+    """Encode an RGB image as an optimized JPEG"""
+    output = io.BytesIO()
+    img.save(output, "JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+def dhash(img, hash_size=8):
+    """
+    Difference hash of an image: compares neighbouring pixels of a
+    (hash_size + 1) x hash_size grayscale thumbnail, so it survives
+    rescaling and recompression but changes when the content does
+    """
+    from PIL import Image
+
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hash_distance(a, b):
+    """Number of differing bits between two image hashes"""
+    return bin(a ^ b).count("1")
+
+def diff_bbox(previous, current, scale=4, threshold=32, margin=16):
+    """
+    Bounding box of the region that differs between two frames
+
+    The frames are compared at 1/scale resolution in grayscale, and pixels
+    whose difference is below threshold (JPEG noise) are ignored.
+
+    Returns:
+        tuple: (left, top, right, bottom) in current's coordinates, padded
+               by margin, or None if nothing changed. Frames of different
+               sizes count as entirely changed.
+    """
+    from PIL import ImageChops
+
+    if previous.size != current.size:
+        return (0, 0) + current.size
+    a = previous.convert("L").reduce(scale)
+    b = current.convert("L").reduce(scale)
+    mask = ImageChops.difference(a, b).point(lambda v: 255 if v > threshold else 0)
+    box = mask.getbbox()
+    if box is None:
+        return None
+    left, top, right, bottom = (edge * scale for edge in box)
+    return (
+        max(0, left - margin), max(0, top - margin),
+        min(current.width, right + margin), min(current.height, bottom + margin),
+    )
+
+def box_fraction(box, size):
+    """Share of an image's area covered by a bounding box"""
+    left, top, right, bottom = box
+    return (right - left) * (bottom - top) / float(size[0] * size[1])
+
+def make_thumbnail(img, max_side=SCREENSHOT_THUMBNAIL_SIDE):
+    """Low-resolution copy of an image for overall context"""
+    thumb = img.copy()
+    thumb.thumbnail((max_side, max_side))
+    return thumb
@@ -0,0 +1,61 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+# One supported language:
+#   code        short code used across the app and the API ("hi")
+#   name        name in its own script, used in "reply in ..." prompts
+#   bcp47       language code Sarvam STT and TTS expect ("hi-IN")
+#   tts_speaker default Sarvam TTS voice, or None if TTS doesn't speak it
+#   stt         whether Sarvam STT transcribes it
+#   script      (first, last) code point of its Unicode block, or None for Latin
+Language = namedtuple("Language", ["code", "name", "bcp47", "tts_speaker", "stt", "script"])
+
+# Single source of truth for supported languages. To add a language, add a
+# row here; prompts, voices, STT validation and script detection pick it up.
+# Languages sharing a script block (Hindi and Marathi) list the one script
+# detection should report first.
+LANGUAGES = MappingProxyType({language.code: language for language in (
+    Language("hi", "हिंदी", "hi-IN", "meera", True, (0x0900, 0x097F)),
+    Language("en", "English", "en-IN", "arjun", True, None),
+    Language("ta", "தமிழ்", "ta-IN", "maitreyi", True, (0x0B80, 0x0BFF)),
+    Language("bn", "বাংলা", "bn-IN", "amartya", True, (0x0980, 0x09FF)),
+    Language("gu", "ગુજરાતી", "gu-IN", "meera", True, (0x0A80, 0x0AFF)),
+    Language("mr", "मराठी", "mr-IN", "amol", True, (0x0900, 0x097F)),
+    Language("te", "తెలుగు", "te-IN", "arvind", True, (0x0C00, 0x0C7F)),
+    Language("kn", "ಕನ್ನಡ", "kn-IN", "maya", True, (0x0C80, 0x0CFF)),
+    Language("ml", "മലയാളം", "ml-IN", "diya", True, (0x0D00, 0x0D7F)),
+    Language("pa", "ਪੰਜਾਬੀ", "pa-IN", "neel", True, (0x0A00, 0x0A7F)),
+    Language("od", "ଓଡ଼ିଆ", "od-IN", None, True, (0x0B00, 0x0B7F)),
+)})
+
+DEFAULT_LANGUAGE = LANGUAGES["hi"]
+
+# Codes accepted by Sarvam STT; "unknown" asks it to detect the language
+STT_LANGUAGE_CODES = frozenset(
+    ["unknown"] + [language.bcp47 for language in LANGUAGES.values() if language.stt]
+)
+
+def get_language(code, default=DEFAULT_LANGUAGE):
+    """
+    Look up a language by its short ("hi") or BCP-47 ("hi-IN") code
+
+    Returns:
+        Language: The registry entry, or default for an unknown code
+    """
+    return LANGUAGES.get((code or "")[:2].lower(), default)
+
+def language_name(code, default="en"):
+    """Name of a language in its own script, for "reply in ..." prompts"""
+    return get_language(code, LANGUAGES[default]).name
+
+def to_bcp47(code):
+    """
+    BCP-47 code for a short language code ("hi" -> "hi-IN")
+
+    Codes that already carry a region are returned unchanged and unknown
+    short codes get the "-IN" suffix, as before the registry existed.
+    """
+    if not code or '-' in code or len(code) > 3:
+        return code
+    language = LANGUAGES.get(code)
+    return language.bcp47 if language else f"{code}-IN"
@@ -0,0 +1,75 @@
+import os
+
+from utils.language_registry import LANGUAGES
+
+# Detection results below this confidence leave the session language alone
+LANGUAGE_DETECT_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_DETECT_MIN_CONFIDENCE", "0.6"))
+# Letters needed before a detection counts at full confidence
+_FULL_CONFIDENCE_LETTERS = 8
+
+# Unicode block of each supported script and the language it implies, from
+# the language registry. Only languages the voice pipeline can speak are
+# detected, so a switch never lands on one TTS would read in another voice.
+# Devanagari is shared by Hindi and Marathi and is split further below.
+SCRIPT_BLOCKS = {}
+for _language in LANGUAGES.values():
+    if _language.script and _language.tts_speaker and _language.script not in SCRIPT_BLOCKS.values():
+        SCRIPT_BLOCKS[_language.code] = _language.script
+
+# Each code point of interest maps to a one-letter tag and everything else
+# is deleted, so str.translate turns the text into a histogram string in C
+# and str.count reads off each bucket
+_TAGS = {language: chr(ord("A") + i) for i, language in enumerate(SCRIPT_BLOCKS)}
+_LATIN_TAG = "z"
+_TRANSLATE_TABLE = [None] * 0x0E00
+for _code, (_start, _end) in SCRIPT_BLOCKS.items():
+    for _code_point in range(_start, _end + 1):
+        _TRANSLATE_TABLE[_code_point] = _TAGS[_code]
+for _code_point in list(range(ord("A"), ord("Z") + 1)) + list(range(ord("a"), ord("z") + 1)):
+    _TRANSLATE_TABLE[_code_point] = _LATIN_TAG
+
+# Frequent Marathi words that Hindi doesn't use, and vice versa
+_MARATHI_WORDS = frozenset(["आहे", "आहेत", "आणि", "नाही", "काय", "मला", "तुम्ही", "कसे", "कसा", "माझे", "माझा", "करू"])
+_HINDI_WORDS = frozenset(["है", "हैं", "और", "नहीं", "क्या", "मुझे", "आप", "मेरा", "मेरे", "कैसे", "का", "की", "के", "में"])
+# Function words are frequent, so the start of a long text is enough
+_HINT_CHARS = 2000
+
+def _devanagari_language(text):
+    """Tell Hindi from Marathi by their most common function words (and the letter ळ)"""
+    sample = text[:_HINT_CHARS]
+    marathi = sample.count("ळ")
+    hindi = 0
+    for word in sample.split():
+        word = word.strip("।?.!,")
+        if word in _MARATHI_WORDS:
+            marathi += 1
+        elif word in _HINDI_WORDS:
+            hindi += 1
+    return "mr" if marathi > hindi else "hi"
+
+def detect_language(text):
+    """
+    Detect a message's language from the Unicode blocks of its letters
+
+    Returns:
+        tuple: (language code, confidence between 0 and 1). Latin letters
+               count as English; text with no letters returns (None, 0.0).
+    """
+    if not text:
+        return None, 0.0
+
+    # Code points past the table raise IndexError and are left as they are,
+    # which is harmless: they can never equal one of the ASCII tags
+    histogram = text.translate(_TRANSLATE_TABLE)
+    counts = {language: histogram.count(tag) for language, tag in _TAGS.items()}
+    counts["en"] = histogram.count(_LATIN_TAG)
+
+    language, top = max(counts.items(), key=lambda item: item[1])
+    letters = sum(counts.values())
+    if not top:
+        return None, 0.0
+
+    confidence = (top / letters) * min(1.0, letters / _FULL_CONFIDENCE_LETTERS)
+    if language == "hi":
+        language = _devanagari_language(text)
+    return language, round(confidence, 3)
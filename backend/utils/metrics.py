@@ -0,0 +1,264 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds; upstream calls range from cached TTS chunks
+# to long Gemini generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Content type of the Prometheus text exposition format served by /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for metrics with an optional fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        # A metric without labels is exported as 0 until it is first updated
+        if not self.labelnames and self.kind in ("counter", "gauge"):
+            self._values[()] = 0
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Yield (suffix, label values, extra label, value) for the exposition"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", key, None, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. errors per upstream"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. open sessions"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values (latencies) in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [per-bucket counts..., +Inf count], sum
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", key, ("le", _format_value(float(bound))), cumulative
+            yield "_sum", key, None, total
+            yield "_count", key, None, cumulative
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together by the /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to produce the response headers of an HTTP request",
+    ["method", "route", "status"]
+)
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to upstream APIs (Gemini, Sarvam STT, Sarvam TTS)",
+    ["upstream", "operation"]
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_errors_total",
+    "Failed upstream calls by kind (quota, timeout, circuit_open, error)",
+    ["upstream", "operation", "kind"]
+)
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds",
+    "Time spent in each traced stage of request and live-session handling",
+    ["stage"]
+)
+REPLY_ERRORS = registry.counter(
+    "reply_errors_total",
+    "Replies that carried an error or quota message to the user instead of an answer",
+    ["feature", "kind"]
+)
+LIVE_SESSIONS = registry.gauge(
+    "live_active_sessions",
+    "WebSocket sessions currently held by the live ConnectionManager"
+)
+
+
+def classify_error(error):
+    """Error kind label for an upstream failure"""
+    message = str(error)
+    if "RESOURCE_EXHAUSTED" in message or "429" in message or "quota" in message.lower():
+        return "quota"
+    name = type(error).__name__
+    if "Timeout" in name or isinstance(error, TimeoutError):
+        return "timeout"
+    if name == "CircuitOpenError":
+        return "circuit_open"
+    return "error"
+
+
+class Span:
+    """One traced stage; spans opened inside it share its trace ID"""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.path = f"{parent.path}/{name}" if parent else name
+        self.started = time.perf_counter()
+        self.duration = None
+
+# The span in progress; asyncio tasks inherit it from the code that created them
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def current_span():
+    """The innermost span in progress, or None"""
+    return _current_span.get()
+
+@contextmanager
+def span(name):
+    """
+    Trace a stage: its duration is recorded in stage_duration_seconds and
+    logged at debug level with the trace ID and the path of enclosing spans
+    """
+    current = Span(name, _current_span.get())
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current.started
+        STAGE_SECONDS.observe(current.duration, stage=name)
+        logger.debug(f"trace={current.trace_id} span={current.path} {current.duration * 1000:.1f}ms")
+
+def record_upstream(upstream, operation, started, error=None):
+    """Record the latency of an upstream call that began at started, and its failure if any"""
+    UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - started, upstream=upstream, operation=operation)
+    if error is not None:
+        UPSTREAM_ERRORS.inc(upstream=upstream, operation=operation, kind=classify_error(error))
+
+@contextmanager
+def track_upstream(upstream, operation):
+    """
+    Time a call to an upstream API in its own span and count its failures
+    by kind. Cancelled calls (barge-in, client gone) are not recorded.
+    
+    Don't wrap a yield inside an async generator with this (or span): the
+    generator may be finished from another task's context. Time streams
+    with record_upstream instead.
+    """
+    started = time.perf_counter()
+    with span(upstream):
+        try:
+            yield
+        except Exception as e:
+            record_upstream(upstream, operation, started, e)
+            raise
+    record_upstream(upstream, operation, started)
@@ -1,35 +1,147 @@
 import re
+import unicodedata
+
+# Markdown constructs removed before text is spoken, as one alternation so
+# the text is scanned once. Every branch starts with one of ` \n * [ so the
+# engine can skip plain text quickly; line-start markers (header, bullet,
+# number, quote, rule) are matched together with the line break before them.
+_MARKDOWN = re.compile(r"""
+    ```.*?```
+  | \n[ \t]*(?:(?:(?:\#+|[*+-]|\d+\.|>)[ \t]+)+|---+[ \t]*(?=\n|\Z))
+  | \*\*(?P<bold>[^\n]*?)\*\*
+  | \*(?P<italic>[^\n]*?)\*
+  | `(?P<code>[^`\n]*)`
+  | \[(?P<link>[^\]\n]*)\]\([^)\n]*\)
+""", re.DOTALL | re.VERBOSE)
+
+def _replace_markdown(match):
+    group = match.lastgroup
+    if group is None:
+        # Code block or line marker
+        return " "
+    if group in ("bold", "italic"):
+        # Emphasis can wrap links or code; spans are short, so recurse
+        return _MARKDOWN.sub(_replace_markdown, match.group(group))
+    return match.group(group)
 
 def strip_markdown(text):
     """Remove markdown formatting while preserving punctuation"""
     if not text:
         return ""
-        
-    # Remove bold and italic markers
-    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Bold
-    text = re.sub(r'\*(.*?)\*', r'\1', text)      # Italic
-    
-    # Remove code blocks and inline code
-    text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
-    text = re.sub(r'`(.*?)`', r'\1', text)
-    
-    # Remove links but keep the text
-    text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)
-    
-    # Remove headers but preserve the text
-    text = re.sub(r'^#+\s+(.*)', r'\1', text, flags=re.MULTILINE)
+    # The leading newline lets a marker on the first line match like any other
+    return " ".join(_MARKDOWN.sub(_replace_markdown, "\n" + text).split())
+
+# Maximum characters per request accepted by the Sarvam TTS API
+TTS_MAX_CHARS = 500
+
+# Sentence terminators: danda, double danda, full stop, question and exclamation marks
+_SENTENCE_END = re.compile(r'(?<=[।॥.?!])\s+')
+# Softer break points to fall back on inside a very long sentence
+_CLAUSE_END = re.compile(r'(?<=[,;:،])\s+')
+
+def _is_grapheme_boundary(text, i):
+    """True if text can be cut between text[i-1] and text[i] without splitting a cluster"""
+    if i <= 0 or i >= len(text):
+        return True
+    nxt, prev = text[i], text[i - 1]
+    # Combining marks (matras, nukta, anusvara...) belong to the preceding letter
+    if unicodedata.category(nxt).startswith('M'):
+        return False
+    # Joiners and viramas glue the next consonant into a conjunct
+    if nxt in '\u200c\u200d' or prev in '\u200c\u200d':
+        return False
+    if unicodedata.combining(prev) == 9:
+        return False
+    return True
+
+def _hard_split(text, max_chars):
+    """Split text with no usable spaces into pieces that end on grapheme boundaries"""
+    pieces = []
+    while len(text) > max_chars:
+        cut = max_chars
+        while cut > 1 and not _is_grapheme_boundary(text, cut):
+            cut -= 1
+        pieces.append(text[:cut])
+        text = text[cut:]
+    if text:
+        pieces.append(text)
+    return pieces
+
+def _split_oversized(sentence, max_chars):
+    """Break one sentence longer than max_chars at clause, then word, then grapheme boundaries"""
+    pieces = []
+    for clause in _CLAUSE_END.split(sentence):
+        if len(clause) <= max_chars:
+            pieces.append(clause)
+            continue
+        for word in clause.split(' '):
+            if len(word) <= max_chars:
+                pieces.append(word)
+            else:
+                pieces.extend(_hard_split(word, max_chars))
+    return pieces
+
+def split_text_for_tts(text, max_chars=TTS_MAX_CHARS):
+    """
+    Split text into chunks of at most max_chars for speech synthesis.
     
-    # Remove bullet markers but keep the text
-    text = re.sub(r'^\s*[\*\-+]\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    Chunks end at sentence boundaries (।, ॥, ., ?, !) wherever possible and
+    whole sentences are packed together up to the limit, so a long reply
+    needs as few requests as a fixed-size split. Sentences that don't fit
+    on their own are broken at clauses, then words, and as a last resort at
+    grapheme-cluster boundaries so conjuncts and vowel signs stay intact.
+    """
+    text = text.strip() if text else ""
+    if not text:
+        return []
+    if len(text) <= max_chars:
+        return [text]
     
-    # Remove blockquotes but keep the text
-    text = re.sub(r'^\s*>\s+(.*)', r'\1', text, flags=re.MULTILINE)
+    pieces = []
+    for sentence in _SENTENCE_END.split(text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+        else:
+            pieces.extend(_split_oversized(sentence, max_chars))
     
-    # Remove horizontal rules
-    text = re.sub(r'^\s*---+\s*$', '', text, flags=re.MULTILINE)
+    # Greedily pack pieces into chunks, joined by single spaces
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        if not current:
+            current = piece
+        elif len(current) + 1 + len(piece) <= max_chars:
+            current = f"{current} {piece}"
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
     
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+    return chunks
+
+
+# Where streamed text can be cut before it is spoken: after a sentence end
+# (but not after a list number such as "1."), or at a line break
+_STREAM_BREAK = re.compile(r'(?<=[।॥?!])\s+|(?<=\D\.)\s+|\n')
+
+def split_complete_sentences(buffer, max_chars=TTS_MAX_CHARS):
+    """
+    Split text streamed from the LLM into the part that ends at a sentence
+    or line boundary and the unfinished remainder.
     
-    return text
+    Returns:
+        tuple: (complete text, remainder). A remainder with no boundary
+               that grows past max_chars is cut at clause or word breaks.
+    """
+    last = None
+    for last in _STREAM_BREAK.finditer(buffer):
+        pass
+    if last is not None:
+        return buffer[:last.start()], buffer[last.end():]
+    if len(buffer) > max_chars:
+        chunks = split_text_for_tts(buffer, max_chars)
+        return " ".join(chunks[:-1]), chunks[-1]
+    return "", buffer